@@ -22,16 +22,40 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import logging
 
+import voluptuous as vol
+
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, ServiceCall, SupportsResponse, callback
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv
 from homeassistant.util import dt as dt_util
 
-from .const import DOMAIN
+from .const import ATTR_CONFIG_ENTRY_ID, BACKFILL_DEFAULT_DAYS, DEFAULT_WEIGHTS, DOMAIN, WEATHER_BROKER_KEY
 from .coordinator import SolarForecastCoordinator
 from .helpers import _migrate_data_files
 
 _LOGGER = logging.getLogger(__name__)
 
+SERVICES = (
+    "trigger_learning", "reload_history", "verify_hourly_profile", "get_production_curve",
+    "backfill_history", "train_model", "replay_history",
+)
+
+# Grenzen wie in services.yaml
+BACKFILL_HISTORY_SCHEMA = vol.Schema({
+    vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+    vol.Optional("days", default=BACKFILL_DEFAULT_DAYS): vol.All(cv.positive_int, vol.Range(min=1, max=3650)),
+    vol.Optional("overwrite", default=False): cv.boolean,
+    vol.Optional("database"): cv.isfile,
+})
+
+REPLAY_HISTORY_SCHEMA = vol.Schema({
+    vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+    vol.Optional("weights"): {vol.In(list(DEFAULT_WEIGHTS)): vol.Coerce(float)},
+    vol.Optional("base_capacity"): vol.All(vol.Coerce(float), vol.Range(min=0.1, max=1000)),
+    vol.Optional("days"): vol.All(cv.positive_int, vol.Range(min=1, max=3650)),
+})
+
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """
@@ -52,36 +76,60 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     hass.data[DOMAIN][entry.entry_id] = coordinator
     _LOGGER.info(" -> Step 2 Complete: Coordinator instance created and stored.")
 
-    # --- KORREKTUR (START) ---
-    # Schritt 2.5: Lade persistente Daten (Weights, History).
-    # Dies MUSS VOR Schritt 3 (first_refresh) passieren, damit die
-    # Basisdaten geladen sind, bevor die erste Prognose versucht wird.
-    _LOGGER.info("Step 2.5: Loading persistent ML data (weights, history)...")
-    await coordinator.async_load_initial_data()
-    _LOGGER.info(" -> Step 2.5 Complete: ML data loaded.")
-    # --- KORREKTUR (ENDE) ---
-
-    # Schritt 3: Führe den ersten Refresh durch, um initiale Daten zu laden
-    # (Dieser Schritt löst die erste Prognose aus, die die Wetter-Entität benötigt)
-    _LOGGER.info("Step 3: Triggering initial coordinator refresh (first forecast)...")
-    await coordinator.async_config_entry_first_refresh()
-    _LOGGER.info(" -> Step 3 Complete: Initial refresh done.")
+    # Schritt 2.3: Eine beim letzten Lauf unterbrochene Speicher-Transaktion abschließen,
+    # bevor irgendeine Datendatei gelesen wird. Ein Fehler dabei verhindert den Start nicht.
+    try:
+        await coordinator.async_recover_pending_transaction()
+    except Exception as e:
+        _LOGGER.error(f"❌ Unterbrochene Speicher-Transaktion konnte nicht abgeschlossen werden: {e}", exc_info=True)
+    # Gemeinsame Zustandsdateien älterer Versionen gehören ab jetzt dem ersten Eintrag
+    await coordinator.async_migrate_entry_files()
+
+    # Schritt 2.4: Warmstart - zuletzt gespeicherten Zustand (Prognose, Methode,
+    # Stundenwerte) lesen, damit beim Neustart keine zusätzlichen Wetterabrufe nötig sind
+    _LOGGER.info("Step 2.4: Restoring last persisted state...")
+    await coordinator.async_load_state_snapshot()
+    _LOGGER.info(" -> Step 2.4 Complete: State restored.")
+
+    if coordinator.fast_start:
+        # Schritt 2.5/3 (Fast-Start): History, Methodenerkennung und erste Prognose
+        # laufen nach dem Laden der Plattformen im Hintergrund und blockieren den HA-Start nicht.
+        _LOGGER.info("Step 2.5: Fast start - ML data will be loaded in background.")
+    else:
+        # --- KORREKTUR (START) ---
+        # Schritt 2.5: Lade persistente Daten (Weights, History).
+        # Dies MUSS VOR Schritt 3 (first_refresh) passieren, damit die
+        # Basisdaten geladen sind, bevor die erste Prognose versucht wird.
+        _LOGGER.info("Step 2.5: Loading persistent ML data (weights, history)...")
+        await coordinator.async_load_initial_data()
+        _LOGGER.info(" -> Step 2.5 Complete: ML data loaded.")
+        # --- KORREKTUR (ENDE) ---
+
+        # Schritt 3: Führe den ersten Refresh durch, um initiale Daten zu laden
+        # (Dieser Schritt löst die erste Prognose aus, die die Wetter-Entität benötigt)
+        _LOGGER.info("Step 3: Triggering initial coordinator refresh (first forecast)...")
+        await coordinator.async_config_entry_first_refresh()
+        _LOGGER.info(" -> Step 3 Complete: Initial refresh done.")
 
     # Schritt 4: Lade die Plattformen (sensor, button), die sich den Koordinator holen
     _LOGGER.info("Step 4: Forwarding setup to sensor and button platforms...")
     await hass.config_entries.async_forward_entry_setups(entry, ["sensor", "button"])
     _LOGGER.info(" -> Step 4 Complete: Platform setup forwarded.")
+    coordinator.async_start_listeners()
 
-    # Schritt 5: Registriere den manuellen Lern-Service für Debugging und Tests
-    _LOGGER.info("Step 5: Registering 'trigger_learning' service...")
+    if coordinator.fast_start:
+        # Wird beim Entladen des Eintrags automatisch abgebrochen
+        entry.async_create_background_task(
+            hass, coordinator.async_background_start(), f"{DOMAIN}_background_start_{entry.entry_id}"
+        )
 
-    async def handle_trigger_learning(call):
-        """Behandelt den Service-Aufruf, um das Lernen manuell auszulösen."""
-        _LOGGER.info("🔧 Service 'trigger_learning' aufgerufen. Starte Lernprozess manuell.")
-        await coordinator._midnight_learning(dt_util.now())
-
-    hass.services.async_register(DOMAIN, "trigger_learning", handle_trigger_learning)
-    _LOGGER.info(" -> Step 5 Complete: 'trigger_learning' service registered.")
+    # Schritt 5: Registriere die manuellen Services für Debugging und Tests (einmal für alle Einträge)
+    _LOGGER.info("Step 5: Registering services...")
+    if not hass.services.has_service(DOMAIN, SERVICES[0]):
+        _async_register_services(hass)
+        _LOGGER.info(f" -> Step 5 Complete: {', '.join(repr(s) for s in SERVICES)} services registered.")
+    else:
+        _LOGGER.info(" -> Step 5 Complete: Services already registered.")
 
     _LOGGER.info("--- ✅ Solar Forecast ML Setup Finished Successfully ---")
     return True
@@ -98,11 +146,126 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     unload_ok = await hass.config_entries.async_unload_platforms(entry, ["sensor", "button"])
     
     if unload_ok:
-        # Entferne den registrierten Service
-        hass.services.async_remove(DOMAIN, "trigger_learning")
-        
-        # Entferne den Koordinator aus dem globalen hass.data-Speicher
-        hass.data[DOMAIN].pop(entry.entry_id, None)
+        # Entferne den Koordinator aus dem globalen hass.data-Speicher und
+        # schreibe noch vorgemerkte Änderungen (History, Gewichte) weg
+        coordinator = hass.data[DOMAIN].pop(entry.entry_id, None)
+        if coordinator:
+            await coordinator.async_unload()
+        # Die Services gehören allen Einträgen; erst mit dem letzten werden sie entfernt
+        if not _coordinators(hass):
+            for service in SERVICES:
+                hass.services.async_remove(DOMAIN, service)
+        # Gemeinsamen Wetter-Broker entfernen, sobald kein Eintrag mehr angemeldet ist
+        broker = hass.data[DOMAIN].get(WEATHER_BROKER_KEY)
+        if broker is not None and broker.subscriber_count == 0:
+            hass.data[DOMAIN].pop(WEATHER_BROKER_KEY)
         _LOGGER.info("✅ Solar Forecast ML unloaded successfully.")
     
-    return unload_ok
\ No newline at end of file
+    return unload_ok
+
+
+def _coordinators(hass: HomeAssistant) -> dict:
+    """Alle eingerichteten Koordinatoren (Eintrags-ID -> Koordinator)."""
+    return {entry_id: value for entry_id, value in hass.data.get(DOMAIN, {}).items()
+            if isinstance(value, SolarForecastCoordinator)}
+
+
+def _coordinator_for_call(hass: HomeAssistant, call: ServiceCall) -> SolarForecastCoordinator:
+    """
+    Koordinator des Eintrags aus config_entry_id. Ohne Angabe ist das nur eindeutig,
+    wenn genau ein Eintrag eingerichtet ist.
+    """
+    coordinators = _coordinators(hass)
+    entry_id = call.data.get(ATTR_CONFIG_ENTRY_ID)
+    if entry_id:
+        if entry_id not in coordinators:
+            raise HomeAssistantError(f"Kein geladener Solar Forecast ML Eintrag mit der ID {entry_id}.")
+        return coordinators[entry_id]
+    if len(coordinators) != 1:
+        raise HomeAssistantError(
+            f"{len(coordinators)} Solar Forecast ML Einträge geladen, bitte config_entry_id angeben."
+        )
+    return next(iter(coordinators.values()))
+
+
+@callback
+def _async_register_services(hass: HomeAssistant) -> None:
+    """Registriert die Services einmal für die Domain; jeder Aufruf wählt seinen Eintrag."""
+
+    async def handle_trigger_learning(call: ServiceCall):
+        """Behandelt den Service-Aufruf, um das Lernen manuell auszulösen."""
+        coordinator = _coordinator_for_call(hass, call)
+        _LOGGER.info("🔧 Service 'trigger_learning' aufgerufen. Starte Lernprozess manuell.")
+        await coordinator._midnight_learning(dt_util.now())
+
+    hass.services.async_register(DOMAIN, "trigger_learning", handle_trigger_learning)
+
+    async def handle_reload_history(call: ServiceCall):
+        """Liest die History explizit neu von der Platte (z. B. nach manueller Bearbeitung)."""
+        coordinator = _coordinator_for_call(hass, call)
+        _LOGGER.info("🔧 Service 'reload_history' aufgerufen. Lade History neu.")
+        await coordinator.async_reload_history()
+
+    hass.services.async_register(DOMAIN, "reload_history", handle_reload_history)
+
+    async def handle_verify_hourly_profile(call: ServiceCall):
+        """Vergleicht das inkrementelle Stundenprofil mit einem vollständigen Neuaufbau."""
+        coordinator = _coordinator_for_call(hass, call)
+        _LOGGER.info("🔧 Service 'verify_hourly_profile' aufgerufen.")
+        return await coordinator.async_verify_hourly_profile(rebuild=call.data.get("rebuild", False))
+
+    hass.services.async_register(
+        DOMAIN, "verify_hourly_profile", handle_verify_hourly_profile,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    async def handle_get_production_curve(call: ServiceCall):
+        """Gibt die stündliche Produktionskurve für heute und morgen zurück (ohne neuen Wetterabruf)."""
+        return _coordinator_for_call(hass, call).production_curve or {}
+
+    hass.services.async_register(
+        DOMAIN, "get_production_curve", handle_get_production_curve,
+        supports_response=SupportsResponse.ONLY,
+    )
+
+    async def handle_backfill_history(call: ServiceCall):
+        """Befüllt die History aus den Langzeitstatistiken des Recorders."""
+        coordinator = _coordinator_for_call(hass, call)
+        _LOGGER.info("🔧 Service 'backfill_history' aufgerufen.")
+        return await coordinator.async_backfill_history(
+            days=call.data["days"],
+            overwrite=call.data["overwrite"],
+            database=call.data.get("database"),
+        )
+
+    hass.services.async_register(
+        DOMAIN, "backfill_history", handle_backfill_history,
+        schema=BACKFILL_HISTORY_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    async def handle_train_model(call: ServiceCall):
+        """Trainiert alle Modellgewichte per Regression über die History."""
+        coordinator = _coordinator_for_call(hass, call)
+        _LOGGER.info("🔧 Service 'train_model' aufgerufen.")
+        return await coordinator.async_train_model(apply=call.data.get("apply", True))
+
+    hass.services.async_register(
+        DOMAIN, "train_model", handle_train_model,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+    async def handle_replay_history(call: ServiceCall):
+        """Backtest der gespeicherten History mit den aktiven oder übergebenen Gewichten."""
+        coordinator = _coordinator_for_call(hass, call)
+        return await coordinator.async_replay_history(
+            weights=call.data.get("weights"),
+            base_capacity=call.data.get("base_capacity"),
+            days=call.data.get("days"),
+        )
+
+    hass.services.async_register(
+        DOMAIN, "replay_history", handle_replay_history,
+        schema=REPLAY_HISTORY_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
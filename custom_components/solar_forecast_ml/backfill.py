@@ -0,0 +1,165 @@
+"""
+Nachträgliches Befüllen der History aus den Langzeitstatistiken des Recorders.
+
+Eine Neuinstallation lernt sonst nur einen Tag pro Nacht. Die stündlichen
+Langzeitstatistiken (Tabelle `statistics`) reichen dagegen unbegrenzt zurück:
+- Ertragssensor (power_entity) und Verbrauchssensor: Tageswerte aus den
+  Differenzen der kumulierten Summe (`sum`), ohne Summe aus dem Maximum.
+- Aktuelle Leistung (W): Stundenenergie = Stundenmittel / 1000 (kWh).
+  Ohne Leistungssensor werden die Stundendifferenzen des Ertragssensors verwendet.
+
+Die Statistiken werden in Zeitfenstern abgefragt (ein Query je Fenster für alle
+Entitäten) und in einem Durchgang aufsummiert; der Speicherbedarf wächst nur
+mit der Anzahl der Tage. Dieses Modul importiert nichts aus Home Assistant und
+kann direkt gegen eine SQLite-Recorder-Datei (home-assistant_v2.db) laufen.
+
+Copyright (C) 2025 Zara-Toorox
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+_LOGGER = logging.getLogger(__name__)
+
+# Spalten der Langzeitstatistik, die für den Backfill gebraucht werden
+STATISTIC_TYPES = ("mean", "max", "state", "sum")
+
+
+def batch_windows(start_ts: float, end_ts: float, batch_seconds: float) -> Iterator[Tuple[float, float]]:
+    """Teilt [start_ts, end_ts) in aufeinanderfolgende Abfragefenster."""
+    window_start = start_ts
+    while window_start < end_ts:
+        window_end = min(end_ts, window_start + batch_seconds)
+        yield window_start, window_end
+        window_start = window_end
+
+
+def read_recorder_statistics(db_path: str, statistic_ids: Sequence[str], start_ts: float, end_ts: float) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Blockierend: Liest stündliche Langzeitstatistiken aus einer SQLite-Recorder-Datenbank
+    (nur lesend, ein Query für alle Entitäten). Das Ergebnis hat dasselbe Format wie
+    statistics_during_period des Recorders: {statistic_id: [{"start": ts, "mean": ..., ...}]}.
+    """
+    result: Dict[str, List[Dict[str, Any]]] = {}
+    if not statistic_ids:
+        return result
+    placeholders = ",".join("?" * len(statistic_ids))
+    query = (
+        "SELECT m.statistic_id, s.start_ts, s.mean, s.max, s.state, s.sum "
+        "FROM statistics s JOIN statistics_meta m ON s.metadata_id = m.id "
+        f"WHERE m.statistic_id IN ({placeholders}) AND s.start_ts >= ? AND s.start_ts < ? "
+        "ORDER BY s.start_ts"
+    )
+    with closing(sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)) as connection:
+        for statistic_id, start, mean, peak, state, total in connection.execute(query, (*statistic_ids, start_ts, end_ts)):
+            result.setdefault(statistic_id, []).append(
+                {"start": start, "mean": mean, "max": peak, "state": state, "sum": total}
+            )
+    return result
+
+
+def _timestamp(value: Any) -> Optional[float]:
+    """Beginn einer Statistikzeile als Unix-Zeit (ältere HA-Versionen liefern datetime)."""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return None
+
+
+def _number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or value != value:
+        return None
+    return float(value)
+
+
+class BackfillAccumulator:
+    """
+    Summiert Statistikzeilen (stündlich, in zeitlicher Reihenfolge, beliebig viele Fenster)
+    zu Tageswerten auf. `local_day_hour` bildet eine Unix-Zeit auf (ISO-Tag, lokale Stunde) ab.
+    """
+
+    def __init__(self, power_entity: Optional[str], current_power_sensor: Optional[str],
+                 consumption_entity: Optional[str], local_day_hour: Callable[[float], Tuple[str, int]]):
+        self.power_entity = power_entity
+        self.current_power_sensor = current_power_sensor
+        self.consumption_entity = consumption_entity
+        self._local_day_hour = local_day_hour
+        # Letzte kumulierte Summe je Entität, auch über Fenstergrenzen hinweg
+        self._last_sum: Dict[str, float] = {}
+        self._days: Dict[str, Dict[str, Any]] = {}
+        self.rows = 0
+
+    def add(self, statistics: Dict[str, List[Dict[str, Any]]]) -> None:
+        for statistic_id, rows in statistics.items():
+            for row in rows:
+                start = _timestamp(row.get("start"))
+                if start is None:
+                    continue
+                self.rows += 1
+                day, hour = self._local_day_hour(start)
+                entry = self._days.setdefault(day, {
+                    "yield_sum": None, "yield_max": None, "consumption_sum": None, "consumption_max": None,
+                    "power_hourly": {}, "yield_hourly": {},
+                })
+                if statistic_id == self.current_power_sensor:
+                    mean = _number(row.get("mean"))
+                    if mean is not None:
+                        entry["power_hourly"][hour] = max(0.0, mean) / 1000
+                if statistic_id == self.power_entity:
+                    delta = self._add_energy(statistic_id, entry, "yield", row)
+                    if delta is not None:
+                        entry["yield_hourly"][hour] = entry["yield_hourly"].get(hour, 0.0) + delta
+                if statistic_id == self.consumption_entity:
+                    self._add_energy(statistic_id, entry, "consumption", row)
+
+    def _add_energy(self, statistic_id: str, entry: Dict[str, Any], key: str, row: Dict[str, Any]) -> Optional[float]:
+        """Verbucht eine Zeile eines Energiezählers; gibt die Stundendifferenz zurück (falls bekannt)."""
+        peak = _number(row.get("max"))
+        if peak is None:
+            peak = _number(row.get("state"))
+        if peak is not None:
+            entry[f"{key}_max"] = peak if entry[f"{key}_max"] is None else max(entry[f"{key}_max"], peak)
+
+        total = _number(row.get("sum"))
+        if total is None:
+            return None
+        previous = self._last_sum.get(statistic_id)
+        self._last_sum[statistic_id] = total
+        if previous is None:
+            return None
+        delta = max(0.0, total - previous)
+        entry[f"{key}_sum"] = (entry[f"{key}_sum"] or 0.0) + delta
+        return delta
+
+    def days(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Tageswerte: {Tag: {"actual": kWh oder None, "consumption": kWh oder None,
+        "hourly": {Stunde: kWh}}}.
+        """
+        result = {}
+        for day, entry in self._days.items():
+            actual = entry["yield_sum"] if entry["yield_sum"] is not None else entry["yield_max"]
+            consumption = entry["consumption_sum"] if entry["consumption_sum"] is not None else entry["consumption_max"]
+            hourly = entry["power_hourly"] or entry["yield_hourly"]
+            result[day] = {
+                "actual": round(actual, 2) if actual is not None else None,
+                "consumption": round(consumption, 2) if consumption is not None else None,
+                "hourly": {hour: round(kwh, 4) for hour, kwh in sorted(hourly.items())},
+            }
+        return result
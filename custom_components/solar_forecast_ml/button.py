@@ -64,7 +64,7 @@ class ManualForecastButton(ButtonEntity):
             identifiers={(DOMAIN, entry.entry_id)},
             name="Solar Forecast ML",
             manufacturer="Zara-Toorox",
-            model="v4.4.6",
+            model="v4.5.0",
         )
 
     async def async_press(self) -> None:
@@ -0,0 +1,347 @@
+"""
+Spaltenorientierte, memory-mapbare Kopie der Prognose-History.
+
+prediction_history.json bleibt die lesbare, maßgebliche Datei. Daneben wird
+prediction_history.npy als strukturiertes NumPy-Array mit fester Zeilenbreite
+geführt (Datum als Ordinal, Prognosen, Ist-Wert, Energie je Zeitslot, Sensor-Features,
+Wetterfaktor der Tagesprognose).
+Die Spalte "hourly" hat so viele Einträge wie der Tag Slots hat (24 bei
+Stundenauflösung, 96 bei 15 Minuten); bei 24 Slots entspricht das Format dem
+bisherigen.
+Beim Laden wird die Datei per mmap eingebunden, die Statistik-Berechnungen
+arbeiten direkt auf Array-Slices statt auf verschachtelten Dictionaries.
+Fehlende Werte sind NaN.
+
+Die Zeilen sind immer nach Datum (Ordinal) sortiert. Damit dient das Array
+selbst als Datumsindex: Zeitfenster ("letzte N Tage", "von A bis B",
+"gleiches Kalenderfenster in Vorjahren") sind binäre Suchen und liefern
+Views, ohne die History zu kopieren oder zu sortieren.
+
+Neben der .npy steht die Kennung des JSON-Stands, aus dem sie erzeugt wurde
+(Größe und mtime des Snapshots, Länge und SHA-256 des eingerechneten
+Journal-Anfangs). Passt sie beim Laden nicht mehr (manuelle Bearbeitung,
+Wiederherstellung eines Backups, Migration), wird die .npy neu konvertiert.
+
+Copyright (C) 2025 Zara-Toorox
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import hashlib
+import json
+import logging
+import os
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Nur const: columnar, trainer und replay bleiben ohne Home Assistant importierbar
+from .const import OP_ACTUAL, OP_FORECAST, OP_HOURLY, OP_SLOT
+
+_LOGGER = logging.getLogger(__name__)
+
+HOURS = 24
+FEATURE_KEYS = ("lux", "temp", "wind", "uv", "fs", "rain")
+
+
+
+def history_dtype(slots: int = HOURS) -> np.dtype:
+    """Zeilenformat für `slots` Energiewerte pro Tag."""
+    return np.dtype([
+        ("ordinal", "<i4"),
+        ("predicted", "<f8"),
+        ("predicted_morgen", "<f8"),
+        ("actual", "<f8"),
+        ("hourly", "<f8", (slots,)),
+        ("features", "<f8", (len(FEATURE_KEYS),)),
+        ("weather_factor", "<f8"),
+    ])
+
+
+def _day_ordinal(day_str: Any) -> Optional[int]:
+    """Wandelt einen ISO-Datumsschlüssel in ein Ordinal um (None bei ungültigem Schlüssel)."""
+    if not isinstance(day_str, str) or len(day_str) != 10:
+        return None
+    try:
+        return date.fromisoformat(day_str).toordinal()
+    except ValueError:
+        return None
+
+
+def _to_float(value: Any) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return np.nan
+    return float(value)
+
+
+def count_valid_days(days: Dict[str, Any]) -> int:
+    """Anzahl der History-Einträge, die in die Spaltenform übernommen werden."""
+    return sum(1 for k, v in days.items() if isinstance(v, dict) and _day_ordinal(k) is not None)
+
+
+def _shift_years(day: date, years: int) -> date:
+    """Verschiebt ein Datum um ganze Jahre (29.02. wird in Nicht-Schaltjahren zum 28.02.)."""
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        return day.replace(year=day.year - years, day=28)
+
+
+class ColumnarHistory:
+    """
+    History als strukturiertes, nach Datum sortiertes Array mit wachsender Kapazität.
+    """
+
+    def __init__(self, rows: Optional[np.ndarray] = None, slots: int = HOURS):
+        self.slots = slots
+        self.dtype = history_dtype(slots)
+        self._rows = rows if rows is not None else np.zeros(0, dtype=self.dtype)
+        self._size = len(self._rows)
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def rows(self) -> np.ndarray:
+        """Alle belegten Zeilen in Datumsreihenfolge (View, keine Kopie)."""
+        return self._rows[:self._size]
+
+    @property
+    def ordinals(self) -> np.ndarray:
+        return self._rows["ordinal"][:self._size]
+
+    # --- Datumsabfragen (O(log n), liefern Views) ---
+
+    def between(self, start: date, end: date) -> np.ndarray:
+        """Alle Tage von start bis einschließlich end."""
+        ordinals = self.ordinals
+        lo = np.searchsorted(ordinals, start.toordinal(), side="left")
+        hi = np.searchsorted(ordinals, end.toordinal(), side="right")
+        return self._rows[lo:max(lo, hi)]
+
+    def last_days(self, days: int, today: date) -> np.ndarray:
+        """Die letzten `days` Kalendertage bis einschließlich `today`."""
+        return self.between(date.fromordinal(today.toordinal() - days + 1), today)
+
+    def same_window_previous_years(self, start: date, end: date, max_years: int = 10) -> List[np.ndarray]:
+        """
+        Dasselbe Kalenderfenster in den Vorjahren (neuestes zuerst).
+        Endet, sobald ein Fenster vor dem ältesten gespeicherten Tag liegt.
+        """
+        windows = []
+        if not self._size:
+            return windows
+        first = int(self.ordinals[0])
+        for years in range(1, max_years + 1):
+            window_end = _shift_years(end, years)
+            if window_end.toordinal() < first:
+                break
+            window = self.between(_shift_years(start, years), window_end)
+            if len(window):
+                windows.append(window)
+        return windows
+
+    # --- Laden / Speichern (blockierend, Executor) ---
+
+    @classmethod
+    def load(cls, path: str, slots: int = HOURS) -> Optional["ColumnarHistory"]:
+        """
+        Bindet die Datei per mmap ein (copy-on-write: Änderungen bleiben im Speicher).
+        Gibt None zurück, wenn die Datei fehlt oder nicht zum aktuellen Format
+        (inkl. Slot-Anzahl) passt.
+        """
+        try:
+            rows = np.load(path, mmap_mode="c", allow_pickle=False)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            _LOGGER.warning(f"Spalten-History {path} konnte nicht geladen werden ({e}), wird neu erzeugt.")
+            return None
+        if rows.dtype != history_dtype(slots) or rows.ndim != 1 or np.any(np.diff(rows["ordinal"]) <= 0):
+            _LOGGER.info(f"Spalten-History {path} hat ein veraltetes Format, wird neu erzeugt.")
+            return None
+        return cls(rows, slots)
+
+    def save(self, path: str) -> bool:
+        """Schreibt die Zeilen atomar (temporäre Datei + rename). Gibt zurück, ob das gelungen ist."""
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                np.save(f, np.ascontiguousarray(self.rows), allow_pickle=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+            return True
+        except OSError as e:
+            _LOGGER.error(f"Fehler beim Speichern der Spalten-History {path}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+
+    @classmethod
+    def from_days(cls, days: Dict[str, Any], slots: int = HOURS) -> "ColumnarHistory":
+        """Konvertiert das History-Dictionary (Format von prediction_history.json)."""
+        rows = np.zeros(count_valid_days(days), dtype=history_dtype(slots))
+        index = 0
+        for day_str, entry in days.items():
+            if not isinstance(entry, dict):
+                continue
+            ordinal = _day_ordinal(day_str)
+            if ordinal is None:
+                continue
+            row = rows[index]
+            index += 1
+            row["ordinal"] = ordinal
+            row["predicted"] = _to_float(entry.get("predicted"))
+            row["predicted_morgen"] = _to_float(entry.get("predicted_morgen"))
+            row["actual"] = _to_float(entry.get("actual"))
+            row["weather_factor"] = _to_float(entry.get("weather_factor"))
+            _fill_slots(row, entry, slots)
+            row["features"] = np.nan
+            features = entry.get("features")
+            if isinstance(features, dict):
+                row["features"] = [_to_float(features.get(k)) for k in FEATURE_KEYS]
+        # Einmalige Sortierung bei der Konvertierung, danach bleibt die Ordnung erhalten
+        return cls(rows[np.argsort(rows["ordinal"], kind="stable")], slots)
+
+    # --- Änderungen ---
+
+    def apply_record(self, record: Dict[str, Any]) -> None:
+        """Spiegelt einen History-Journal-Record (siehe history.py) in die Spalten."""
+        ordinal = _day_ordinal(record.get("day"))
+        if ordinal is None:
+            return
+        row = self._row_for(ordinal)
+        op = record.get("op")
+        if op == OP_HOURLY:
+            if self.slots == HOURS: _set_slot(row, record.get("hour"), record.get("kwh"))
+        elif op == OP_SLOT:
+            if record.get("minutes") == 1440 // self.slots: _set_slot(row, record.get("slot"), record.get("kwh"))
+        elif op in (OP_FORECAST, OP_ACTUAL):
+            fields = record.get("fields", {})
+            for key in ("predicted", "predicted_morgen", "actual", "weather_factor"):
+                if key in fields:
+                    row[key] = _to_float(fields[key])
+            if isinstance(fields.get("features"), dict):
+                row["features"] = [_to_float(fields["features"].get(k)) for k in FEATURE_KEYS]
+
+    def _row_for(self, ordinal: int) -> np.ndarray:
+        """
+        Liefert die Zeile zu einem Datum und legt sie bei Bedarf an der sortierten
+        Position an. Neue Tage landen am Ende (O(1)); nur Nachträge für ältere
+        Tage verschieben die nachfolgenden Zeilen.
+        """
+        ordinals = self.ordinals
+        index = int(np.searchsorted(ordinals, ordinal))
+        if index < self._size and ordinals[index] == ordinal:
+            # Bei strukturierten Arrays ist das Element ein View auf die Zeile
+            return self._rows[index]
+
+        if self._size >= len(self._rows):
+            grown = np.zeros(max(64, 2 * len(self._rows)), dtype=self.dtype)
+            grown[:self._size] = self._rows[:self._size]
+            self._rows = grown
+        if index < self._size:
+            self._rows[index + 1:self._size + 1] = self._rows[index:self._size]
+        self._rows[index] = (ordinal, np.nan, np.nan, np.nan, np.full(self.slots, np.nan), np.full(len(FEATURE_KEYS), np.nan), np.nan)
+        self._size += 1
+        return self._rows[index]
+
+
+def source_fingerprint(snapshot_path: str, journal_path: str, journal_bytes: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Blockierend: Kennung des JSON-Stands - Größe und mtime des Snapshots sowie Länge und
+    SHA-256 der ersten journal_bytes Bytes des Journals (None: ganzes Journal).
+    None, wenn die Dateien nicht gelesen werden können.
+    """
+    try:
+        stat = os.stat(snapshot_path)
+        snapshot = [stat.st_size, stat.st_mtime_ns]
+    except FileNotFoundError:
+        snapshot = None
+    except OSError:
+        return None
+    try:
+        with open(journal_path, "rb") as journal:
+            data = journal.read() if journal_bytes is None else journal.read(journal_bytes)
+    except FileNotFoundError:
+        data = b""
+    except OSError:
+        return None
+    return {"snapshot": snapshot, "journal_bytes": len(data), "journal_sha256": hashlib.sha256(data).hexdigest()}
+
+
+def source_matches(fingerprint_path: str, snapshot_path: str, journal_path: str) -> bool:
+    """Blockierend: Ob die gespeicherte Kennung zum aktuellen Snapshot und Journal-Anfang passt."""
+    try:
+        with open(fingerprint_path, "r", encoding="utf-8") as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        return False
+    if not isinstance(stored, dict) or not isinstance(stored.get("journal_bytes"), int):
+        return False
+    return source_fingerprint(snapshot_path, journal_path, stored["journal_bytes"]) == stored
+
+
+def save_source_fingerprint(fingerprint_path: str, fingerprint: Optional[Dict[str, Any]]) -> None:
+    """Blockierend: Schreibt die Kennung atomar; ohne Kennung wird eine alte entfernt (erzwingt Neukonvertierung)."""
+    try:
+        if fingerprint is None:
+            if os.path.exists(fingerprint_path): os.remove(fingerprint_path)
+            return
+        tmp_path = f"{fingerprint_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(fingerprint, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, fingerprint_path)
+    except OSError as e:
+        _LOGGER.error(f"Fehler beim Speichern der Kennung der Spalten-History {fingerprint_path}: {e}")
+
+
+def _set_slot(row: np.ndarray, slot: Any, kwh: Any) -> None:
+    try:
+        slot = int(slot)
+    except (ValueError, TypeError):
+        return
+    if 0 <= slot < len(row["hourly"]):
+        row["hourly"][slot] = _to_float(kwh)
+
+
+def _fill_slots(row: np.ndarray, entry: Dict[str, Any], slots: int) -> None:
+    """
+    Überträgt die Energiewerte eines Tages. Bei unterstündlicher Auflösung werden
+    slot_data der passenden Auflösung verwendet; Tage, die nur Stundenwerte haben,
+    werden gleichmäßig auf die Slots der Stunde verteilt.
+    """
+    row["hourly"] = np.nan
+    slot_data = entry.get("slot_data")
+    if slots != HOURS and isinstance(slot_data, dict) and slot_data.get("minutes") == 1440 // slots:
+        values = slot_data.get("kwh")
+        if isinstance(values, list) and len(values) == slots:
+            row["hourly"] = [_to_float(kwh) for kwh in values]
+            return
+    hourly = entry.get("hourly_data")
+    if not isinstance(hourly, dict):
+        return
+    per_hour = slots // HOURS
+    for hour_str, kwh in hourly.items():
+        try:
+            hour = int(hour_str)
+        except (ValueError, TypeError):
+            continue
+        if 0 <= hour < HOURS:
+            row["hourly"][hour * per_hour:(hour + 1) * per_hour] = _to_float(kwh) / per_hour
@@ -55,6 +55,20 @@ from .const import (
     CONF_NOTIFY_FORECAST,
     CONF_NOTIFY_LEARNING,
     CONF_NOTIFY_SUCCESSFUL_LEARNING,
+    CONF_ROLLING_WINDOWS,
+    CONF_FAST_START,
+    CONF_FORECAST_CACHE_TTL,
+    CONF_EVENT_DRIVEN,
+    DEFAULT_ROLLING_WINDOWS,
+    DEFAULT_FAST_START,
+    DEFAULT_FORECAST_CACHE_TTL,
+    DEFAULT_EVENT_DRIVEN,
+    CONF_SLOT_MINUTES,
+    DEFAULT_SLOT_MINUTES,
+    SLOT_MINUTES_OPTIONS,
+    CONF_LEARNING_MODE,
+    DEFAULT_LEARNING_MODE,
+    LEARNING_MODE_OPTIONS,
 )
 
 @config_entries.HANDLERS.register(DOMAIN)
@@ -269,6 +283,34 @@ class SolarForecastMLOptionsFlow(OptionsFlowWithReload):
             CONF_NOTIFY_SUCCESSFUL_LEARNING,
             default=True
         ): bool,
+        vol.Optional(
+            CONF_ROLLING_WINDOWS,
+            default=DEFAULT_ROLLING_WINDOWS
+        ): str,
+        vol.Optional(
+            CONF_FAST_START,
+            default=DEFAULT_FAST_START
+        ): bool,
+        vol.Optional(
+            CONF_FORECAST_CACHE_TTL,
+            default=DEFAULT_FORECAST_CACHE_TTL
+        ): vol.All(vol.Coerce(int), vol.Range(min=0, max=21600)),
+        vol.Optional(
+            CONF_EVENT_DRIVEN,
+            default=DEFAULT_EVENT_DRIVEN
+        ): bool,
+        vol.Optional(
+            CONF_SLOT_MINUTES,
+            default=DEFAULT_SLOT_MINUTES
+        ): selector.SelectSelector(selector.SelectSelectorConfig(
+            options=list(SLOT_MINUTES_OPTIONS), mode=selector.SelectSelectorMode.DROPDOWN
+        )),
+        vol.Optional(
+            CONF_LEARNING_MODE,
+            default=DEFAULT_LEARNING_MODE
+        ): selector.SelectSelector(selector.SelectSelectorConfig(
+            options=list(LEARNING_MODE_OPTIONS), mode=selector.SelectSelectorMode.DROPDOWN
+        )),
     })
 
     async def async_step_init(self, user_input: dict[str, Any] | None = None) -> FlowResult:
@@ -41,10 +41,49 @@ CONF_NOTIFY_FORECAST = "notify_forecast"
 CONF_NOTIFY_LEARNING = "notify_learning"
 CONF_NOTIFY_STARTUP = "notify_startup"
 CONF_NOTIFY_SUCCESSFUL_LEARNING = "notify_successful_learning"
+CONF_ROLLING_WINDOWS = "rolling_windows"
+CONF_FAST_START = "fast_start"
+CONF_FORECAST_CACHE_TTL = "forecast_cache_ttl"
+CONF_EVENT_DRIVEN = "event_driven"
+CONF_SLOT_MINUTES = "slot_minutes"
+CONF_LEARNING_MODE = "learning_mode"
 
 # --- Standardwerte ---
 DEFAULT_UPDATE_INTERVAL = 3600
 DEFAULT_BASE_CAPACITY = 10.0
+# Fenster (Tage) der Rolling-Statistiken; 30 Tage speisen immer Genauigkeit/Durchschnitt
+DEFAULT_ROLLING_WINDOWS = "7, 30, 365"
+# Plattformen sofort mit dem letzten Zustand laden, History/Wetter im Hintergrund (Opt-in:
+# ohne ersten Refresh im Setup entfällt der ConfigEntryNotReady-Wiederholversuch)
+DEFAULT_FAST_START = False
+# Lebensdauer (Sekunden) zwischengespeicherter Wetterprognosen, 0 = kein Cache
+DEFAULT_FORECAST_CACHE_TTL = 900
+# Prognose bei Änderung der Eingaben statt festem Polling
+DEFAULT_EVENT_DRIVEN = False
+# Zeitauflösung (Minuten) für Messung, Stundenprofil und Kurzfristprognose
+DEFAULT_SLOT_MINUTES = "60"
+SLOT_MINUTES_OPTIONS = ("60", "30", "15")
+# Lernverfahren der Modellgewichte: nur Basisgewicht nachführen, alle Gewichte per Regression
+# über die History oder alle Gewichte online (Recursive Least Squares)
+LEARNING_MODE_BASE = "base"
+LEARNING_MODE_BATCH = "batch"
+LEARNING_MODE_RLS = "rls"
+DEFAULT_LEARNING_MODE = LEARNING_MODE_BASE
+LEARNING_MODE_OPTIONS = (LEARNING_MODE_BASE, LEARNING_MODE_BATCH, LEARNING_MODE_RLS)
+# Zeitfenster (Sekunden), in dem Änderungen der Eingaben zusammengefasst werden
+EVENT_REFRESH_DEBOUNCE_SECONDS = 60
+# Relative Änderung eines Sensorwerts, ab der neu prognostiziert wird
+SIGNIFICANT_SENSOR_CHANGE = 0.05
+
+# --- Wetterabruf ---
+# Maximale Dauer (Sekunden) eines einzelnen weather.get_forecasts-Aufrufs
+WEATHER_FETCH_TIMEOUT = 20
+# Circuit Breaker: nach so vielen Fehlern in Folge pausieren (60 s, verdoppelt bis 1 h)
+WEATHER_BREAKER_FAILURES = 3
+WEATHER_BREAKER_BACKOFF = 60
+WEATHER_BREAKER_MAX_BACKOFF = 3600
+# Bucket-Grenzen (Sekunden) des Latenz-Histogramms
+WEATHER_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20)
 
 # Notification Defaults
 DEFAULT_NOTIFY_FORECAST = False
@@ -55,8 +94,59 @@ DEFAULT_NOTIFY_SUCCESSFUL_LEARNING = True
 # --- Dateipfade ---
 DATA_DIR = "/config/solar_forecast_ml"
 WEIGHTS_FILE = f"{DATA_DIR}/learned_weights.json"
+RLS_STATE_FILE = DATA_DIR + "/learned_weights_rls_{entry_id}.json"
 HISTORY_FILE = f"{DATA_DIR}/prediction_history.json"
+HISTORY_JOURNAL_FILE = f"{DATA_DIR}/prediction_history.journal"
+HISTORY_COLUMNAR_FILE = f"{DATA_DIR}/prediction_history.npy"
+# Kennung des JSON-Stands (Snapshot + eingerechneter Journal-Anfang), aus dem die .npy erzeugt wurde
+HISTORY_COLUMNAR_SOURCE_FILE = f"{DATA_DIR}/prediction_history.npy.json"
+HISTORY_ARCHIVE_FILE = f"{DATA_DIR}/prediction_history_archive.json"
+ROLLING_STATS_FILE = DATA_DIR + "/rolling_statistics_{entry_id}.json"
 HOURLY_PROFILE_FILE = f"{DATA_DIR}/hourly_profile.json"
+HOURLY_PROFILE_STATE_FILE = DATA_DIR + "/hourly_profile_state_{entry_id}.json"
+STATE_SNAPSHOT_FILE = DATA_DIR + "/coordinator_state_{entry_id}.json"
+# Dateien mit {entry_id} gehören je einem Konfigurationseintrag. Die gemeinsamen Dateien
+# älterer Versionen übernimmt nach dem Update der erste Eintrag, der startet.
+LEGACY_RLS_STATE_FILE = f"{DATA_DIR}/learned_weights_rls.json"
+LEGACY_ROLLING_STATS_FILE = f"{DATA_DIR}/rolling_statistics.json"
+LEGACY_HOURLY_PROFILE_STATE_FILE = f"{DATA_DIR}/hourly_profile_state.json"
+LEGACY_STATE_SNAPSHOT_FILE = f"{DATA_DIR}/coordinator_state.json"
+# Commit-Manifest einer laufenden Speicher-Transaktion je Konfigurationseintrag (siehe persistence.py)
+TRANSACTION_MANIFEST_FILE = DATA_DIR + "/pending_transaction_{entry_id}.json"
+# Service-Feld für die Auswahl des Eintrags (homeassistant.const hat es erst nach 2024.1)
+ATTR_CONFIG_ENTRY_ID = "config_entry_id"
+# Schlüssel des gemeinsamen Wetter-Brokers in hass.data[DOMAIN] (neben den Entry-IDs)
+WEATHER_BROKER_KEY = "weather_broker"
+
+# --- History-Journal ---
+# Record-Typen im Journal
+OP_FORECAST = "forecast"
+OP_HOURLY = "hourly"
+OP_ACTUAL = "actual"
+OP_SLOT = "slot"
+# Ab dieser Größe wird das Journal sofort in den Snapshot kompaktiert,
+# ansonsten einmal täglich zur geplanten Wartung.
+HISTORY_JOURNAL_MAX_BYTES = 256 * 1024
+# Tage in voller Stundenauflösung; ältere, abgeschlossene Monate werden archiviert
+HISTORY_HOT_DAYS = 365
+# Entprellung (Sekunden), bevor vorgemerkte Änderungen gespeichert werden
+PERSIST_DEBOUNCE_SECONDS = 30
+# Zeitfenster (Kalendertage) für den Median des Stundenprofils
+HOURLY_PROFILE_WINDOW_DAYS = 60
+# Backfill aus dem Recorder: Standard-Zeitraum (Tage) und Tage je Abfragefenster
+BACKFILL_DEFAULT_DAYS = 60
+BACKFILL_BATCH_DAYS = 31
+# Regressions-Training: Mindestanzahl Tage und Regularisierung (relativ, zu den bisherigen Gewichten hin)
+TRAINING_MIN_DAYS = 14
+TRAINING_RIDGE = 0.1
+# Online-Lernen (RLS): Vergessensfaktor je Tag (0.99 ≈ 100 Tage Gedächtnis) und Startvarianz
+RLS_FORGETTING = 0.99
+RLS_INITIAL_VARIANCE = 1.0
+# Schattenmodell: Bewertungsfenster (Tage) für Gewichte bzw. Stundenprofil; mit weniger
+# bewertbaren Tagen wird der Kandidat wie bisher direkt übernommen
+SHADOW_EVAL_DAYS = 30
+SHADOW_PROFILE_EVAL_DAYS = 14
+SHADOW_MIN_DAYS = 7
 
 # Alte Pfade für die Migration
 OLD_DATA_DIR = "/config/custom_components/solar_forecast_ml"
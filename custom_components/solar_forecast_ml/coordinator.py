@@ -20,16 +20,21 @@ You should have received a copy of the GNU Affero General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 import asyncio
+import copy
 import logging
-import statistics
+import os
+import time
+from contextlib import asynccontextmanager
 from datetime import date, datetime, timedelta
 from typing import Dict, List, Any
 
+import numpy as np
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.exceptions import HomeAssistantError
 from homeassistant.const import SUN_EVENT_SUNRISE, SUN_EVENT_SUNSET
-from homeassistant.core import HomeAssistant, State # State Import für die Typisierung (ursprünglicher Code hatte nur HomeAssistant)
-from homeassistant.helpers.event import async_track_time_change
+from homeassistant.core import Event, HomeAssistant, State, callback # State Import für die Typisierung (ursprünglicher Code hatte nur HomeAssistant)
+from homeassistant.helpers.debounce import Debouncer
+from homeassistant.helpers.event import async_track_state_change_event, async_track_time_change
 from homeassistant.helpers.sun import get_astral_event_date
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
 from homeassistant.util import dt as dt_util
@@ -39,9 +44,39 @@ from homeassistant.util import dt as dt_util
 
 from .const import *
 from .helpers import (
+    parse_slot_minutes,
+    _migrate_entry_files,
     _read_history_file,
     _write_history_file,
     calculate_initial_base_capacity,
+    parse_rolling_windows,
+)
+from .columnar import ColumnarHistory, count_valid_days, save_source_fingerprint, source_fingerprint, source_matches
+from .rolling_stats import RollingStatistics
+from .hourly_profile import StreamingHourlyProfile, normalize_profile, rebuild_profile
+from .energy import EnergyIntegrator
+from .backfill import STATISTIC_TYPES, BackfillAccumulator, batch_windows, read_recorder_statistics
+from .persistence import commit_transaction, recover_transaction
+from .forecast_table import HourlyForecastTable, local_epoch_hours, production_curve
+from .weather_client import WeatherBroker, WeatherFetchError
+from .trainer import fit_weights
+from .rls import RecursiveLeastSquares
+from .learning import LearningResult, LearningSnapshot, previous_years_yield, rebuild_derived_state, run_learning
+from .model import ModelState
+from .replay import replay
+from .retention import (
+    archive_cutoff,
+    merge_into_archive,
+    seasonal_average_yield,
+    select_days_to_archive,
+)
+from .history import (
+    HistoryJournal,
+    apply_history_record,
+    build_actual_record,
+    build_forecast_record,
+    build_hourly_record,
+    build_slot_record,
 )
 
 _LOGGER = logging.getLogger(__name__)
@@ -57,10 +92,12 @@ class SolarForecastCoordinator(DataUpdateCoordinator):
         """Initialize the coordinator."""
         self.entry = entry
         config = {**entry.data, **entry.options}
+        self.event_driven = config.get(CONF_EVENT_DRIVEN, DEFAULT_EVENT_DRIVEN)
         
         super().__init__(
             hass, _LOGGER, name=DOMAIN,
-            update_interval=timedelta(seconds=config.get(CONF_UPDATE_INTERVAL, 3600)),
+            # Ereignisgesteuert: kein festes Polling, Aktualisierung bei Änderung der Eingaben
+            update_interval=None if self.event_driven else timedelta(seconds=config.get(CONF_UPDATE_INTERVAL, 3600)),
         )
 
         # --- Attribute aus Konfiguration laden ---
@@ -80,6 +117,25 @@ class SolarForecastCoordinator(DataUpdateCoordinator):
         self.notify_learning = config.get(CONF_NOTIFY_LEARNING, False)
         self.notify_startup = config.get(CONF_NOTIFY_STARTUP, True)
         self.notify_successful_learning = config.get(CONF_NOTIFY_SUCCESSFUL_LEARNING, True)
+        self.rolling_windows = parse_rolling_windows(config.get(CONF_ROLLING_WINDOWS))
+        self.fast_start = config.get(CONF_FAST_START, DEFAULT_FAST_START)
+        # Zeitauflösung für Messung, Profil und Kurzfristprognose (60 = stündlich)
+        self.slot_minutes = parse_slot_minutes(config.get(CONF_SLOT_MINUTES))
+        self.slots_per_day = 1440 // self.slot_minutes
+        self.learning_mode = config.get(CONF_LEARNING_MODE, DEFAULT_LEARNING_MODE)
+        self.rls_learner: RecursiveLeastSquares | None = None
+        # Ein Broker für alle Einträge: gemeinsamer Cache, Breaker je Entität, Single-Flight
+        self.forecast_cache_ttl = config.get(CONF_FORECAST_CACHE_TTL, DEFAULT_FORECAST_CACHE_TTL)
+        domain_data = hass.data.setdefault(DOMAIN, {})
+        if WEATHER_BROKER_KEY not in domain_data:
+            domain_data[WEATHER_BROKER_KEY] = WeatherBroker(
+                hass, WEATHER_FETCH_TIMEOUT, WEATHER_BREAKER_FAILURES, WEATHER_BREAKER_BACKOFF,
+                WEATHER_BREAKER_MAX_BACKOFF, WEATHER_LATENCY_BUCKETS,
+            )
+        self.weather_broker: WeatherBroker = domain_data[WEATHER_BROKER_KEY]
+        self.forecast_cache = self.weather_broker.cache
+        self.forecast_breaker = self.weather_broker.breaker(self.weather_entity)
+        self.forecast_latency = self.weather_broker.latency
 
         plant_kwp_val = config.get(CONF_PLANT_KWP)
         plant_kwp_float = 0.0
@@ -91,68 +147,250 @@ class SolarForecastCoordinator(DataUpdateCoordinator):
                 _LOGGER.warning(f"Ungültiger Wert für plant_kwp: '{plant_kwp_val}'. Verwende Standard.")
                 plant_kwp_float = 0.0
 
-        self.base_capacity = (calculate_initial_base_capacity(plant_kwp_float) if plant_kwp_float > 0 else DEFAULT_BASE_CAPACITY)
+        base_capacity = (calculate_initial_base_capacity(plant_kwp_float) if plant_kwp_float > 0 else DEFAULT_BASE_CAPACITY)
         
         # --- Interne Zustände des Modells ---
         self.data_lock = asyncio.Lock() 
-        self.weights = DEFAULT_WEIGHTS.copy()
+        # Gesetzt, sobald Gewichte, History und Profile geladen sind (Fast-Start: im Hintergrund)
+        self.initial_load_done = asyncio.Event()
+        # Aktives Modell (Gewichte, Basiskapazität, Stundenprofil), wird nur als Ganzes ersetzt.
+        # Das Stundenprofil (normierte Anteile je Zeitslot) ist bis zum Laden None.
+        self.model = ModelState(DEFAULT_WEIGHTS, base_capacity)
+        # Schattenmodell: lernt nachts weiter und ersetzt das aktive Modell nur, wenn es besser ist
+        self.candidate_model: ModelState | None = None
+        self.shadow_report = None
+        # Tagesfehler von Kandidat und aktivem Modell, jeweils vor dem Lernen des Tages
+        self.shadow_errors: Dict[str, Any] = {}
         self.daily_predictions = {}
+        self.history_journal = HistoryJournal(HISTORY_FILE, HISTORY_JOURNAL_FILE)
+        self.transaction_manifest = TRANSACTION_MANIFEST_FILE.format(entry_id=entry.entry_id)
+        # Abgeleitete Zustände gehören je einem Eintrag
+        self.rls_state_file = RLS_STATE_FILE.format(entry_id=entry.entry_id)
+        self.rolling_stats_file = ROLLING_STATS_FILE.format(entry_id=entry.entry_id)
+        self.profile_state_file = HOURLY_PROFILE_STATE_FILE.format(entry_id=entry.entry_id)
+        self.state_snapshot_file = STATE_SNAPSHOT_FILE.format(entry_id=entry.entry_id)
+        # Spaltenorientierte Kopie der History für die Statistik-Berechnungen
+        self.columnar_history = ColumnarHistory(slots=self.slots_per_day)
+        # Monatsaggregate der archivierten ("kalten") Tage
+        self.history_archive = {}
+        # Write-Behind: Die History im Speicher ist maßgeblich, Änderungen werden
+        # vorgemerkt und entprellt in einem einzigen Executor-Job persistiert.
+        self._pending_history_records = []
+        self._weights_dirty = False
+        self._stats_dirty = False
+        self._profile_dirty = False
+        self._state_dirty = False
+        self._last_state_snapshot = None
+        # Verschachtelungstiefe offener Unit-of-Work-Blöcke (siehe _unit_of_work)
+        self._unit_of_work_depth = 0
+        self._flush_debouncer = Debouncer(
+            hass, _LOGGER, cooldown=PERSIST_DEBOUNCE_SECONDS, immediate=False,
+            function=self._async_flush_pending,
+        )
         self.accuracy = 0.0
         self.last_forecast_date = None
         self.last_update = datetime.now()
         self.next_hour_pred = 0.0
-        self.hourly_profile = None 
-        self.today_hourly_data = {}
-        self.last_hourly_collection = None
+        self.next_hour_pred_target = None
+        self._restored_next_hour_target = None
+        # Gleitender Median je Stunde, nachts inkrementell aktualisiert
+        self.profile_estimator = StreamingHourlyProfile(HOURLY_PROFILE_WINDOW_DAYS, self.slots_per_day)
+        # Heutige Energie je Zeitslot in kWh (NaN = noch nicht gemessen)
+        self.today_slot_kwh = np.full(self.slots_per_day, np.nan)
+        self.last_slot_collection = None
+        # Trapez-Integration des Leistungssensors, liefert abgeschlossene Slots in kWh
+        self.energy_integrator = EnergyIntegrator(
+            slot_seconds=self.slot_minutes * 60, utc_offset_seconds=dt_util.now().utcoffset().total_seconds()
+        )
         self.weather_type = self._detect_weather_type()
         self.forecast_method = None
+        # Geparste Stundenprognose, wiederverwendet solange dieselbe Antwort vorliegt
+        self._hourly_table = None
+        self._hourly_table_source = None
+        # Produktionskurve für heute und morgen (2 × slots_per_day Werte), siehe _update_production_curve
+        self.production_curve = None
+        self._revalidation_task = None
+        # Laufender Lernlauf (Hintergrund-Task des Eintrags) und die Objekte (Modelle, Profil-Schätzer),
+        # von denen sein Schnappschuss stammt
+        self._learning_task = None
+        self._learning_sources = (None, None, None)
+        # Eingaben der letzten Prognose (Wetterwerte + Sensoren), siehe _forecast_inputs
+        self._last_forecast_inputs = None
+        self._weather_changed = False
+        self._unsub_listeners = []
+        self._input_debouncer = Debouncer(
+            hass, _LOGGER, cooldown=EVENT_REFRESH_DEBOUNCE_SECONDS, immediate=False,
+            function=self._async_refresh_from_inputs,
+        )
         self.data = {"heute": 0.0, "morgen": 0.0, "genauigkeit": 0.0}
         self.last_successful_learning = None
         self.last_day_error_kwh = None
         self.average_yield_30_days = 0.0
+        self.average_yield_previous_years = None
+        # Rolling-MAPE/Bias/RMSE/Ertrag, O(1) pro gelerntem Tag
+        self.rolling_stats = RollingStatistics(self.rolling_windows)
         self.production_time_today = "Noch keine Produktion"
         self.autarky_today = None
         self.peak_production_time_today = "Wird berechnet..."
 
-        # --- Initialisierung und Zeitplanung ---
-        async_track_time_change(hass, self._morning_forecast, hour=6, minute=0, second=0)
-        async_track_time_change(hass, self._midnight_learning, hour=23, minute=0, second=0)
-        if self.current_power_sensor:
-            async_track_time_change(hass, self._collect_hourly_data, minute=0, second=0)
+    # Gewichte, Basiskapazität und Profil sind Teile des aktiven Modells. Zuweisungen
+    # ersetzen das Modell als Ganzes; Leser sehen so nie einen halb geänderten Stand.
+    @property
+    def weights(self):
+        return self.model.weights
+
+    @weights.setter
+    def weights(self, value):
+        self.model = self.model.replace(weights=value)
+
+    @property
+    def base_capacity(self) -> float:
+        return self.model.base_capacity
+
+    @base_capacity.setter
+    def base_capacity(self, value: float):
+        self.model = self.model.replace(base_capacity=value)
+
+    @property
+    def hourly_profile(self):
+        return self.model.hourly_profile
+
+    @hourly_profile.setter
+    def hourly_profile(self, value):
+        self.model = self.model.replace(hourly_profile=value)
 
-    
     async def async_load_initial_data(self):
         """
         Führt initiales Laden von persistenten Daten (Weights, History, Profile) durch.
         Wird von __init__.py VOR dem ersten Refresh aufgerufen.
         """
-        async with self.data_lock:
-            await self._async_load_weights()
-            await self._load_history()
-            await self._load_hourly_profile() 
-            
-        self._calculate_average_yield() 
-        self._calculate_peak_production_hour() 
+        try:
+            async with self.data_lock:
+                await self._async_load_weights()
+                await self._load_history()
+                await self._load_history_archive()
+                await self._load_rolling_statistics()
+                await self._load_hourly_profile() 
+                await self._load_profile_estimator()
+                
+            self._update_from_rolling_stats()
+            self._calculate_previous_years_yield() 
+            self._calculate_peak_production_hour() 
+        finally:
+            # Geplante Jobs warten auf dieses Event; nie dauerhaft blockieren
+            self.initial_load_done.set()
         if self.notify_startup: await self._notify_start_success()
 
+    async def async_load_state_snapshot(self):
+        """
+        Warmstart: Stellt den zuletzt gespeicherten abgeleiteten Zustand (Prognose,
+        Genauigkeit, Durchschnittsertrag, Peak-Stunde, Stundenprognose, Lernzeitpunkt,
+        Prognose-Methode, heutige Stundenwerte) mit einem einzigen Lesezugriff wieder her.
+        Eine Prognose von heute wird übernommen statt neu beim Wetterdienst abgefragt.
+        """
+        snapshot = await self.hass.async_add_executor_job(_read_history_file, self.state_snapshot_file)
+        if not isinstance(snapshot, dict):
+            _LOGGER.info("Kein gespeicherter Zustand gefunden, Sensoren starten mit Standardwerten.")
+            return
+        try:
+            self._restore_state_snapshot(snapshot)
+            self._last_state_snapshot = snapshot
+            _LOGGER.debug(f"Gespeicherter Zustand wiederhergestellt: {self.data}")
+        except Exception as e: _LOGGER.warning(f"Gespeicherter Zustand ist ungültig und wird ignoriert: {e}")
+
+    def _restore_state_snapshot(self, snapshot: Dict[str, Any]):
+        today = date.today().isoformat()
+        if isinstance(snapshot.get("data"), dict): self.data.update(snapshot["data"])
+        if isinstance(snapshot.get("accuracy"), (int, float)): self.accuracy = snapshot["accuracy"]
+        if isinstance(snapshot.get("average_yield_30_days"), (int, float)): self.average_yield_30_days = snapshot["average_yield_30_days"]
+        if isinstance(snapshot.get("peak_production_time_today"), str): self.peak_production_time_today = snapshot["peak_production_time_today"]
+        if snapshot.get("last_successful_learning"):
+            self.last_successful_learning = dt_util.parse_datetime(snapshot["last_successful_learning"])
+        # Die erkannte Methode gilt nur für dieselbe Entität und denselben Anbieter
+        if (snapshot.get("weather_entity") == self.weather_entity and snapshot.get("weather_type") == self.weather_type
+                and snapshot.get("forecast_method") in ("service", "attribute")):
+            self.forecast_method = snapshot["forecast_method"]
+            _LOGGER.debug(f"Gespeicherte Prognose-Methode '{self.forecast_method}' wird ohne Erkennung verwendet.")
+        if snapshot.get("last_forecast_date") == today:
+            self.last_forecast_date = date.today()
+        if isinstance(snapshot.get("next_hour_pred"), (int, float)):
+            self.next_hour_pred = snapshot["next_hour_pred"]
+            self.next_hour_pred_target = self._restored_next_hour_target = snapshot.get("next_hour_target")
+        # Slotwerte gelten nur für den Tag und die Auflösung, mit der sie gesammelt wurden
+        slot_data = snapshot.get("today_slot_data")
+        if (snapshot.get("date") == today and isinstance(slot_data, dict) and slot_data.get("minutes") == self.slot_minutes
+                and isinstance(slot_data.get("kwh"), list) and len(slot_data["kwh"]) == self.slots_per_day):
+            self.today_slot_kwh = np.array([np.nan if kwh is None else float(kwh) for kwh in slot_data["kwh"]])
+            self.last_slot_collection = snapshot.get("last_slot_collection")
+            self._update_production_time()
+        self.energy_integrator.restore(snapshot.get("energy_integrator"), time.time())
+
+    def _state_snapshot(self) -> Dict[str, Any]:
+        return {
+            "date": date.today().isoformat(),
+            "data": dict(self.data),
+            "last_forecast_date": self.last_forecast_date.isoformat() if self.last_forecast_date else None,
+            "accuracy": self.accuracy,
+            "average_yield_30_days": self.average_yield_30_days,
+            "peak_production_time_today": self.peak_production_time_today,
+            "next_hour_pred": self.next_hour_pred,
+            "next_hour_target": self.next_hour_pred_target,
+            "last_successful_learning": self.last_successful_learning.isoformat() if self.last_successful_learning else None,
+            "weather_entity": self.weather_entity,
+            "weather_type": self.weather_type,
+            "forecast_method": self.forecast_method,
+            "today_slot_data": {
+                "minutes": self.slot_minutes,
+                "kwh": [None if np.isnan(kwh) else float(kwh) for kwh in self.today_slot_kwh],
+            },
+            "last_slot_collection": self.last_slot_collection,
+            "energy_integrator": self.energy_integrator.to_snapshot(),
+        }
+
+    def _next_slot_target(self) -> str:
+        """Beginn des Zeitslots, für den die Kurzfristprognose gilt (ISO-String)."""
+        target = dt_util.now() + timedelta(minutes=self.slot_minutes)
+        return target.replace(minute=target.minute - target.minute % self.slot_minutes, second=0, microsecond=0).isoformat()
+
+    async def async_background_start(self):
+        """
+        Fast-Start: Lädt History und Modell und erstellt die erste Prognose im Hintergrund.
+        Die bereits registrierten Sensoren werden über den Koordinator aktualisiert.
+        """
+        try:
+            await self.async_load_initial_data()
+            await self.async_refresh()
+            _LOGGER.info("✅ Hintergrund-Start abgeschlossen.")
+        except Exception as e: _LOGGER.error(f"❌ Fehler beim Hintergrund-Start: {e}", exc_info=True)
+
     async def _async_update_data(self) -> dict:
         """Haupt-Update-Methode des Koordinators."""
+        await self.initial_load_done.wait()
         today = date.today()
-        if self.last_forecast_date != today:
+        need_daily = self.last_forecast_date != today
+        # Nach einem Warmstart ist die gespeicherte Stundenprognose noch gültig
+        need_hourly = self.enable_hourly and self._restored_next_hour_target != self._next_slot_target()
+        self._restored_next_hour_target = None
+        daily, hourly = await self._async_fetch_weather(need_daily, need_hourly)
+        if need_daily:
             self.production_time_today = "Noch keine Produktion"
             self.autarky_today = None
-            await self._create_forecast()
+            await self._create_forecast(forecasts=daily)
         
-        if self.enable_hourly: await self._predict_next_hour() 
+        if need_hourly: await self._predict_next_hour(hourly_forecasts=hourly) 
         self.last_update = datetime.now()
         
         self.data["average_yield_30_days"] = self.average_yield_30_days
+        self._mark_dirty(state=True)
         return self.data
 
     async def async_manual_forecast(self):
         _LOGGER.info("🔄 Manuelle Prognose durch Button ausgelöst")
-        await self._create_forecast()
-        if self.enable_hourly: await self._predict_next_hour() 
+        await self.initial_load_done.wait()
+        daily, hourly = await self._async_fetch_weather(True, self.enable_hourly)
+        await self._create_forecast(forecasts=daily)
+        if self.enable_hourly: await self._predict_next_hour(hourly_forecasts=hourly) 
+        self._mark_dirty(state=True)
         self.async_set_updated_data(self.data) 
 
     async def async_manual_learning(self):
@@ -168,53 +406,200 @@ class SolarForecastCoordinator(DataUpdateCoordinator):
         return f"{status_emoji} " + " | ".join(parts)
 
     async def _midnight_learning(self, now):
+        """
+        Startet den Lernlauf als Hintergrund-Task des Eintrags (höchstens einer gleichzeitig)
+        und wartet darauf. Beim Entladen wird er abgebrochen und übernimmt nichts mehr.
+        """
+        if self._learning_task is None or self._learning_task.done():
+            self._learning_task = self.entry.async_create_background_task(
+                self.hass, self._async_learning_run(), f"{DOMAIN}_learning_{self.entry.entry_id}"
+            )
+        task = self._learning_task
+        try:
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.cancelled(): raise
+            _LOGGER.info("Lernlauf wurde abgebrochen.")
+
+    async def _async_learning_run(self):
+        """
+        Lernlauf in drei Schritten: unter dem data_lock Ist-Wert und Statistik verbuchen und
+        einen Schnappschuss nehmen; ohne Lock die rechenintensiven Stufen im Executor
+        (learning.run_learning); unter dem Lock das Ergebnis in einem Schritt übernehmen.
+        """
         _LOGGER.info("🌑 Starte Lernprozess...")
+        await self.initial_load_done.wait()
+        snapshot = None
         
         async with self.data_lock:
             try:
-                today_iso = date.today().isoformat()
-                state: State | None = self.hass.states.get(self.power_entity) 
-                actual_value = 0.0
-                if state and state.state not in ['unknown', 'unavailable']:
-                    try:
-                        actual_value = float(state.state)
-                        if actual_value > 0:
-                            if today_iso not in self.daily_predictions: self.daily_predictions[today_iso] = {}
-                            self.daily_predictions[today_iso]['actual'] = actual_value
-                            await self._async_save_history() 
-                            self._calculate_autarky(actual_value)
-                    # --- KORREKTUR (START) ---
-                    # Fängt jetzt TypeError (z.B. float(None)) und ValueError (z.B. float("text")) ab
-                    except (ValueError, TypeError): pass 
-                    # --- KORREKTUR (ENDE) ---
-                
-                if today_iso in self.daily_predictions:
-                    d = self.daily_predictions[today_iso]
-                    pred, actual = d.get('predicted', 0), d.get('actual', 0)
-                    if actual > 0 and pred > 0:
-                        error = actual - pred
-                        self.last_day_error_kwh = error
-                        self.weights['base'] += 0.01 * (error / self.base_capacity)
-                        self.weights['base'] = max(0.5, min(1.5, self.weights['base']))
-                        await self._async_save_weights() 
-                        self._calculate_accuracy()
-                        self._calculate_average_yield()
-                        if self.notify_learning: await self._notify_learning_result(today_iso, pred, actual)
-                        if self.notify_successful_learning: await self._notify_successful_learning(today_iso, error)
-                        self.last_successful_learning = dt_util.now()
-                        _LOGGER.info("✅ Lernprozess erfolgreich abgeschlossen.")
-                        
-                        _LOGGER.info("🧠 Starte Lernen des Stundenprofils...")
-                        await self._calculate_hourly_profile()
-                        self._calculate_peak_production_hour() 
-                        
-                    else:
-                        _LOGGER.warning(f"⏩ Überspringe Lernen für {today_iso}: Actual={actual:.2f}, Predicted={pred:.2f}.")
+                async with self._unit_of_work():
+                    today_iso = date.today().isoformat()
+                    state: State | None = self.hass.states.get(self.power_entity) 
+                    actual_value = 0.0
+                    if state and state.state not in ['unknown', 'unavailable']:
+                        try:
+                            actual_value = float(state.state)
+                            if actual_value > 0:
+                                self._mark_dirty(build_actual_record(today_iso, actual_value))
+                                self._calculate_autarky(actual_value)
+                        # --- KORREKTUR (START) ---
+                        # Fängt jetzt TypeError (z.B. float(None)) und ValueError (z.B. float("text")) ab
+                        except (ValueError, TypeError): pass 
+                        # --- KORREKTUR (ENDE) ---
                 
-                await self._async_save_weights() 
-                await self._async_save_history() 
+                    if today_iso in self.daily_predictions:
+                        d = self.daily_predictions[today_iso]
+                        pred, actual = d.get('predicted', 0), d.get('actual', 0)
+                        if actual > 0:
+                            self.rolling_stats.add(date.today().toordinal(), d.get('predicted'), actual)
+                            self._mark_dirty(stats=True)
+                            self._update_from_rolling_stats()
+                        if actual > 0 and pred > 0:
+                            error = actual - pred
+                            self.last_day_error_kwh = error
+                            snapshot = self._learning_snapshot(error)
+                        else:
+                            _LOGGER.warning(f"⏩ Überspringe Lernen für {today_iso}: Actual={actual:.2f}, Predicted={pred:.2f}.")
             except Exception as e: _LOGGER.error(f"❌ Fehler beim Midnight Learning: {e}", exc_info=True)
+        if snapshot is None: return
 
+        _LOGGER.info("🧠 Lerne Gewichte und Stundenprofil im Hintergrund...")
+        try:
+            result = await self.hass.async_add_executor_job(
+                run_learning, snapshot, TRAINING_RIDGE, TRAINING_MIN_DAYS, RLS_FORGETTING, RLS_INITIAL_VARIANCE,
+                SHADOW_EVAL_DAYS, SHADOW_PROFILE_EVAL_DAYS, SHADOW_MIN_DAYS,
+            )
+        except Exception as e:
+            _LOGGER.error(f"❌ Fehler beim Midnight Learning: {e}", exc_info=True)
+            return
+
+        async with self.data_lock:
+            try:
+                async with self._unit_of_work():
+                    promoted = self._apply_learning_result(snapshot, result)
+            except Exception as e:
+                _LOGGER.error(f"❌ Fehler beim Übernehmen des Lernergebnisses: {e}", exc_info=True)
+                return
+        if self.notify_learning: await self._notify_learning_result(today_iso, pred, actual)
+        if self.notify_successful_learning: await self._notify_successful_learning(today_iso, snapshot.error, promoted)
+        self.last_successful_learning = dt_util.now()
+        self._mark_dirty(state=True)
+        _LOGGER.info("✅ Lernprozess erfolgreich abgeschlossen.")
+
+    def _learning_snapshot(self, error: float) -> LearningSnapshot:
+        """
+        Unveränderliche Eingaben des Lernlaufs (Aufruf unter data_lock). Gelernt wird vom
+        Kandidaten aus (ohne Kandidat: vom aktiven Modell), bewertet gegen das aktive Modell.
+        """
+        model = self.model
+        candidate = self.candidate_model or model
+        self._learning_sources = (model, self.candidate_model, self.profile_estimator)
+        return LearningSnapshot(
+            np.array(self.columnar_history.rows), self.slots_per_day, date.today(), error,
+            dict(candidate.weights), model.base_capacity, self.learning_mode,
+            self.rls_learner.to_snapshot() if self.rls_learner is not None else None,
+            self.profile_estimator.to_snapshot(), HOURLY_PROFILE_WINDOW_DAYS,
+            active_weights=dict(model.weights), active_profile=model.hourly_profile,
+            candidate_profile=candidate.hourly_profile, shadow_errors=dict(self.shadow_errors),
+            archive=self.history_archive,
+        )
+
+    def _apply_learning_result(self, snapshot: LearningSnapshot, result: LearningResult) -> List[str]:
+        """
+        Übernimmt das Ergebnis ohne Unterbrechung (kein await). Das Ergebnis wird zum neuen
+        Kandidaten; Gewichte bzw. Profil, die in der Schattenbewertung nicht schlechter sind
+        als das aktive Modell, werden per einfachem Referenztausch aktiv. Wurde das Modell
+        seit dem Schnappschuss ersetzt (train_model, Neuladen, Neuaufbau des Profils), bleibt
+        der neuere Stand erhalten und der Kandidat wird verworfen.
+        Gibt die aktiv gewordenen Teile zurück ("weights", "profile").
+        """
+        model_source, candidate_source, estimator_source = self._learning_sources
+        report = result.weights_report
+        if self.profile_estimator is estimator_source:
+            self.profile_estimator = result.profile_estimator
+            if result.hourly_profile is None: _LOGGER.warning("Konnte Stundenprofil nicht lernen: Keine validen Verlaufsdaten gefunden.")
+            self._mark_dirty(profile=True)
+        elif result.hourly_profile is not None:
+            _LOGGER.info("Profil-Schätzer wurde während des Lernlaufs neu aufgebaut, gelerntes Profil verworfen.")
+            result.hourly_profile, result.promote_profile = None, False
+
+        if self.model is not model_source or self.candidate_model is not candidate_source:
+            _LOGGER.info("Modell wurde während des Lernlaufs geändert, Kandidat verworfen.")
+            self.candidate_model = None
+            self.shadow_errors = {}
+            self._finish_learning_result(result)
+            return []
+
+        model = self.model
+        candidate = model.replace(
+            weights=result.weights,
+            hourly_profile=result.hourly_profile if result.hourly_profile is not None else model.hourly_profile,
+        )
+        if result.rls_learner is not None: self.rls_learner = result.rls_learner
+        if report.get("skipped"): _LOGGER.info(f"{report['mode']}-Lernen übersprungen ({report['skipped']}), nur das Basisgewicht wurde gelernt.")
+        elif report.get("mode"): _LOGGER.info(f"🧮 Kandidaten-Gewichte gelernt ({report}).")
+
+        promoted = model.replace(
+            weights=candidate.weights if result.promote_weights else model.weights,
+            hourly_profile=candidate.hourly_profile if result.promote_profile else model.hourly_profile,
+        )
+        # Übernommene Teile teilen sich der Kandidat und das aktive Modell; ohne Unterschied kein Kandidat
+        self.candidate_model = None if result.promote_weights and (result.promote_profile or result.hourly_profile is None) else candidate
+        if result.promote_weights or result.promote_profile:
+            self.model = promoted
+        # Ein übernommener Teil ist ab jetzt das aktive Modell; seine Fehler sind die des Kandidaten
+        errors = result.shadow_errors
+        for part, promoted_part in (("weights", result.promote_weights), ("profile", result.promote_profile)):
+            if promoted_part: errors[part] = [[day, candidate_error, candidate_error] for day, candidate_error, _ in errors.get(part, [])]
+        self.shadow_errors = errors
+        self.shadow_report = {"time": dt_util.now().isoformat(), **result.scores}
+        _LOGGER.info(f"🕶️ Schattenbewertung: {result.scores}")
+        if result.promote_profile: _LOGGER.info(f"✅ Stundenprofil erfolgreich aus {result.profile_estimator.day_count} Tagen gelernt.")
+        self._mark_dirty(weights=True, profile=result.promote_profile)
+        self._finish_learning_result(result)
+        return [part for part, promoted_part in (("weights", result.promote_weights), ("profile", result.promote_profile)) if promoted_part]
+
+    def _finish_learning_result(self, result: LearningResult):
+        """Vom Modell unabhängige Teile des Lernergebnisses (Vorjahresvergleich, Peak-Zeit)."""
+        self.average_yield_previous_years = result.average_yield_previous_years
+        self._calculate_peak_production_hour()
+        self._mark_dirty(state=True)
+
+    async def _async_fit_weights(self):
+        """Ridge-Regression aller Gewichte über die Spalten-History (im Executor, auf einer Kopie)."""
+        rows = np.array(self.columnar_history.rows)
+        return await self.hass.async_add_executor_job(
+            fit_weights, rows, self.base_capacity, dict(self.weights), TRAINING_RIDGE, TRAINING_MIN_DAYS
+        )
+
+    async def async_train_model(self, apply: bool = True) -> Dict[str, Any]:
+        """Trainiert alle Gewichte sofort (Service train_model) und gibt den Bericht zurück."""
+        await self.initial_load_done.wait()
+        async with self.data_lock:
+            fitted, report = await self._async_fit_weights()
+            report["applied"] = bool(apply and fitted is not None)
+            if report["applied"]:
+                self.weights = fitted
+                self.candidate_model = None
+                self.shadow_errors = {}
+                self._mark_dirty(weights=True)
+                _LOGGER.info(f"🧮 Gewichte per Regression über {report['days']} Tage gelernt (RMSE {report['rmse_before']} → {report['rmse_after']} kWh).")
+            return report
+
+    async def async_replay_history(self, weights: Dict[str, Any] | None = None, base_capacity: float | None = None,
+                                   days: int | None = None) -> Dict[str, Any]:
+        """
+        Rechnet die gespeicherte History mit dem aktiven Modell nach (Service replay_history).
+        Übergebene Gewichte bzw. Basiskapazität ersetzen die aktiven Werte nur für den Bericht.
+        """
+        await self.initial_load_done.wait()
+        model = self.model
+        overrides = {k: float(v) for k, v in (weights or {}).items() if k in DEFAULT_WEIGHTS and isinstance(v, (int, float))}
+        return await self.hass.async_add_executor_job(
+            replay, np.array(self.columnar_history.rows), {**model.weights, **overrides},
+            model.base_capacity if base_capacity is None else base_capacity, model.hourly_profile, days,
+        )
 
     def _calculate_autarky(self, solar_yield: float):
         if not self.total_consumption_entity: self.autarky_today = None; return
@@ -233,70 +618,204 @@ class SolarForecastCoordinator(DataUpdateCoordinator):
             # --- KORREKTUR (ENDE) ---
 
     def _calculate_peak_production_hour(self):
-        if not self.hourly_profile or not isinstance(self.hourly_profile, dict): 
+        if self.hourly_profile is None or not len(self.hourly_profile): 
             self.peak_production_time_today = "Keine Profildaten"; 
             return
         try:
-            peak_hour_str = max(self.hourly_profile, key=self.hourly_profile.get)
-            peak_hour = int(peak_hour_str)
-            self.peak_production_time_today = f"{peak_hour:02d}:00 - {peak_hour + 1:02d}:00"
+            peak_slot = int(np.argmax(self.hourly_profile))
+            self.peak_production_time_today = self._format_slot_range(peak_slot, peak_slot)
         except (ValueError, TypeError) as e: 
             _LOGGER.error(f"Fehler bei Berechnung der Peak-Stunde: {e}")
             self.peak_production_time_today = "Fehler bei Berechnung"
 
-    async def _create_forecast(self):
+    async def _create_forecast(self, only_if_changed: bool = False, forecasts: List[Dict[str, Any]] | None = None) -> bool:
+        """
+        Erstellt die Tagesprognose für heute und morgen. Mit only_if_changed wird
+        übersprungen, wenn sich keine der verwendeten Eingaben geändert hat.
+        Bereits abgerufene Tagesprognosen können übergeben werden.
+        Gibt zurück, ob eine neue Prognose erstellt wurde.
+        """
+        # Wetter außerhalb des data_lock abrufen, damit ein hängender Dienst nichts blockiert
+        if forecasts is None: forecasts = await self._get_weather_forecast() 
+        if not forecasts or len(forecasts) < 2: 
+            _LOGGER.warning("Keine Wetterdaten für 2 Tage erhalten, Prognose übersprungen.")
+            return False
+
+        # Beide Tage mit demselben Modellstand rechnen, ohne auf den data_lock zu warten
+        data = await self._get_sensor_data()
+        model = self.model
+        heute_kwh = self._predict_day(forecasts[0], data, True, model)
+        morgen_kwh = self._predict_day(forecasts[1], data, False, model)
+        if self._is_night_time() and datetime.now().hour >= 21: heute_kwh = 0.0
+
         async with self.data_lock:
-            await self._load_history() 
             try:
-                forecasts = await self._get_weather_forecast() 
-                
-                if not forecasts or len(forecasts) < 2: 
-                    _LOGGER.warning("Keine Wetterdaten für 2 Tage erhalten, Prognose übersprungen.")
-                    return
-                
-                data = await self._get_sensor_data()
-                heute_kwh = self._predict_day(forecasts[0], data, True)
-                morgen_kwh = self._predict_day(forecasts[1], data, False)
-                if self._is_night_time() and datetime.now().hour >= 21: heute_kwh = 0.0
+                inputs = (self._forecast_inputs(forecasts, data), model)
+                if only_if_changed and inputs == self._last_forecast_inputs and self.last_forecast_date == date.today():
+                    _LOGGER.debug("Prognose-Eingaben unverändert, Neuberechnung übersprungen.")
+                    return False
+                self._last_forecast_inputs = inputs
 
                 today = date.today().isoformat()
-                if today not in self.daily_predictions: self.daily_predictions[today] = {}
-                self.daily_predictions[today].update({'predicted': heute_kwh, 'predicted_morgen': morgen_kwh, 'features': data})
-                await self._async_save_history() 
+                # Der Wetterfaktor wird mitgespeichert, damit das Regressions-Training die Tage nachrechnen kann
+                self._mark_dirty(build_forecast_record(today, heute_kwh, morgen_kwh, data, self._weather_factor(forecasts[0])))
 
                 self.data = {"heute": round(heute_kwh, 2), "morgen": round(morgen_kwh, 2), "genauigkeit": round(self.accuracy, 1)}
                 self.last_forecast_date = date.today()
+                self._mark_dirty(state=True)
                 
                 self.async_set_updated_data(self.data)
                 if self.notify_forecast: await self._notify_forecast(heute_kwh, morgen_kwh)
+                return True
             except Exception as e: _LOGGER.error(f"Fehler bei Prognoseerstellung: {e}", exc_info=True)
+        return False
+
+    @staticmethod
+    def _forecast_inputs(forecasts: List[Dict[str, Any]], data: Dict[str, float]) -> tuple:
+        """Die Werte, von denen _predict_day abhängt (Wetter heute/morgen + Sensoren)."""
+        weather = tuple(
+            (f.get('condition'), f.get('cloud_coverage'), f.get('precipitation')) for f in forecasts[:2]
+        )
+        return weather, tuple(sorted(data.items()))
+
+    # --- Ereignisgesteuerte Aktualisierung ---
+
+    @callback
+    def async_start_listeners(self):
+        """
+        Plant die täglichen Jobs und abonniert Zustandsänderungen und den Wetter-Broker erst,
+        wenn async_setup_entry erfolgreich war. Schlägt die Einrichtung vorher fehl, bleibt so
+        kein Listener zurück. Der Leistungssensor wird erst nach async_load_state_snapshot
+        abonniert, sonst belegt ein frühes Ereignis den Integrator und der gespeicherte Slot
+        geht verloren. Alle Abmelde-Funktionen werden in async_unload aufgerufen.
+        """
+        self._unsub_listeners.extend([
+            async_track_time_change(self.hass, self._morning_forecast, hour=6, minute=0, second=0),
+            async_track_time_change(self.hass, self._midnight_learning, hour=23, minute=0, second=0),
+            async_track_time_change(self.hass, self._nightly_history_maintenance, hour=3, minute=15, second=0),
+        ])
+        slot_starts = list(range(0, 60, self.slot_minutes))
+        if self.current_power_sensor:
+            self._unsub_listeners.append(async_track_time_change(self.hass, self._collect_hourly_data, minute=slot_starts, second=0))
+        if self.enable_hourly and self.slot_minutes < 60:
+            self._unsub_listeners.append(async_track_time_change(self.hass, self._slot_tick, minute=slot_starts, second=5))
+        if self.current_power_sensor:
+            self._unsub_listeners.append(
+                async_track_state_change_event(self.hass, [self.current_power_sensor], self._async_power_changed)
+            )
+        if self.event_driven:
+            self._subscribe_input_changes()
+        self._unsub_listeners.append(
+            self.weather_broker.subscribe(self, self.weather_entity, self.forecast_cache_ttl, self._on_shared_forecast)
+        )
 
-    def _predict_day(self, forecast: Dict, data: Dict, is_today: bool) -> float:
+    def _subscribe_input_changes(self):
+        """Abonniert Zustandsänderungen der Wetter-Entität und aller Eingangssensoren."""
+        entities = [e for e in (self.weather_entity, self.fs_sensor, self.lux_sensor, self.temp_sensor,
+                                self.uv_sensor, self.wind_sensor, self.rain_sensor) if e]
+        self._unsub_listeners.append(async_track_state_change_event(self.hass, entities, self._async_input_changed))
+        # Die nächste Stunde ändert sich auch ohne neue Eingaben
+        if self.enable_hourly:
+            self._unsub_listeners.append(async_track_time_change(self.hass, self._hourly_tick, minute=0, second=30))
+        _LOGGER.info(f"Ereignisgesteuerte Aktualisierung aktiv für: {', '.join(entities)}")
+
+    @callback
+    def _async_input_changed(self, event: Event):
+        """Merkt relevante Änderungen vor; Schübe werden per Debouncer zusammengefasst."""
+        entity_id = event.data.get("entity_id")
+        old_state, new_state = event.data.get("old_state"), event.data.get("new_state")
+        if not self._is_significant_change(entity_id, old_state, new_state): return
+        if entity_id == self.weather_entity: self._weather_changed = True
+        self._input_debouncer.async_schedule_call()
+
+    def _is_significant_change(self, entity_id: str, old_state: State | None, new_state: State | None) -> bool:
+        if new_state is None or new_state.state in ['unknown', 'unavailable']: return False
+        if entity_id == self.weather_entity:
+            # Ob sich die Prognosewerte wirklich geändert haben, prüft _create_forecast
+            return True
+        try:
+            new_value = float(new_state.state)
+        except (ValueError, TypeError):
+            return old_state is None or old_state.state != new_state.state
+        # Vergleich mit dem Wert der letzten Prognose, nicht mit dem Vorzustand:
+        # sonst löst ein langsames Abdriften in vielen kleinen Schritten nie aus
+        reference = self._last_forecast_value(entity_id)
+        if reference is None: return True
+        return abs(new_value - reference) > SIGNIFICANT_SENSOR_CHANGE * max(abs(reference), 1.0)
+
+    def _last_forecast_value(self, entity_id: str) -> float | None:
+        """Sensorwert, mit dem die letzte Prognose gerechnet wurde (None, wenn er fehlte)."""
+        if self._last_forecast_inputs is None: return None
+        (_, sensor_values), _ = self._last_forecast_inputs
+        key = next((k for sensor, k in self._input_sensors() if sensor == entity_id), None)
+        return dict(sensor_values).get(key) if key else None
+
+    def _input_sensors(self) -> List[tuple]:
+        return [(self.lux_sensor,'lux'),(self.temp_sensor,'temp'),(self.wind_sensor,'wind'),(self.uv_sensor,'uv'),(self.fs_sensor,'fs'),(self.rain_sensor,'rain')]
+
+    async def _async_refresh_from_inputs(self):
+        """Entprellte Reaktion auf geänderte Eingaben."""
+        await self.initial_load_done.wait()
+        weather_changed, self._weather_changed = self._weather_changed, False
+        try:
+            daily, hourly = await self._async_fetch_weather(True, self.enable_hourly and weather_changed)
+            forecast_changed = await self._create_forecast(only_if_changed=True, forecasts=daily)
+            if self.enable_hourly and (forecast_changed or weather_changed): await self._predict_next_hour(hourly_forecasts=hourly)
+            if forecast_changed or weather_changed:
+                self._mark_dirty(state=True)
+                self.async_set_updated_data(self.data)
+        except Exception as e: _LOGGER.error(f"Fehler bei ereignisgesteuerter Aktualisierung: {e}", exc_info=True)
+
+    async def _hourly_tick(self, now):
+        """Ereignisgesteuerter Modus: stündliche Stundenprognose (bzw. Tagesprognose bei Tageswechsel)."""
+        await self.initial_load_done.wait()
+        await self.async_refresh()
+
+    async def _slot_tick(self, now):
+        """
+        Unterstündliche Auflösung: Zu Beginn jedes Slots wird die Prognose des nächsten
+        Slots aus der vorhandenen Produktionskurve gelesen (ohne Wetterabruf). Die Entitäten
+        werden direkt benachrichtigt, damit das Polling-Intervall unverändert bleibt.
+        """
+        await self.initial_load_done.wait()
+        self.next_hour_pred_target = self._next_slot_target()
+        self._select_next_slot_prediction()
+        self._mark_dirty(state=True)
+        self.async_update_listeners()
+
+    def _predict_day(self, forecast: Dict, data: Dict, is_today: bool, model: ModelState | None = None) -> float:
         if self._is_night_time() and is_today and datetime.now().hour >= 21: return 0.0
+        if model is None: model = self.model
         try:
-            cond, cloud, precip = forecast.get('condition','cloudy'), forecast.get('cloud_coverage', 50), forecast.get('precipitation', 0)
-            wf = WEATHER_FACTORS.get(cond, 0.4)
-            if cloud is not None: 
-                try: 
-                    cloud_float = float(cloud)
-                    wf *= (0.5 + 0.5 * (1 - (cloud_float / 100.0)))
-                except (ValueError, TypeError):
-                    _LOGGER.warning(f"Ungültiger cloud_coverage Wert: {cloud}, wird ignoriert.")
-            if precip and precip > 0: wf *= 0.5
-            pred = self.base_capacity * wf * self.weights['base']
+            wf = self._weather_factor(forecast)
+            weights = model.weights
+            pred = model.base_capacity * wf * weights['base']
             for st in ['lux', 'temp', 'wind', 'uv', 'rain']:
-                if st in data: pred += data[st] * self.weights.get(st, 0)
+                if st in data: pred += data[st] * weights.get(st, 0)
             if 'rain' in data and data['rain'] > 0.1: pred *= 0.5
             if is_today and 'fs' in data:
-                fs_blend = self.weights.get('fs', 0.5)
+                fs_blend = weights.get('fs', 0.5)
                 pred = (pred * (1 - fs_blend)) + (data['fs'] * fs_blend)
             return max(0, pred)
         except Exception as e: _LOGGER.error(f"Fehler bei _predict_day: {e}"); return 0.0
         
+    @staticmethod
+    def _weather_factor(forecast: Dict) -> float:
+        """Wetterfaktor einer Tagesprognose (Bedingung, Bewölkung, Niederschlag)."""
+        cond, cloud, precip = forecast.get('condition','cloudy'), forecast.get('cloud_coverage', 50), forecast.get('precipitation', 0)
+        wf = WEATHER_FACTORS.get(cond, 0.4)
+        if cloud is not None: 
+            try: 
+                cloud_float = float(cloud)
+                wf *= (0.5 + 0.5 * (1 - (cloud_float / 100.0)))
+            except (ValueError, TypeError):
+                _LOGGER.warning(f"Ungültiger cloud_coverage Wert: {cloud}, wird ignoriert.")
+        if precip and precip > 0: wf *= 0.5
+        return wf
+
     async def _get_sensor_data(self) -> Dict[str, float]:
         data = {}
-        sensors = [(self.lux_sensor,'lux'),(self.temp_sensor,'temp'),(self.wind_sensor,'wind'),(self.uv_sensor,'uv'),(self.fs_sensor,'fs'),(self.rain_sensor,'rain')]
-        for sensor, key in sensors:
+        for sensor, key in self._input_sensors():
             if sensor:
                 state: State | None = self.hass.states.get(sensor)
                 if state and state.state not in ['unknown', 'unavailable']:
@@ -342,15 +861,9 @@ class SolarForecastCoordinator(DataUpdateCoordinator):
 
             # Versuch 1: Service Call (blocking=True ist der Schlüssel)
             try:
-                response = await self.hass.services.async_call(
-                    "weather", 
-                    "get_forecasts", 
-                    {"type": "daily", "entity_id": self.weather_entity}, 
-                    blocking=True, # WICHTIG: Erlaubt das Warten auf die Antwort
-                    return_response=True
-                )
+                # Die Antwort landet im Cache und dient direkt als erste echte Tagesprognose
                 # Prüfen, ob die *Antwort* die *Daten* (forecast) enthält
-                if response and (response.get(self.weather_entity, {}).get("forecast") or response.get("forecast")): 
+                if await self._async_fetch_forecasts("daily"): 
                     _LOGGER.info(f"✅ Wetter-Prognose-Methode 'service' erfolgreich erkannt (Versuch {attempt}).")
                     return "service"
             except Exception as e: 
@@ -375,46 +888,49 @@ class SolarForecastCoordinator(DataUpdateCoordinator):
         """KORRIGIERTER WETTER-ABRUF: Implementiert das funktionierende Muster."""
         if self.forecast_method is None: 
             self.forecast_method = await self._detect_forecast_method()
+            # Wird im Zustands-Snapshot gespeichert und beim nächsten Start direkt verwendet
+            if self.forecast_method: self._mark_dirty(state=True)
             
+        forecasts = []
         if self.forecast_method == "service":
             try:
-                response = await self.hass.services.async_call(
-                    "weather", 
-                    "get_forecasts", 
-                    {"type": "daily", "entity_id": self.weather_entity}, 
-                    blocking=True, 
-                    return_response=True
-                )
-                if response is None: return [] 
-
-                return response.get(self.weather_entity, {}).get("forecast") or response.get("forecast", [])
+                forecasts = await self._async_fetch_forecasts("daily")
             except Exception as e: 
                 _LOGGER.error(f"Service-Forecast fehlgeschlagen: {e}")
         
         elif self.forecast_method == "attribute":
             try:
                 state: State | None = self.hass.states.get(self.weather_entity)
-                return state.attributes.get('forecast', []) if state else []
+                forecasts = state.attributes.get('forecast', []) if state else []
             except Exception as e: 
                 _LOGGER.error(f"Attribut-Forecast fehlgeschlagen: {e}")
                 
-        return []
+        if not forecasts and self.forecast_method is not None:
+            # Die gespeicherte Methode könnte veraltet sein (z. B. Integration aktualisiert)
+            self._schedule_forecast_method_revalidation()
+        return forecasts
+
+    def _schedule_forecast_method_revalidation(self):
+        """Prüft die Prognose-Methode im Hintergrund neu (höchstens eine Prüfung gleichzeitig)."""
+        if self._revalidation_task and not self._revalidation_task.done(): return
+        self._revalidation_task = self.entry.async_create_background_task(
+            self.hass, self._async_revalidate_forecast_method(), f"{DOMAIN}_revalidate_forecast_method"
+        )
+
+    async def _async_revalidate_forecast_method(self):
+        method = await self._detect_forecast_method()
+        if method is None:
+            _LOGGER.warning(f"Prognose-Methode konnte nicht neu erkannt werden, behalte '{self.forecast_method}'.")
+            return
+        if method != self.forecast_method:
+            _LOGGER.info(f"Prognose-Methode gewechselt: '{self.forecast_method}' -> '{method}'.")
+            self.forecast_method = method
+            self._mark_dirty(state=True)
 
     async def _get_hourly_weather_forecasts(self) -> List[Dict[str, Any]]:
         """KORRIGIERTER WETTER-ABRUF: Nutzt blocking=True und fängt None ab."""
         try:
-            response = await self.hass.services.async_call(
-                "weather", 
-                "get_forecasts", 
-                {"type": "hourly", "entity_id": self.weather_entity}, 
-                blocking=True, 
-                return_response=True
-            )
-            if response is None:
-                _LOGGER.warning("Service-Call für stündliche Prognose gab None zurück.")
-                return []
-                
-            forecasts = response.get(self.weather_entity, {}).get("forecast", [])
+            forecasts = await self._async_fetch_forecasts("hourly")
             if forecasts:
                 return forecasts
             _LOGGER.warning("Stündliche Prognose von Wetter-Entität erhalten, aber 'forecast'-Liste ist leer.")
@@ -423,6 +939,67 @@ class SolarForecastCoordinator(DataUpdateCoordinator):
             _LOGGER.error(f"Fehler beim Abrufen der stündlichen Prognose: {e}")
             return []
 
+    async def _async_fetch_forecasts(self, forecast_type: str) -> List[Dict[str, Any]]:
+        """
+        Ruft weather.get_forecasts für den Prognosetyp über den gemeinsamen Broker ab
+        (TTL-Cache je Entität und Typ, ein Abruf für alle gleichzeitig anfragenden Einträge).
+        Hat sich last_updated der Wetter-Entität geändert, wird neu abgerufen.
+        """
+        state: State | None = self.hass.states.get(self.weather_entity)
+        last_updated = state.last_updated if state else None
+        try:
+            return await self.weather_broker.async_get_forecasts(
+                self.weather_entity, forecast_type, last_updated, self.forecast_cache_ttl,
+                lambda: self.hass.services.async_call(
+                    "weather", 
+                    "get_forecasts", 
+                    {"type": forecast_type, "entity_id": self.weather_entity}, 
+                    blocking=True, # WICHTIG: Erlaubt das Warten auf die Antwort
+                    return_response=True
+                ),
+                origin=self,
+            )
+        except WeatherFetchError as e: raise HomeAssistantError(str(e))
+
+    @callback
+    def _on_shared_forecast(self, forecast_type: str, forecasts: List[Dict[str, Any]]):
+        """
+        Neue Antwort, die ein anderer Eintrag für dieselbe Wetter-Entität abgerufen hat.
+        Die Stundenprognose wird direkt übernommen; die Tagesprognose nur im
+        ereignisgesteuerten Modus, der auch sonst bei Wetteränderungen neu rechnet.
+        """
+        if forecast_type == "hourly" and self.enable_hourly:
+            self.hass.async_create_task(self._async_apply_shared_hourly(forecasts))
+        elif forecast_type == "daily" and self.event_driven and self.forecast_method == "service":
+            self.hass.async_create_task(self._create_forecast(only_if_changed=True, forecasts=forecasts))
+
+    async def _async_apply_shared_hourly(self, forecasts: List[Dict[str, Any]]):
+        await self.initial_load_done.wait()
+        try:
+            await self._predict_next_hour(hourly_forecasts=forecasts)
+            self._mark_dirty(state=True)
+            self.async_update_listeners()
+        except Exception as e: _LOGGER.error(f"Fehler beim Übernehmen der gemeinsamen Stundenprognose: {e}", exc_info=True)
+
+    def _get_hourly_forecast_table(self, hourly_forecasts: List[Dict[str, Any]]) -> HourlyForecastTable:
+        """Parst eine Stundenprognose nur, wenn sich die Antwort geändert hat (Cache liefert dasselbe Objekt)."""
+        if hourly_forecasts is not self._hourly_table_source:
+            self._hourly_table = HourlyForecastTable.parse(hourly_forecasts, WEATHER_FACTORS)
+            self._hourly_table_source = hourly_forecasts
+            _LOGGER.debug(f"Stundenprognose geparst: {len(self._hourly_table)} Stunden.")
+        return self._hourly_table
+
+    async def _async_fetch_weather(self, daily: bool, hourly: bool):
+        """
+        Ruft Tages- und Stundenprognose gleichzeitig ab (jeweils nur, falls benötigt).
+        Gibt (daily, hourly) zurück; None für nicht angeforderte Typen.
+        """
+        async def _none(): return None
+        return await asyncio.gather(
+            self._get_weather_forecast() if daily else _none(),
+            self._get_hourly_weather_forecasts() if hourly else _none(),
+        )
+
     def _is_night_time(self) -> bool:
         try:
             now = dt_util.now()
@@ -437,129 +1014,488 @@ class SolarForecastCoordinator(DataUpdateCoordinator):
             
         return datetime.now().hour < 6 or datetime.now().hour >= 21
 
+    @callback
+    def _async_power_changed(self, event: Event):
+        """
+        Jede Leistungsänderung wird sofort integriert (O(1), ohne Lock). Nur wenn dabei
+        eine Stunde abgeschlossen wird, wird sie gesperrt in die History übernommen.
+        """
+        new_state: State | None = event.data.get("new_state")
+        if new_state is None: return
+        timestamp = new_state.last_updated.timestamp()
+        try:
+            completed = self.energy_integrator.add_sample(timestamp, float(new_state.state))
+        except (ValueError, TypeError):
+            # unknown/unavailable oder ungültiger Wert: Lücke, nicht als 0 W werten
+            completed = self.energy_integrator.mark_unavailable(timestamp)
+        if completed: self.hass.async_create_task(self._async_store_completed_slots(completed))
+
+    async def _async_store_completed_slots(self, completed):
+        # Erst nach dem Laden, sonst überschreibt die History-Ladung die Slotwerte
+        await self.initial_load_done.wait()
+        async with self.data_lock:
+            try: self._store_completed_slots(completed)
+            except Exception as e: _LOGGER.error(f"Fehler beim Speichern der Slot-Energie: {e}", exc_info=True)
+
+    def _store_completed_slots(self, completed):
+        """
+        Übernimmt abgeschlossene Slots (absoluter Slot, kWh) in today_slot_kwh und das Journal.
+        Bei unterstündlicher Auflösung werden zusätzlich die Stundensummen fortgeschrieben,
+        die Archiv und Stundenstatistik weiterhin verwenden.
+        """
+        if not completed: return
+        today = date.today().isoformat()
+        records, touched_hours = [], set()
+        for absolute_slot, kwh in completed:
+            start = dt_util.as_local(dt_util.utc_from_timestamp(self.energy_integrator.slot_start(absolute_slot)))
+            day, slot = start.date().isoformat(), (start.hour * 60 + start.minute) // self.slot_minutes
+            if day == today: self.today_slot_kwh[slot] = kwh
+            if day not in self.daily_predictions: continue
+            # Nur geänderte Slots ins Journal schreiben (O(Record) statt O(History))
+            if self.slot_minutes == 60:
+                if (self.daily_predictions[day].get('hourly_data') or {}).get(str(slot)) != kwh:
+                    records.append(build_hourly_record(day, slot, kwh))
+            else:
+                if self._stored_slot_values(day)[slot] != kwh:
+                    records.append(build_slot_record(day, self.slot_minutes, slot, kwh))
+                touched_hours.add((day, start.hour))
+        self._mark_dirty(*records)
+
+        per_hour = 60 // self.slot_minutes
+        hour_records = []
+        for day, hour in sorted(touched_hours):
+            known = [kwh for kwh in self._stored_slot_values(day)[hour * per_hour:(hour + 1) * per_hour] if kwh is not None]
+            total = round(sum(known), 4)
+            if known and (self.daily_predictions[day].get('hourly_data') or {}).get(str(hour)) != total:
+                hour_records.append(build_hourly_record(day, hour, total))
+        self._update_production_time()
+        self._mark_dirty(*hour_records, state=True)
+
+    def _stored_slot_values(self, day: str) -> List[Any]:
+        """Gespeicherte Slotwerte eines Tages in der aktuellen Auflösung (None = fehlt)."""
+        slot_data = self.daily_predictions.get(day, {}).get('slot_data')
+        if isinstance(slot_data, dict) and slot_data.get('minutes') == self.slot_minutes:
+            return slot_data['kwh']
+        return [None] * self.slots_per_day
+
     async def _collect_hourly_data(self, now):
+        """
+        Zu Beginn jedes Slots: Schließt den vergangenen Slot im Energie-Integrator ab, auch
+        wenn der Sensor seit seiner letzten Meldung unverändert ist (der Wert wird gehalten).
+        """
         if not self.current_power_sensor: return
+        await self.initial_load_done.wait()
+        slot = (now.hour * 60 + now.minute) // self.slot_minutes
         
-        if now.hour == 0 and (self.last_hourly_collection is None or self.last_hourly_collection != 0):
-            _LOGGER.debug("Neuer Tag erkannt (0 Uhr): Setze today_hourly_data zurück.")
-            self.today_hourly_data = {}
+        if slot == 0 and (self.last_slot_collection is None or self.last_slot_collection != 0):
+            _LOGGER.debug("Neuer Tag erkannt (0 Uhr): Setze today_slot_kwh zurück.")
+            self.today_slot_kwh = np.full(self.slots_per_day, np.nan)
         
-        if self.last_hourly_collection == now.hour: return
+        if self.last_slot_collection == slot: return
 
         async with self.data_lock:
             try:
-                hour = now.hour
-                if self.last_hourly_collection == hour: return
-                
-                state: State | None = self.hass.states.get(self.current_power_sensor)
-                kwh_this_hour = 0.0
-                if state and state.state not in ['unknown', 'unavailable']:
-                    try:
-                        power_watts = float(state.state)
-                        kwh_this_hour = power_watts / 1000.0
-                    except (ValueError, TypeError):
-                        _LOGGER.debug(f"Ungültiger Wert '{state.state}' vom Sensor {self.current_power_sensor}, setze Stunde auf 0 kWh.")
-                        kwh_this_hour = 0.0
-                    except Exception as e:
-                        _LOGGER.error(f"Unerwarteter Fehler beim Lesen von {self.current_power_sensor}: {e}", exc_info=True)
-                        kwh_this_hour = 0.0
-                        
-                    self.today_hourly_data[hour] = kwh_this_hour
-                    self.last_hourly_collection = hour
-                    self._update_production_time()
-                    today = date.today().isoformat()
-                    if today in self.daily_predictions:
-                        if 'hourly_data' not in self.daily_predictions[today]: self.daily_predictions[today]['hourly_data'] = {}
-                        self.daily_predictions[today]['hourly_data'].update(self.today_hourly_data)
-                        await self._async_save_history() 
+                if self.last_slot_collection == slot: return
+                self._store_completed_slots(self.energy_integrator.close_until(now.timestamp()))
+                self.last_slot_collection = slot
+                self._mark_dirty(state=True)
             except Exception as e: _LOGGER.error(f"Fehler bei stündlicher Datensammlung: {e}", exc_info=True)
     
-    def _calculate_average_yield(self):
-        actuals = [v.get('actual', 0) for v in list(self.daily_predictions.values())[-30:] if isinstance(v, dict) and v.get('actual', 0) > 0]
-        if actuals: self.average_yield_30_days = round(sum(actuals) / len(actuals), 2)
+    def _update_from_rolling_stats(self):
+        """Übernimmt Genauigkeit und 30-Tage-Durchschnitt aus den Rolling-Statistiken (O(1))."""
+        self.rolling_stats.expire(date.today().toordinal())
+        metrics = self.rolling_stats.metrics(30)
+        if metrics["mape"] is not None: self.accuracy = max(0, 100 - metrics["mape"])
+        if metrics["mean_yield"] is not None: self.average_yield_30_days = metrics["mean_yield"]
+
+    def _calculate_previous_years_yield(self):
+        """Vergleich: dasselbe 30-Tage-Fenster in den Vorjahren (History-Index, ältere Jahre aus dem Archiv)."""
+        self.average_yield_previous_years = previous_years_yield(
+            self.columnar_history.rows, self.slots_per_day, date.today(), self.history_archive
+        )
 
     def _update_production_time(self):
-        prod_hours = [h for h, kwh in self.today_hourly_data.items() if kwh > 0]
-        if prod_hours: self.production_time_today = f"{min(prod_hours):02d}:00 - {max(prod_hours) + 1:02d}:00"
+        prod_slots = np.flatnonzero(self.today_slot_kwh > 0)
+        if len(prod_slots): self.production_time_today = self._format_slot_range(int(prod_slots[0]), int(prod_slots[-1]))
         else: self.production_time_today = "Noch keine Produktion"
 
+    def _format_slot_range(self, first_slot: int, last_slot: int) -> str:
+        """Zeitraum vom Beginn von first_slot bis zum Ende von last_slot, z. B. "10:00 - 11:00"."""
+        start, end = first_slot * self.slot_minutes, (last_slot + 1) * self.slot_minutes
+        return f"{start // 60:02d}:{start % 60:02d} - {end // 60:02d}:{end % 60:02d}"
+
     async def _load_hourly_profile(self): 
-        self.hourly_profile = await self.hass.async_add_executor_job(_read_history_file, HOURLY_PROFILE_FILE)
-        if not self.hourly_profile or not isinstance(self.hourly_profile, dict): 
-            self.hourly_profile = {str(h): (1/24) for h in range(24)} 
-            _LOGGER.info("Kein Stundenprofil gefunden oder ungültig, starte mit gleichmäßigem Profil.")
+        stored = await self.hass.async_add_executor_job(_read_history_file, HOURLY_PROFILE_FILE)
+        profile = self._parse_hourly_profile(stored)
+        if profile is not None:
+            self.hourly_profile = profile
+        else:
+            self.hourly_profile = np.full(self.slots_per_day, 1 / self.slots_per_day)
+            _LOGGER.info("Kein Stundenprofil für die gewählte Auflösung gefunden oder ungültig, starte mit gleichmäßigem Profil.")
+
+    def _parse_hourly_profile(self, stored: Any):
+        """Profil aus hourly_profile.json als Array; None bei fehlendem/ungültigem Profil oder anderer Auflösung."""
+        if not isinstance(stored, dict): return None
+        try:
+            if "profile" in stored:
+                if stored.get("slot_minutes") != self.slot_minutes or len(stored["profile"]) != self.slots_per_day: return None
+                return np.array(stored["profile"], dtype=float)
+            # Altes Format {"0": Anteil, ..., "23": Anteil} gilt nur für Stundenauflösung
+            if self.slot_minutes == 60: return np.array([float(stored.get(str(h), 0.0)) for h in range(24)])
+        except (ValueError, TypeError): return None
+        return None
+
+    async def _load_profile_estimator(self):
+        """Stellt den Profil-Schätzer wieder her (Fallback: einmaliger Aufbau aus der History)."""
+        snapshot = await self.hass.async_add_executor_job(_read_history_file, self.profile_state_file)
+        estimator = StreamingHourlyProfile.from_snapshot(snapshot, HOURLY_PROFILE_WINDOW_DAYS, self.slots_per_day)
+        if estimator is None:
+            _LOGGER.info("Kein Zustand für das Stundenprofil gefunden, baue ihn aus der History auf.")
+            estimator = await self._async_seed_profile_estimator()
+            # Z. B. nach einem Wechsel der Auflösung: Profil direkt aus dem neuen Schätzer
+            if estimator.day_count: self.hourly_profile = self._normalize_hourly_profile(estimator.medians())
+            self._mark_dirty(profile=True)
+        self.profile_estimator = estimator
+
+    async def _async_rebuild_derived_state(self):
+        """Baut Rolling-Statistiken und Profil-Schätzer im Executor aus einer Kopie der History neu auf."""
+        return await self.hass.async_add_executor_job(
+            rebuild_derived_state, np.array(self.columnar_history.rows), self.slots_per_day, date.today(),
+            self.rolling_windows, HOURLY_PROFILE_WINDOW_DAYS,
+        )
 
-    async def _async_save_hourly_profile(self): 
-        await self.hass.async_add_executor_job(_write_history_file, HOURLY_PROFILE_FILE, self.hourly_profile)
-        _LOGGER.info(f"Stundenprofil gespeichert.")
+    async def _async_seed_profile_estimator(self) -> StreamingHourlyProfile:
+        """Baut den Profil-Schätzer im Executor aus einer Kopie des Profil-Zeitfensters auf."""
+        rows = np.array(self.columnar_history.last_days(HOURLY_PROFILE_WINDOW_DAYS, date.today()))
+        return await self.hass.async_add_executor_job(
+            StreamingHourlyProfile.from_rows, rows, HOURLY_PROFILE_WINDOW_DAYS, self.slots_per_day
+        )
 
     async def _async_load_weights(self): 
         d = await self.hass.async_add_executor_job(_read_history_file, WEIGHTS_FILE)
         if d and isinstance(d, dict): 
             valid_keys = list(DEFAULT_WEIGHTS.keys()) + ['base_capacity']
             loaded_weights = {k: v for k, v in d.items() if k in valid_keys and isinstance(v, (int, float))}
-            self.weights.update(loaded_weights)
-            self.base_capacity = loaded_weights.get('base_capacity', self.base_capacity)
+            base_capacity = loaded_weights.pop('base_capacity', self.base_capacity)
+            self.model = self.model.replace(weights={**DEFAULT_WEIGHTS, **loaded_weights}, base_capacity=base_capacity)
+            candidate = d.get('candidate')
+            self.candidate_model = None
+            self.shadow_errors = d.get('shadow_errors') if isinstance(d.get('shadow_errors'), dict) else {}
+            if isinstance(candidate, dict):
+                candidate_weights = {k: v for k, v in candidate.items() if k in DEFAULT_WEIGHTS and isinstance(v, (int, float))}
+                self.candidate_model = self.model.replace(weights={**self.weights, **candidate_weights})
             _LOGGER.info("Gewichte erfolgreich geladen.")
         else:
             _LOGGER.info("Keine gültigen Gewichte gefunden, verwende Standardwerte.")
+        if self.learning_mode == LEARNING_MODE_RLS:
+            snapshot = await self.hass.async_add_executor_job(_read_history_file, self.rls_state_file)
+            self.rls_learner = RecursiveLeastSquares.from_snapshot(snapshot, RLS_FORGETTING, RLS_INITIAL_VARIANCE)
 
-    async def _async_save_weights(self): 
-        await self.hass.async_add_executor_job(_write_history_file, WEIGHTS_FILE, {**self.weights, 'base_capacity': self.base_capacity})
-        _LOGGER.debug("Gewichte gespeichert.")
     
-    async def _load_history(self): 
-        self.daily_predictions = await self.hass.async_add_executor_job(_read_history_file, HISTORY_FILE)
-        if not self.daily_predictions or not isinstance(self.daily_predictions, dict): 
-            self.daily_predictions = {} 
+    async def _load_history(self, force_convert: bool = False): 
+        self.daily_predictions, self.columnar_history = await self.hass.async_add_executor_job(
+            self._read_history_blocking, force_convert
+        )
         _LOGGER.debug(f"History geladen: {len(self.daily_predictions)} Tage.")
+
+    def _read_history_blocking(self, force_convert: bool):
+        """
+        Blockierend: Lädt Snapshot + Journal und bindet die Spalten-History per mmap ein.
+        Fehlt die Spalten-Datei oder stammt sie nicht (mehr) aus dem aktuellen Snapshot und
+        Journal-Anfang (Kennung neben der .npy), wird sie einmalig aus der JSON-History konvertiert.
+        """
+        days, records = self.history_journal.load()
+
+        columnar = None
+        if not force_convert and source_matches(HISTORY_COLUMNAR_SOURCE_FILE, HISTORY_FILE, HISTORY_JOURNAL_FILE):
+            columnar = ColumnarHistory.load(HISTORY_COLUMNAR_FILE, self.slots_per_day)
+        elif not force_convert:
+            _LOGGER.info("Spalten-History passt nicht zur JSON-History (geändert oder wiederhergestellt).")
+        if columnar is not None:
+            # Journal-Records sind idempotent, auch bereits eingerechnete dürfen erneut angewendet werden
+            for record in records:
+                columnar.apply_record(record)
+        if columnar is None or len(columnar) != count_valid_days(days):
+            _LOGGER.info(f"Konvertiere History ({len(days)} Tage) in Spaltenform...")
+            columnar = ColumnarHistory.from_days(days, self.slots_per_day)
+            saved = columnar.save(HISTORY_COLUMNAR_FILE)
+            save_source_fingerprint(HISTORY_COLUMNAR_SOURCE_FILE, source_fingerprint(HISTORY_FILE, HISTORY_JOURNAL_FILE) if saved else None)
+        return days, columnar
     
-    async def _async_save_history(self): 
-        today = date.today()
-        cutoff_date = today - timedelta(days=365)
-        keys_to_delete = []
-        for day_str in list(self.daily_predictions.keys()):
-            if not isinstance(day_str, str) or len(day_str) != 10 or day_str[4] != '-' or day_str[7] != '-':
-                _LOGGER.warning(f"Ungültiger Datumsschlüssel '{day_str}' in History gefunden, wird ignoriert.")
-                continue
+    async def async_reload_history(self):
+        """Verwirft den Speicherstand und liest die History explizit neu von der Platte."""
+        await self.initial_load_done.wait()
+        async with self.data_lock:
+            await self._async_flush_pending_locked()
+            await self._load_history(force_convert=True)
+            self.rolling_stats, self.profile_estimator = await self._async_rebuild_derived_state()
+            self._mark_dirty(stats=True, profile=True)
+            self._update_from_rolling_stats()
+            self._calculate_previous_years_yield()
+        _LOGGER.info(f"🔄 History neu geladen: {len(self.daily_predictions)} Tage.")
+
+    async def async_backfill_history(self, days: int = BACKFILL_DEFAULT_DAYS, overwrite: bool = False, database: str | None = None) -> Dict[str, Any]:
+        """
+        Befüllt die History der letzten `days` Tage (ohne heute) aus den Langzeitstatistiken
+        des Recorders bzw. einer SQLite-Recorder-Datei: Ist-Ertrag, Verbrauch und Stundenwerte.
+        Tage mit vorhandenem Ist-Wert bleiben ohne overwrite unverändert. Danach werden
+        Spalten-History, Profil-Schätzer und Rolling-Statistiken neu aufgebaut.
+        """
+        await self.initial_load_done.wait()
+        statistic_ids = [e for e in (self.power_entity, self.current_power_sensor, self.total_consumption_entity) if e]
+        today_start = dt_util.start_of_local_day()
+        first_day = (today_start.date() - timedelta(days=days)).isoformat()
+        # Eine Stunde früher beginnen: erste Differenz der kumulierten Summe
+        start = dt_util.start_of_local_day(today_start.date() - timedelta(days=days)) - timedelta(hours=1)
+
+        accumulator = BackfillAccumulator(self.power_entity, self.current_power_sensor, self.total_consumption_entity, self._local_day_hour)
+        for window_start, window_end in batch_windows(start.timestamp(), today_start.timestamp(), BACKFILL_BATCH_DAYS * 86400):
+            accumulator.add(await self._async_read_statistics(statistic_ids, window_start, window_end, database))
+        backfilled = {day: values for day, values in accumulator.days().items() if day >= first_day}
+
+        result = {"statistic_rows": accumulator.rows, "days_found": len(backfilled), "days_written": 0, "days_skipped": 0, "hours_written": 0}
+        async with self.data_lock:
+            records = []
+            for day, values in sorted(backfilled.items()):
+                if not values["actual"] or values["actual"] <= 0: continue
+                if not overwrite and (self.daily_predictions.get(day, {}).get('actual') or 0) > 0:
+                    result["days_skipped"] += 1
+                    continue
+                records.append(build_actual_record(day, values["actual"], values["consumption"]))
+                records.extend(build_hourly_record(day, hour, kwh) for hour, kwh in values["hourly"].items())
+                result["days_written"] += 1
+                result["hours_written"] += len(values["hourly"])
+
+            if records:
+                async with self._unit_of_work():
+                    self._mark_dirty(*records)
+                    # Einmaliger Neuaufbau statt vieler Einzelnachträge (auch für unterstündliche Slots)
+                    await self._async_compact_history()
+                    self.rolling_stats, self.profile_estimator = await self._async_rebuild_derived_state()
+                    if self.profile_estimator.day_count:
+                        self.hourly_profile = self._normalize_hourly_profile(self.profile_estimator.medians())
+                    self._mark_dirty(stats=True, profile=True, state=True)
+                    self._update_from_rolling_stats()
+                    self._calculate_previous_years_yield()
+                    self._calculate_peak_production_hour()
+        _LOGGER.info(f"📥 History-Backfill abgeschlossen: {result}")
+        return result
+
+    def _local_day_hour(self, timestamp: float):
+        local = dt_util.as_local(dt_util.utc_from_timestamp(timestamp))
+        return local.date().isoformat(), local.hour
+
+    async def _async_read_statistics(self, statistic_ids: List[str], start_ts: float, end_ts: float, database: str | None):
+        """Ein Abfragefenster der stündlichen Langzeitstatistiken, immer im Executor."""
+        if database:
+            return await self.hass.async_add_executor_job(read_recorder_statistics, database, statistic_ids, start_ts, end_ts)
+        # Erst hier importieren: Der Recorder ist keine harte Abhängigkeit der Integration
+        from homeassistant.components.recorder import get_instance
+        from homeassistant.components.recorder.statistics import statistics_during_period
+        return await get_instance(self.hass).async_add_executor_job(
+            statistics_during_period, self.hass, dt_util.utc_from_timestamp(start_ts), dt_util.utc_from_timestamp(end_ts),
+            set(statistic_ids), "hour", None, set(STATISTIC_TYPES),
+        )
+
+    async def async_unload(self):
+        """Schreibt beim Entladen alle noch vorgemerkten Änderungen sofort weg."""
+        for unsub in self._unsub_listeners: unsub()
+        self._unsub_listeners = []
+        # Ein laufender Lernlauf übernimmt nach dem Entladen nichts mehr
+        if self._learning_task is not None and not self._learning_task.done(): self._learning_task.cancel()
+        self._input_debouncer.async_shutdown()
+        self._flush_debouncer.async_shutdown()
+        await self._async_flush_pending()
+
+    def _mark_dirty(self, *records, weights: bool = False, stats: bool = False, profile: bool = False, state: bool = False):
+        """
+        Wendet History-Records im Speicher an und merkt sie (und ggf. Gewichte,
+        Rolling-Statistiken, Stundenprofil bzw. Sensor-Zustand) für den nächsten
+        entprellten Flush vor. Kosten: O(Record).
+        """
+        for record in records:
+            apply_history_record(self.daily_predictions, record)
+            self.columnar_history.apply_record(record)
+        self._pending_history_records.extend(records)
+        self._weights_dirty = self._weights_dirty or weights
+        self._stats_dirty = self._stats_dirty or stats
+        self._profile_dirty = self._profile_dirty or profile
+        self._state_dirty = self._state_dirty or state
+        if (records or weights or stats or profile or state) and not self._unit_of_work_depth:
+            self._flush_debouncer.async_schedule_call()
+
+    async def _async_flush_pending(self):
+        async with self.data_lock:
             try:
-                day_date = date.fromisoformat(day_str)
-                if day_date < cutoff_date:
-                    keys_to_delete.append(day_str)
-            except ValueError:
-                _LOGGER.warning(f"Ungültiger Datumsschlüssel '{day_str}' in History gefunden, wird ignoriert.")
-
-        if keys_to_delete:
-            _LOGGER.info(f"Entferne {len(keys_to_delete)} alte History-Einträge (älter als 365 Tage)...")
-            for key in keys_to_delete:
-                try:
-                    del self.daily_predictions[key]
-                except KeyError:
-                    pass
-            _LOGGER.info("Alte History-Einträge entfernt.")
-            
-        await self.hass.async_add_executor_job(_write_history_file, HISTORY_FILE, self.daily_predictions)
-        _LOGGER.debug(f"History gespeichert: {len(self.daily_predictions)} Tage.")
+                await self._async_flush_pending_locked()
+            except Exception as e: _LOGGER.error(f"Fehler beim Speichern vorgemerkter Daten: {e}", exc_info=True)
+
+    async def _async_flush_pending_locked(self):
+        """Persistiert alle vorgemerkten Änderungen in einem Executor-Job. Erwartet data_lock."""
+        records, self._pending_history_records = self._pending_history_records, []
+        files = {}
+        if self._weights_dirty:
+            files[WEIGHTS_FILE] = {**self.weights, 'base_capacity': self.base_capacity}
+            if self.candidate_model is not None: files[WEIGHTS_FILE]['candidate'] = dict(self.candidate_model.weights)
+            if self.shadow_errors: files[WEIGHTS_FILE]['shadow_errors'] = self.shadow_errors
+        if self._weights_dirty and self.rls_learner is not None: files[self.rls_state_file] = self.rls_learner.to_snapshot()
+        if self._stats_dirty: files[self.rolling_stats_file] = self.rolling_stats.to_snapshot()
+        if self._profile_dirty:
+            files[HOURLY_PROFILE_FILE] = {"slot_minutes": self.slot_minutes, "profile": [float(p) for p in self.hourly_profile]}
+            files[self.profile_state_file] = self.profile_estimator.to_snapshot()
+        if self._state_dirty:
+            # Nur schreiben, wenn sich der abgeleitete Zustand tatsächlich geändert hat
+            state = self._state_snapshot()
+            if state != self._last_state_snapshot: files[self.state_snapshot_file] = self._last_state_snapshot = state
+        self._weights_dirty = self._stats_dirty = self._profile_dirty = self._state_dirty = False
+        if not records and not files: return
 
+        try:
+            journal_size = await self.hass.async_add_executor_job(self._write_pending, records, files)
+        except Exception as e:
+            _LOGGER.error(f"Fehler beim Schreiben vorgemerkter Daten: {e}", exc_info=True)
+            journal_size = None
+        if journal_size is None:
+            # Nicht (vollständig) gespeichert: alles bleibt vorgemerkt, der nächste Versuch ist schon geplant.
+            # Bereits geschriebene Dateien bzw. Records werden dabei idempotent erneut geschrieben.
+            self._pending_history_records[:0] = records
+            self._weights_dirty = self._weights_dirty or WEIGHTS_FILE in files
+            self._stats_dirty = self._stats_dirty or self.rolling_stats_file in files
+            self._profile_dirty = self._profile_dirty or HOURLY_PROFILE_FILE in files
+            if self.state_snapshot_file in files: self._state_dirty, self._last_state_snapshot = True, None
+            _LOGGER.error("❌ Speicher-Transaktion fehlgeschlagen, Änderungen bleiben vorgemerkt.")
+            if not self._unit_of_work_depth: self._flush_debouncer.async_schedule_call()
+            return
+        _LOGGER.debug(f"Vorgemerkte Daten gespeichert: {len(records)} History-Records, Dateien: {[os.path.basename(p) for p in files]}.")
+        if journal_size >= HISTORY_JOURNAL_MAX_BYTES:
+            _LOGGER.debug(f"History-Journal hat {journal_size} Bytes erreicht, kompaktiere...")
+            await self._async_compact_history()
 
-    def _load_last_data(self):
-        if self.daily_predictions:
-            today, yesterday = date.today().isoformat(), (date.today() - timedelta(days=1)).isoformat()
-            last = self.daily_predictions.get(today) or self.daily_predictions.get(yesterday)
-            if last and isinstance(last, dict) and 'predicted' in last: 
-                self.data = {"heute": last.get('predicted',0), "morgen": last.get('predicted_morgen', 0), "genauigkeit": self.accuracy}
+    def _write_pending(self, records, files) -> int | None:
+        """
+        Blockierend: Schreibt die geänderten JSON-Dateien und hängt die Records ans Journal an,
+        als eine Transaktion (alles oder nichts). None, wenn nichts angewendet wurde.
+        """
+        return commit_transaction(self.transaction_manifest, files, self.history_journal, records)
+
+    async def async_recover_pending_transaction(self):
+        """Führt beim Start eine unterbrochene Speicher-Transaktion zu Ende bzw. verwirft sie."""
+        await self.hass.async_add_executor_job(recover_transaction, self.transaction_manifest, self.history_journal)
+
+    async def async_migrate_entry_files(self):
+        """Übernimmt die gemeinsamen Zustandsdateien älterer Versionen, falls dieser Eintrag als erster startet."""
+        await self.hass.async_add_executor_job(_migrate_entry_files, [
+            (LEGACY_RLS_STATE_FILE, self.rls_state_file),
+            (LEGACY_ROLLING_STATS_FILE, self.rolling_stats_file),
+            (LEGACY_HOURLY_PROFILE_STATE_FILE, self.profile_state_file),
+            (LEGACY_STATE_SNAPSHOT_FILE, self.state_snapshot_file),
+        ])
+
+    @asynccontextmanager
+    async def _unit_of_work(self):
+        """
+        Klammert mehrere Änderungen (History, Gewichte, Profil, ...) zu einer Einheit.
+        Innerhalb wird nichts entprellt geschrieben; am Ende werden alle vorgemerkten
+        Änderungen in einer einzigen Transaktion gespeichert. Erwartet data_lock.
+        """
+        self._unit_of_work_depth += 1
+        try:
+            yield
+        except BaseException:
+            self._unit_of_work_depth -= 1
+            # Die Änderungen im Speicher bleiben gültig und werden entprellt geschrieben
+            if not self._unit_of_work_depth: self._flush_debouncer.async_schedule_call()
+            raise
+        self._unit_of_work_depth -= 1
+        if not self._unit_of_work_depth: await self._async_flush_pending_locked()
+
+    async def _load_rolling_statistics(self):
+        """Stellt die Rolling-Statistiken aus dem Snapshot wieder her (Fallback: einmaliger Aufbau aus der History)."""
+        snapshot = await self.hass.async_add_executor_job(_read_history_file, self.rolling_stats_file)
+        stats = RollingStatistics.from_snapshot(snapshot, self.rolling_windows)
+        if stats is None:
+            _LOGGER.info("Kein passender Statistik-Snapshot gefunden, baue Rolling-Statistiken aus der History auf.")
+            stats = await self.hass.async_add_executor_job(
+                RollingStatistics.from_rows, np.array(self.columnar_history.rows), self.rolling_windows
+            )
+            self._mark_dirty(stats=True)
+        self.rolling_stats = stats
+
+    async def _nightly_history_maintenance(self, now):
+        """Geplante Wartung: ältere Monate archivieren, danach Journal kompaktieren."""
+        await self.initial_load_done.wait()
+        async with self.data_lock:
+            try:
+                await self._async_apply_retention()
+                await self._async_compact_history()
+            except Exception as e: _LOGGER.error(f"Fehler bei der History-Wartung: {e}", exc_info=True)
+
+    async def _async_apply_retention(self):
+        """
+        Verdichtet abgeschlossene Monate außerhalb des heißen Fensters zu Monatsaggregaten
+        in prediction_history_archive.json und entfernt sie aus der heißen History.
+        """
+        cutoff = archive_cutoff(date.today(), HISTORY_HOT_DAYS)
+        # Auswahl und Verdichtung laufen im Executor auf Kopien; übernommen wird erst nach dem Speichern
+        archive, keys_to_archive, archived, saved = await self.hass.async_add_executor_job(
+            self._archive_blocking, self.history_archive, dict(self.daily_predictions), cutoff
+        )
+        if not keys_to_archive: return
+        # Erst das Archiv sichern, dann die Tage aus der heißen History entfernen
+        if not saved:
+            _LOGGER.warning("Archiv konnte nicht gespeichert werden, History-Einträge bleiben erhalten.")
+            return
+        self.history_archive = archive
+        for key in keys_to_archive:
+            self.daily_predictions.pop(key, None)
+        _LOGGER.info(f"🗄️ {archived} History-Tage vor {cutoff.isoformat()} in Monatsaggregate archiviert.")
+
+    @staticmethod
+    def _archive_blocking(archive, days, cutoff: date):
+        """Blockierend: Verdichtet die Tage vor dem Stichtag in eine Kopie des Archivs und speichert sie."""
+        keys_to_archive = select_days_to_archive(days, cutoff)
+        if not keys_to_archive: return archive, [], 0, False
+        archive = copy.deepcopy(archive)
+        archived = merge_into_archive(archive, days, keys_to_archive)
+        return archive, keys_to_archive, archived, _write_history_file(HISTORY_ARCHIVE_FILE, archive)
+
+    async def _load_history_archive(self):
+        archive = await self.hass.async_add_executor_job(_read_history_file, HISTORY_ARCHIVE_FILE)
+        self.history_archive = archive if isinstance(archive, dict) else {}
+        _LOGGER.debug(f"History-Archiv geladen: {len(self.history_archive)} Monate.")
+
+    def seasonal_average_yield(self):
+        """Durchschnittlicher Tagesertrag des aktuellen Monats in archivierten Vorjahren."""
+        return seasonal_average_yield(self.history_archive, date.today().month)
+
+    async def _async_compact_history(self) -> bool: 
+        """Schreibt die History als Snapshot und leert das Journal. Gibt zurück, ob der Snapshot geschrieben wurde."""
+        pending = len(self._pending_history_records)
+        self.columnar_history, compacted = await self.hass.async_add_executor_job(self._compact_history_blocking, self.daily_predictions)
+        if not compacted:
+            # Vorgemerkte Records stehen weder im Snapshot noch im Journal und bleiben erhalten
+            _LOGGER.error("❌ History-Snapshot konnte nicht geschrieben werden, vorgemerkte Records bleiben erhalten.")
+            return False
+        # Der Snapshot enthält alle bis hierhin vorgemerkten Records
+        del self._pending_history_records[:pending]
+        _LOGGER.debug(f"History kompaktiert: {len(self.daily_predictions)} Tage.")
+        return True
+
+
+    def _compact_history_blocking(self, days):
+        """Blockierend: Erzeugt die Spalten-History neu und kompaktiert das Journal in den Snapshot."""
+        columnar = ColumnarHistory.from_days(days, self.slots_per_day)
+        saved = columnar.save(HISTORY_COLUMNAR_FILE)
+        compacted = self.history_journal.compact(days)
+        # Nach erfolgreicher Kompaktierung entspricht die .npy genau dem neuen Snapshot (leeres Journal);
+        # sonst wird die Kennung entfernt und die .npy beim nächsten Start neu konvertiert
+        fingerprint = source_fingerprint(HISTORY_FILE, HISTORY_JOURNAL_FILE, 0) if saved and compacted else None
+        save_source_fingerprint(HISTORY_COLUMNAR_SOURCE_FILE, fingerprint)
+        return columnar, compacted
 
     async def _notify_start_success(self):
         await self.hass.services.async_call("persistent_notification", "create", {"title": "✅ SolarForecastML gestartet", "message": f"Basiskapazität: {self.base_capacity:.2f} kWh", "notification_id": "solar_forecast_ml_start"})
 
-    def _calibrate_base_capacity(self):
-        actuals = [v.get('actual',0) for v in self.daily_predictions.values() if isinstance(v,dict) and v.get('actual',0)>0]
-        if actuals:
-            avg = sum(actuals)/len(actuals)
-            if avg > self.base_capacity * 0.5: 
-                self.base_capacity = avg
-                self.hass.async_create_task(self._async_save_weights()) 
-
     async def _morning_forecast(self, now):
         await self._create_forecast()
 
@@ -567,77 +1503,68 @@ class SolarForecastCoordinator(DataUpdateCoordinator):
         error = (actual - pred) / actual * 100 if actual > 0 else 0
         await self.hass.services.async_call("persistent_notification", "create", {"title": f"💡 Lern-Ergebnis {date_str}", "message": f"Prognose: {pred:.2f}, Tatsächlich: {actual:.2f}, Abweichung: {error:.1f}%", "notification_id": "solar_forecast_ml_learning"})
         
-    async def _notify_successful_learning(self, date_str: str, error: float):
+    async def _notify_successful_learning(self, date_str: str, error: float, promoted: List[str]):
+        if "weights" in promoted and "profile" in promoted: outcome = "Gewichte und Stundenprofil wurden angepasst."
+        elif "weights" in promoted: outcome = "Die Gewichte wurden angepasst."
+        elif "profile" in promoted: outcome = "Das Stundenprofil wurde angepasst."
+        else: outcome = "Der Kandidat war in der Schattenbewertung nicht besser, das aktive Modell bleibt unverändert."
         await self.hass.services.async_call("persistent_notification", "create", {
             "title": f"🧠 Modell hat für {date_str} gelernt",
-            "message": f"Die Prognoseabweichung betrug {error:+.2f} kWh. Die Gewichte wurden angepasst.",
+            "message": f"Die Prognoseabweichung betrug {error:+.2f} kWh. {outcome}",
             "notification_id": "solar_forecast_ml_learning_success"
         })
 
-    def _calculate_accuracy(self):
-        errors = [abs((d['actual']-d.get('predicted',0))/d['actual'])*100 for d in list(self.daily_predictions.values())[-30:] if isinstance(d,dict) and d.get('actual',0)>0 and d.get('predicted') is not None] 
-        if errors: self.accuracy = max(0, 100 - (sum(errors) / len(errors)))
-
     async def _notify_forecast(self, today_kwh: float, tomorrow_kwh: float):
         await self.hass.services.async_call("persistent_notification", "create", {"title": "☀️ Solar-Prognose", "message": f"Heute: {today_kwh:.1f} kWh, Morgen: {tomorrow_kwh:.1f} kWh", "notification_id": "solar_forecast_ml_daily"})
 
-    async def _calculate_hourly_profile(self):
-        _LOGGER.debug("Berechne Stundenprofil neu...")
-        
-        hourly_ratios: Dict[int, List[float]] = {h: [] for h in range(24)}
-        days_processed = 0
-        
-        for day_data in reversed(list(self.daily_predictions.values())):
-            if not isinstance(day_data, dict): continue
-            
-            actual_total = day_data.get('actual')
-            hourly_data = day_data.get('hourly_data')
-
-            if not actual_total or actual_total <= 0 or not hourly_data or not isinstance(hourly_data, dict):
-                continue
-
-            for hour_str, kwh in hourly_data.items():
-                try:
-                    hour = int(hour_str)
-                    if 0 <= hour < 24 and kwh is not None and kwh >= 0: 
-                        ratio = kwh / actual_total if actual_total > 0 else 0 
-                        hourly_ratios[hour].append(ratio)
-                except (ValueError, TypeError):
-                    continue 
-            
-            days_processed += 1
-            if days_processed >= 60: 
-                break
-
-        if days_processed == 0:
-            _LOGGER.warning("Konnte Stundenprofil nicht lernen: Keine validen Verlaufsdaten gefunden.")
-            return 
-
-        new_profile = {}
-        total_ratio = 0.0
-        for hour, ratios in hourly_ratios.items():
-            if ratios:
-                median_ratio = statistics.median(ratios)
-                new_profile[str(hour)] = median_ratio
-                total_ratio += median_ratio
-            else:
-                new_profile[str(hour)] = 0.0
-
-        if total_ratio <= 0:
-            _LOGGER.warning("Gesamtsumme der Profil-Ratios ist 0. Erstelle gleichmäßiges Standardprofil.")
-            self.hourly_profile = {str(h): (1/24) for h in range(24)}
-        else:
-            for hour_str in new_profile:
-                new_profile[hour_str] = new_profile[hour_str] / total_ratio
-            
-            self.hourly_profile = new_profile
-        
-        await self._async_save_hourly_profile() 
-        _LOGGER.info(f"✅ Stundenprofil erfolgreich aus {days_processed} Tagen gelernt und gespeichert.")
-
+    # Normierung der Median-Anteile (gemeinsam mit dem Lernlauf im Executor)
+    _normalize_hourly_profile = staticmethod(normalize_profile)
 
-    async def _predict_next_hour(self):
-        
+    async def async_verify_hourly_profile(self, rebuild: bool = False) -> Dict[str, Any]:
+        """
+        Vergleicht das inkrementelle Profil mit einem vollständigen Neuaufbau.
+        Mit rebuild=True wird der Schätzer danach aus der History neu aufgebaut.
+        """
+        await self.initial_load_done.wait()
+        async with self.data_lock:
+            self.profile_estimator.expire(date.today().toordinal())
+            incremental = self._normalize_hourly_profile(self.profile_estimator.medians())
+            window = np.array(self.columnar_history.last_days(HOURLY_PROFILE_WINDOW_DAYS, date.today()))
+            full, days_full = await self.hass.async_add_executor_job(rebuild_profile, window)
+            max_difference = None
+            if full is not None and self.profile_estimator.day_count:
+                max_difference = float(np.max(np.abs(incremental - full)))
+            result = {
+                "days_incremental": self.profile_estimator.day_count,
+                "days_full_rebuild": days_full,
+                "max_difference": max_difference,
+                "matches": days_full == self.profile_estimator.day_count and (max_difference is None or max_difference < 1e-9),
+            }
+            if rebuild:
+                self.profile_estimator = await self._async_seed_profile_estimator()
+                if self.profile_estimator.day_count:
+                    self.hourly_profile = self._normalize_hourly_profile(self.profile_estimator.medians())
+                    self._calculate_peak_production_hour()
+                self._mark_dirty(profile=True, state=True)
+        log = _LOGGER.info if result["matches"] else _LOGGER.warning
+        log(f"Stundenprofil-Verifikation: {result}")
+        return result
+
+
+    async def _predict_next_hour(self, hourly_forecasts: List[Dict[str, Any]] | None = None):
+        """Aktualisiert die Kurve für heute und morgen und liest daraus die Prognose des nächsten Slots."""
+        self.next_hour_pred_target = self._next_slot_target()
+        if hourly_forecasts is None: hourly_forecasts = await self._get_hourly_weather_forecasts()
+        profile = self.hourly_profile
+        if hourly_forecasts and profile is not None:
+            try: self._update_production_curve(self._get_hourly_forecast_table(hourly_forecasts), profile)
+            except Exception as e: _LOGGER.error(f"Fehler bei Berechnung der Produktionskurve: {e}", exc_info=True)
+        elif not hourly_forecasts:
+            self.production_curve = None
+        self._select_next_slot_prediction()
+
+    def _select_next_slot_prediction(self):
+        """Setzt next_hour_pred auf den Wert der Produktionskurve für next_hour_pred_target."""
         if self._is_night_time():
             self.next_hour_pred = 0.0
             return
@@ -648,57 +1575,49 @@ class SolarForecastCoordinator(DataUpdateCoordinator):
             self.next_hour_pred = 0.0
             return
             
-        if not self.hourly_profile:
+        if self.hourly_profile is None:
             _LOGGER.debug("Überspringe Stundenvorhersage: Stundenprofil noch nicht gelernt.")
             self.next_hour_pred = 0.0
             return
 
-        now = dt_util.now()
-        next_hour_dt = now + timedelta(hours=1)
-        next_hour_int = next_hour_dt.hour
-        
-        hourly_forecasts = await self._get_hourly_weather_forecasts()
-        if not hourly_forecasts:
+        if self.production_curve is None:
             _LOGGER.warning("Konnte Stundenvorhersage nicht erstellen: Keine stündlichen Wetterdaten verfügbar.")
             self.next_hour_pred = 0.0
             return
 
-        next_hour_weather = None
-        for forecast in hourly_forecasts:
-            try:
-                dt_str = forecast.get("datetime")
-                if not dt_str: continue
-                forecast_time = dt_util.parse_datetime(dt_str)
-                if forecast_time and forecast_time.hour == next_hour_int and forecast_time.date() == next_hour_dt.date():
-                    next_hour_weather = forecast
-                    break
-            except Exception:
-                continue 
-
-        if not next_hour_weather:
-            _LOGGER.warning(f"Konnte keine Wetterprognose für {next_hour_int}:00 Uhr finden.")
-            self.next_hour_pred = 0.0
-            return
-
         try:
-            profile_ratio = self.hourly_profile.get(str(next_hour_int), 0.0)
-            condition = next_hour_weather.get("condition", "cloudy")
-            cloud_coverage = next_hour_weather.get("cloud_coverage")
-            
-            weather_factor = WEATHER_FACTORS.get(condition, 0.4)
-            if cloud_coverage is not None:
-                try: 
-                    cloud_coverage_float = float(cloud_coverage)
-                    weather_factor *= (1 - (cloud_coverage_float / 100.0))
-                except (ValueError, TypeError):
-                    _LOGGER.warning(f"Ungültiger cloud_coverage Wert in Stundenprognose: {cloud_coverage}, wird ignoriert.")
-            
-            base_hour_pred = total_day_forecast * profile_ratio
-            final_pred = base_hour_pred * weather_factor
-            
-            self.next_hour_pred = round(max(0, final_pred), 2)
-            _LOGGER.debug(f"Stundenprognose für {next_hour_int}h: {self.next_hour_pred} kWh (Base: {base_hour_pred:.2f}, WF: {weather_factor:.2f})")
+            # Index in der Kurve: Slots seit Beginn des Kurventages (heute, dann morgen)
+            target = dt_util.parse_datetime(self.next_hour_pred_target)
+            day_offset = (target.date() - dt_util.parse_datetime(self.production_curve["start"]).date()).days
+            slot = day_offset * self.slots_per_day + (target.hour * 60 + target.minute) // self.slot_minutes
+            if not 0 <= slot < len(self.production_curve["kwh"]):
+                _LOGGER.debug(f"Zielslot {self.next_hour_pred_target} liegt außerhalb der Produktionskurve.")
+                self.next_hour_pred = 0.0
+                return
+            self.next_hour_pred = round(max(0, self.production_curve["kwh"][slot]), 2)
+            _LOGGER.debug(f"Prognose für Slot ab {target.strftime('%H:%M')}: {self.next_hour_pred} kWh (aus Produktionskurve)")
             
         except Exception as e:
             _LOGGER.error(f"Fehler bei Berechnung der Stundenvorhersage: {e}", exc_info=True)
             self.next_hour_pred = 0.0
+
+    def _update_production_curve(self, table: HourlyForecastTable, profile: np.ndarray | None = None):
+        """
+        Berechnet die Produktionskurve (ein Wert je Zeitslot) für heute und morgen in
+        einem vektorisierten Durchgang: Profil × Wetterfaktor der jeweiligen Stunde,
+        skaliert auf die Tagesprognosen aus _predict_day.
+        """
+        today_start = dt_util.start_of_local_day()
+        tomorrow_start = dt_util.start_of_local_day(today_start.date() + timedelta(days=1))
+        # Alle Slots einer Stunde teilen sich den Wetterfaktor dieser Stunde. Die Slots folgen
+        # der lokalen Uhrzeit; an 23- und 25-Stunden-Tagen zählen die Epoch-Stunden anders
+        slot_hours = np.arange(self.slots_per_day) * self.slot_minutes // 60
+        hours = np.concatenate([local_epoch_hours(today_start)[slot_hours], local_epoch_hours(tomorrow_start)[slot_hours]])
+        factors = table.weather_factors(hours).reshape(2, self.slots_per_day)
+        totals = np.array([self.data.get("heute", 0.0), self.data.get("morgen", 0.0)], dtype=float)
+        curve = production_curve(self.hourly_profile if profile is None else profile, factors, totals)
+        self.production_curve = {
+            "start": today_start.isoformat(),
+            "resolution_minutes": self.slot_minutes,
+            "kwh": [round(float(v), 3) for v in curve.ravel()],
+        }
@@ -0,0 +1,180 @@
+"""
+Streaming-Integration der aktuellen PV-Leistung zu Energie je Zeitslot.
+
+Jede Zustandsänderung des Leistungssensors (W) wird mit der Trapezregel
+zwischen zwei Messpunkten integriert. Intervalle, die eine Slot-Grenze
+überschreiten, werden an der Grenze aufgeteilt (linear interpoliert). Die
+Energie liegt in einem Ringpuffer fester Größe (ein Tag an Slots); ein Slot
+ist abgeschlossen, sobald ein Messpunkt im nächsten Slot liegt oder zur
+vollen Stunde abgeschlossen wird. Aufwand und Speicher pro Ereignis sind
+konstant, auch bei Wechselrichtern, die jede Sekunde melden.
+
+Slots sind Vielfache von slot_seconds seit der Epoche, verschoben um den
+Zeitzonenversatz (modulo slot_seconds). Ihre Grenzen liegen damit wie bei
+local_epoch_hours auf lokaler Mitternacht und den lokalen Stunden, auch bei
+UTC+5:30 oder UTC+5:45.
+Sommerzeitumstellungen verschieben um ganze Stunden und ändern die
+Verschiebung daher nicht; die Zählung bleibt monoton.
+
+Meldet der Sensor keinen neuen Wert, ist die Leistung unverändert (Home
+Assistant sendet bei gleichem Wert kein Ereignis). Der letzte Wert gilt
+deshalb, bis ein neuer Wert kommt oder der Sensor unavailable/unknown meldet.
+
+Copyright (C) 2025 Zara-Toorox
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class EnergyIntegrator:
+    """
+    Trapez-Integrator mit Ringpuffer. add_sample/close_until geben die dabei
+    abgeschlossenen Slots als Liste von (absoluter Slot, kWh) zurück.
+    """
+
+    def __init__(self, slot_seconds: int = 3600, max_gap_seconds: float = 7200, utc_offset_seconds: float = 0):
+        self.slot_seconds = slot_seconds
+        # Nur für den Neustart: so lange darf der gespeicherte Zustand zurückliegen
+        self.max_gap_seconds = max_gap_seconds
+        self.offset = int(utc_offset_seconds) % slot_seconds
+        self.slots_per_day = 86400 // slot_seconds
+        self._buffer_wh = [0.0] * self.slots_per_day
+        self._filled = [False] * self.slots_per_day  # Slot enthält integrierte Messwerte
+        self._slot: Optional[int] = None  # absoluter Slot, der gerade gefüllt wird
+        self._last_ts: Optional[float] = None  # bis hierhin ist integriert
+        self._last_watts: Optional[float] = None
+
+    def slot_of(self, ts: float) -> int:
+        return int((ts + self.offset) // self.slot_seconds)
+
+    def slot_start(self, slot: int) -> float:
+        """Beginn eines absoluten Slots (Sekunden seit der Epoche)."""
+        return slot * self.slot_seconds - self.offset
+
+    @property
+    def current_slot(self) -> Optional[int]:
+        return self._slot
+
+    def current_kwh(self) -> float:
+        """Bisherige Energie des laufenden Slots."""
+        return self._buffer_wh[self._slot % self.slots_per_day] / 1000 if self._slot is not None else 0.0
+
+    def add_sample(self, ts: float, watts: float) -> List[Tuple[int, float]]:
+        """Verarbeitet einen Messpunkt (Zeitstempel in Sekunden, Leistung in W)."""
+        watts = max(0.0, watts)
+        completed: List[Tuple[int, float]] = []
+        if self._last_ts is not None and ts < self._last_ts:
+            return completed  # verspätetes Ereignis
+        if self._last_ts is None:
+            # Keine Vorgeschichte (Start oder Sensor war nicht verfügbar): nur den laufenden Slot abschließen
+            self._close_before(self.slot_of(ts), completed, fill_gap=False)
+        else:
+            self._integrate(self._last_ts, self._last_watts, ts, watts, completed)
+        self._last_ts, self._last_watts = ts, watts
+        return completed
+
+    def mark_unavailable(self, ts: float) -> List[Tuple[int, float]]:
+        """
+        Sensor nicht verfügbar: Der letzte Wert gilt bis `ts`, danach wird bis zum
+        nächsten gültigen Wert nicht integriert.
+        """
+        completed = self.close_until(ts)
+        self._last_ts = self._last_watts = None
+        return completed
+
+    def close_until(self, ts: float) -> List[Tuple[int, float]]:
+        """
+        Schließt alle Slots vor `ts` ab, auch ohne neues Ereignis. Seit dem letzten
+        Messpunkt wird der letzte Wert gehalten (keine Änderung = konstante Leistung).
+        """
+        completed: List[Tuple[int, float]] = []
+        if self._last_ts is not None and ts > self._last_ts:
+            self._integrate(self._last_ts, self._last_watts, ts, self._last_watts, completed)
+            self._last_ts = ts
+        if self._last_ts is None:
+            self._close_before(self.slot_of(ts), completed, fill_gap=False)
+        return completed
+
+    def _integrate(self, t0: float, p0: float, t1: float, p1: float, completed: List[Tuple[int, float]]) -> None:
+        if t1 <= t0:
+            return
+        slope = (p1 - p0) / (t1 - t0)
+        t, p = t0, p0
+        # Ein Durchlauf je berührtem Slot
+        while t < t1:
+            slot = self.slot_of(t)
+            end = min(t1, self.slot_start(slot + 1))
+            p_end = p0 + slope * (end - t0)
+            self._close_before(slot, completed, fill_gap=True)
+            self._buffer_wh[slot % self.slots_per_day] += (p + p_end) / 2 * (end - t) / 3600
+            self._filled[slot % self.slots_per_day] = True
+            t, p = end, p_end
+        self._close_before(self.slot_of(t1), completed, fill_gap=True)
+
+    def _close_before(self, slot: int, completed: List[Tuple[int, float]], fill_gap: bool) -> None:
+        """Gibt alle Slots vor `slot` ab und setzt ihren Pufferplatz zurück."""
+        if self._slot is None or slot <= self._slot:
+            if self._slot is None: self._slot = slot
+            return
+        self._emit(self._slot, completed)
+        if fill_gap:
+            # Zwischenliegende Slots wurden integriert und sind ebenfalls fertig
+            for between in range(self._slot + 1, slot):
+                self._emit(between, completed)
+        else:
+            for between in range(self._slot + 1, min(slot, self._slot + self.slots_per_day)):
+                self._buffer_wh[between % self.slots_per_day] = 0.0
+                self._filled[between % self.slots_per_day] = False
+        self._slot = slot
+
+    def _emit(self, slot: int, completed: List[Tuple[int, float]]) -> None:
+        index = slot % self.slots_per_day
+        # Slots ganz ohne Messwerte (Sensor nicht verfügbar) werden nicht als 0 kWh gemeldet
+        if self._filled[index]: completed.append((slot, round(self._buffer_wh[index] / 1000, 4)))
+        self._buffer_wh[index] = 0.0
+        self._filled[index] = False
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        return {
+            "slot_seconds": self.slot_seconds,
+            "offset": self.offset,
+            "slot": self._slot,
+            "slot_wh": self._buffer_wh[self._slot % self.slots_per_day] if self._slot is not None else 0.0,
+            "last_ts": self._last_ts,
+            "last_watts": self._last_watts,
+        }
+
+    def restore(self, snapshot: Any, now_ts: float) -> None:
+        """
+        Übernimmt den laufenden Slot nach einem Neustart, sofern Auflösung und
+        Slot-Raster gleich sind und der Zustand nicht länger als max_gap_seconds
+        zurückliegt (während Home Assistant aus war, ist die Leistung unbekannt).
+        """
+        if (not isinstance(snapshot, dict) or snapshot.get("slot_seconds") != self.slot_seconds
+                or snapshot.get("offset", 0) != self.offset or self._slot is not None):
+            return
+        try:
+            last_ts, last_watts = snapshot.get("last_ts"), snapshot.get("last_watts")
+            if last_ts is None or last_watts is None or not 0 <= now_ts - float(last_ts) <= self.max_gap_seconds:
+                return
+            self._slot = int(snapshot["slot"])
+            self._buffer_wh[self._slot % self.slots_per_day] = float(snapshot.get("slot_wh", 0.0))
+            self._filled[self._slot % self.slots_per_day] = True
+            self._last_ts, self._last_watts = float(last_ts), float(last_watts)
+        except (ValueError, TypeError):
+            _LOGGER.warning("Gespeicherter Zustand des Energie-Integrators ist ungültig und wird ignoriert.")
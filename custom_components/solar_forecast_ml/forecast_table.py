@@ -0,0 +1,151 @@
+"""
+Zeitindizierte Tabelle der stündlichen Wetterprognose.
+
+Jede Antwort von weather.get_forecasts (type: hourly) wird genau einmal
+geparst: Zeitpunkte als Epoch-Stunden (sortiert), dazu Spalten für den
+Wetterfaktor der Bedingung, die Bewölkung und den Niederschlag. Abfragen für
+eine oder viele Zielstunden sind binäre Suchen auf dem Zeit-Array, ohne
+ISO-Strings erneut zu parsen. Fehlende Werte sind NaN.
+
+Copyright (C) 2025 Zara-Toorox
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+from datetime import datetime
+from typing import Any, Dict, List
+
+import numpy as np
+
+from homeassistant.util import dt as dt_util
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_CONDITION_FACTOR = 0.4
+
+
+def epoch_hour(moment: datetime) -> int:
+    """Stunden seit 1970-01-01 UTC für einen Zeitpunkt mit Zeitzone."""
+    return int(moment.timestamp() // 3600)
+
+
+def local_epoch_hours(day_start: datetime) -> np.ndarray:
+    """
+    Epoch-Stunde jeder lokalen Uhrzeit 0..23 des Tages ab `day_start` (lokale Mitternacht).
+    An Umstellungstagen fällt die ausgelassene Stunde auf die folgende, die doppelte
+    Stunde auf ihr erstes Auftreten.
+    """
+    return np.array([epoch_hour(day_start.replace(hour=hour)) for hour in range(24)], dtype=np.int64)
+
+
+def _to_float(value: Any) -> float:
+    if isinstance(value, bool):
+        return np.nan
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return np.nan
+
+
+class HourlyForecastTable:
+    """Nach Epoch-Stunde sortierte Spalten einer Stundenprognose."""
+
+    def __init__(self, hours: np.ndarray, condition_factor: np.ndarray, cloud_coverage: np.ndarray, precipitation: np.ndarray):
+        self.hours = hours
+        self.condition_factor = condition_factor
+        self.cloud_coverage = cloud_coverage
+        self.precipitation = precipitation
+
+    def __len__(self) -> int:
+        return len(self.hours)
+
+    @classmethod
+    def parse(cls, forecasts: List[Dict[str, Any]], condition_factors: Dict[str, float]) -> "HourlyForecastTable":
+        """Parst eine Prognoseliste einmalig. Einträge ohne gültige Zeitangabe werden übersprungen."""
+        hours, factors, clouds, precips = [], [], [], []
+        skipped = 0
+        for forecast in forecasts or []:
+            try:
+                # Wie bisher: Angaben ohne Zeitzone gelten in der Zeitzone von Home Assistant
+                moment = dt_util.parse_datetime(forecast["datetime"])
+            except (KeyError, TypeError, ValueError):
+                moment = None
+            if moment is None:
+                skipped += 1
+                continue
+            hour = epoch_hour(dt_util.as_local(moment))
+            hours.append(hour)
+            factors.append(condition_factors.get(forecast.get("condition", "cloudy"), DEFAULT_CONDITION_FACTOR))
+            clouds.append(_to_float(forecast.get("cloud_coverage")))
+            precips.append(_to_float(forecast.get("precipitation")))
+        if skipped:
+            _LOGGER.debug(f"{skipped} Einträge der Stundenprognose ohne gültige Zeitangabe übersprungen.")
+
+        hours = np.asarray(hours, dtype=np.int64)
+        order = np.argsort(hours, kind="stable")
+        hours = hours[order]
+        # Doppelte Stunden: erster Eintrag gewinnt
+        keep = np.ones(len(hours), dtype=bool)
+        keep[1:] = hours[1:] != hours[:-1]
+        order = order[keep]
+        return cls(
+            hours[keep],
+            np.asarray(factors, dtype=float)[order],
+            np.asarray(clouds, dtype=float)[order],
+            np.asarray(precips, dtype=float)[order],
+        )
+
+    def indices(self, target_hours: np.ndarray) -> np.ndarray:
+        """Zeilenindex je Zielstunde (O(log n) pro Stunde), -1 wenn nicht enthalten."""
+        target_hours = np.asarray(target_hours, dtype=np.int64)
+        if not len(self.hours):
+            return np.full(len(target_hours), -1)
+        index = np.minimum(np.searchsorted(self.hours, target_hours), len(self.hours) - 1)
+        return np.where(self.hours[index] == target_hours, index, -1)
+
+    def weather_factors(self, target_hours: np.ndarray) -> np.ndarray:
+        """
+        Wetterfaktor je Zielstunde: Faktor der Bedingung, reduziert um die Bewölkung
+        (wie bisher in _predict_next_hour). NaN für Stunden ohne Prognose.
+        """
+        index = self.indices(target_hours)
+        found = index >= 0
+        result = np.full(len(index), np.nan)
+        rows = index[found]
+        cloud = self.cloud_coverage[rows]
+        result[found] = self.condition_factor[rows] * np.where(np.isnan(cloud), 1.0, 1 - cloud / 100.0)
+        return result
+
+
+def production_curve(profile: np.ndarray, weather_factors: np.ndarray, daily_totals: np.ndarray) -> np.ndarray:
+    """
+    Produktionskurve für mehrere Tage in einem Durchgang.
+    profile: (Slots,) Anteile je Zeitslot, weather_factors: (Tage, Slots) mit NaN für
+    fehlende Werte, daily_totals: (Tage,) Tagesprognosen. Die Form profile × Wetterfaktor
+    wird je Tag auf die Tagessumme skaliert, die Kurve summiert sich also zur Tagesprognose.
+    """
+    factors = np.array(weather_factors, dtype=float)
+    known = ~np.isnan(factors)
+    counts = known.sum(axis=1, keepdims=True)
+    # Fehlende Slots erhalten den mittleren Faktor des Tages (ohne Prognose: 1.0)
+    day_mean = np.divide(np.where(known, factors, 0.0).sum(axis=1, keepdims=True), counts,
+                         out=np.ones_like(counts, dtype=float), where=counts > 0)
+    factors = np.where(known, factors, day_mean)
+
+    shape = profile[None, :] * factors
+    sums = shape.sum(axis=1, keepdims=True)
+    # Ohne verwertbare Wetterform bleibt das reine Profil
+    shape = np.where(sums > 0, shape, profile[None, :])
+    sums = np.where(sums > 0, sums, max(float(profile.sum()), 1e-12))
+    return np.maximum(daily_totals[:, None], 0.0) * shape / sums
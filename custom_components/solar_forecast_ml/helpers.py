@@ -36,11 +36,14 @@ from homeassistant.exceptions import HomeAssistantError
 from .const import (
     DATA_DIR,
     DEFAULT_BASE_CAPACITY,
+    DEFAULT_ROLLING_WINDOWS,
+    DEFAULT_SLOT_MINUTES,
     HISTORY_FILE,
     HOURLY_PROFILE_FILE,
     OLD_HISTORY_FILE,
     OLD_HOURLY_PROFILE_FILE,
     OLD_WEIGHTS_FILE,
+    SLOT_MINUTES_OPTIONS,
     WEIGHTS_FILE,
 )
 
@@ -60,16 +63,19 @@ def _read_history_file(filepath: str) -> dict:
         return {}
 
 
-def _write_history_file(filepath: str, data: dict):
+def _write_history_file(filepath: str, data: dict) -> bool:
     """
     Blockierende Hilfsfunktion zum Speichern von Daten in einer JSON-Datei.
     Verwendet ha_helpers_json.save_json für atomare Schreibvorgänge.
     Erstellt das Verzeichnis automatisch und sicher.
+    Gibt zurück, ob die Datei erfolgreich geschrieben wurde.
     """
     try:
         ha_helpers_json.save_json(filepath, data, private=True)
+        return True
     except HomeAssistantError as e:
         _LOGGER.error(f"Fehler beim atomaren Speichern der Datei {filepath}: {e}")
+        return False
 
 
 def _migrate_data_files():
@@ -104,6 +110,46 @@ def _migrate_data_files():
         _LOGGER.info(f"🎉 Data migration completed! {migrated_count} files moved.")
 
 
+def _migrate_entry_files(migrations) -> None:
+    """
+    Übernimmt gemeinsame Dateien älterer Versionen als Dateien eines Eintrags
+    (Liste aus (alter Pfad, neuer Pfad)). Umbenannt wird atomar; startet ein
+    anderer Eintrag gleichzeitig, bekommt nur einer die Datei.
+    """
+    for old_path, new_path in migrations:
+        if os.path.exists(new_path) or not os.path.exists(old_path):
+            continue
+        try:
+            os.replace(old_path, new_path)
+            _LOGGER.info(f"✅ {os.path.basename(old_path)} als {os.path.basename(new_path)} übernommen.")
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            _LOGGER.error(f"❌ {os.path.basename(old_path)} konnte nicht übernommen werden: {e}")
+
+
+def parse_rolling_windows(value) -> tuple:
+    """
+    Wandelt die Options-Eingabe (z. B. "7, 30, 365") in sortierte Fenstergrößen um.
+    Ungültige Einträge werden ignoriert; das 30-Tage-Fenster ist immer enthalten.
+    """
+    windows = {30}
+    for part in str(value if value else DEFAULT_ROLLING_WINDOWS).replace(";", ",").split(","):
+        try:
+            days = int(part.strip())
+        except ValueError:
+            continue
+        if 1 <= days <= 3650:
+            windows.add(days)
+    return tuple(sorted(windows))
+
+
+def parse_slot_minutes(value) -> int:
+    """Zeitauflösung aus den Optionen (Minuten); ungültige Werte ergeben 60."""
+    value = str(value if value else DEFAULT_SLOT_MINUTES).strip()
+    return int(value) if value in SLOT_MINUTES_OPTIONS else int(DEFAULT_SLOT_MINUTES)
+
+
 def calculate_initial_base_capacity(plant_kwp: float) -> float:
     """
     Intelligente Startwert-Berechnung der Basiskapazität basierend auf der Anlagenleistung (kWp).
@@ -0,0 +1,191 @@
+"""
+Journal-basierte Speicherung der Prognose-History.
+
+Statt bei jeder Änderung die komplette prediction_history.json neu zu
+schreiben, wird jede Änderung (Stundenwert, Prognose, Lernergebnis) als
+einzelne Zeile an ein Append-Only-Journal angehängt. Das Journal wird
+regelmäßig bzw. ab einer Größenschwelle in den Snapshot
+(prediction_history.json) kompaktiert.
+
+Copyright (C) 2025 Zara-Toorox
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import json
+import logging
+import os
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from .const import OP_ACTUAL, OP_FORECAST, OP_HOURLY, OP_SLOT
+from .helpers import _read_history_file, _write_history_file
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def apply_history_record(days: Dict[str, Any], record: Dict[str, Any]) -> None:
+    """
+    Wendet einen Journal-Record auf das History-Dictionary an.
+    Alle Records sind idempotente Upserts, ein doppeltes Abspielen ist daher unkritisch.
+    """
+    day = record.get("day")
+    if not isinstance(day, str):
+        return
+    entry = days.setdefault(day, {})
+    if not isinstance(entry, dict):
+        entry = days[day] = {}
+
+    op = record.get("op")
+    if op == OP_HOURLY:
+        hourly = entry.setdefault("hourly_data", {})
+        hourly[str(record["hour"])] = record["kwh"]
+    elif op == OP_SLOT:
+        # Unterstündliche Werte als kompakte Liste (None = fehlt) statt Dict je Slot
+        minutes, slot = record.get("minutes"), record.get("slot")
+        if not isinstance(minutes, int) or minutes <= 0 or not isinstance(slot, int) or not 0 <= slot < 1440 // minutes:
+            return
+        slot_data = entry.get("slot_data")
+        if not isinstance(slot_data, dict) or slot_data.get("minutes") != minutes or not isinstance(slot_data.get("kwh"), list):
+            # Neue oder geänderte Auflösung: Werte der alten Auflösung verwerfen
+            slot_data = entry["slot_data"] = {"minutes": minutes, "kwh": [None] * (1440 // minutes)}
+        slot_data["kwh"][slot] = record["kwh"]
+    elif op in (OP_FORECAST, OP_ACTUAL):
+        entry.update(record.get("fields", {}))
+    else:
+        _LOGGER.warning(f"Unbekannter Journal-Record '{op}' wird ignoriert.")
+
+
+class HistoryJournal:
+    """
+    Append-Only-Journal mit Snapshot für die Prognose-History.
+    Alle Methoden sind blockierend und müssen im Executor laufen.
+    """
+
+    def __init__(self, snapshot_path: str, journal_path: str):
+        self.snapshot_path = snapshot_path
+        self.journal_path = journal_path
+
+    def load(self) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """
+        Lädt den Snapshot und spielt alle Journal-Records darüber ab. Gibt die History
+        und die angewendeten Records zurück (z. B. für die Spalten-History).
+        """
+        days = self.read_snapshot()
+        records = self.read_records()
+        for record in records:
+            apply_history_record(days, record)
+        if records:
+            _LOGGER.debug(f"{len(records)} Journal-Records auf History-Snapshot angewendet.")
+        return days, records
+
+    def read_snapshot(self) -> Dict[str, Any]:
+        """Liest nur den Snapshot (ohne Journal)."""
+        days = _read_history_file(self.snapshot_path)
+        return days if isinstance(days, dict) else {}
+
+    def read_records(self) -> List[Dict[str, Any]]:
+        """Liest alle gültigen Records aus dem Journal (in Schreibreihenfolge)."""
+        records = []
+        try:
+            with open(self.journal_path, "r", encoding="utf-8") as journal:
+                for line in journal:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Typisch: letzte Zeile nach Absturz nur halb geschrieben
+                        _LOGGER.warning("Beschädigte Journal-Zeile in History gefunden, wird ignoriert.")
+                        continue
+                    if isinstance(record, dict):
+                        records.append(record)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            _LOGGER.error(f"Fehler beim Lesen des History-Journals {self.journal_path}: {e}")
+        return records
+
+    def append(self, records: Iterable[Dict[str, Any]]) -> Optional[int]:
+        """
+        Hängt Records an das Journal an (eine JSON-Zeile pro Record).
+        Gibt die neue Größe des Journals in Bytes zurück bzw. None, wenn das
+        Schreiben fehlgeschlagen ist (die Records sind dann nicht gespeichert).
+        """
+        lines = "".join(json.dumps(r, separators=(",", ":")) + "\n" for r in records)
+        if not lines:
+            return self.size()
+        try:
+            os.makedirs(os.path.dirname(self.journal_path), exist_ok=True)
+            with open(self.journal_path, "a+b") as journal:
+                # Eine nach Absturz halb geschriebene Zeile abschließen, damit
+                # der neue Record nicht mit ihr verschmilzt.
+                if journal.tell() > 0:
+                    journal.seek(-1, os.SEEK_END)
+                    if journal.read(1) != b"\n":
+                        lines = "\n" + lines
+                journal.write(lines.encode("utf-8"))
+                journal.flush()
+                os.fsync(journal.fileno())
+                return journal.tell()
+        except OSError as e:
+            _LOGGER.error(f"Fehler beim Schreiben des History-Journals {self.journal_path}: {e}")
+            return None
+
+    def compact(self, days: Dict[str, Any]) -> bool:
+        """
+        Schreibt den kompletten Stand atomar als Snapshot und leert danach das Journal.
+        Stürzt HA zwischen beiden Schritten ab, werden die (idempotenten) Records
+        beim nächsten Laden einfach erneut angewendet. Gibt zurück, ob der Snapshot
+        geschrieben wurde; andernfalls bleibt das Journal unverändert.
+        """
+        if not _write_history_file(self.snapshot_path, days):
+            # Journal behalten, sonst gingen die Records verloren
+            return False
+        try:
+            with open(self.journal_path, "w", encoding="utf-8") as journal:
+                journal.flush()
+                os.fsync(journal.fileno())
+        except OSError as e:
+            # Der Snapshot enthält alles; ein nicht geleertes Journal wird beim Laden nur erneut angewendet
+            _LOGGER.error(f"Fehler beim Leeren des History-Journals {self.journal_path}: {e}")
+        return True
+
+    def size(self) -> int:
+        """Aktuelle Größe des Journals in Bytes (0, wenn nicht vorhanden)."""
+        try:
+            return os.path.getsize(self.journal_path)
+        except OSError:
+            return 0
+
+
+def build_forecast_record(day: str, predicted: float, predicted_morgen: float, features: Dict[str, float],
+                          weather_factor: Optional[float] = None) -> Dict[str, Any]:
+    fields = {"predicted": predicted, "predicted_morgen": predicted_morgen, "features": features}
+    if weather_factor is not None: fields["weather_factor"] = weather_factor
+    return {"op": OP_FORECAST, "day": day, "fields": fields}
+
+
+def build_hourly_record(day: str, hour: int, kwh: float) -> Dict[str, Any]:
+    return {"op": OP_HOURLY, "day": day, "hour": hour, "kwh": kwh}
+
+
+def build_slot_record(day: str, minutes: int, slot: int, kwh: float) -> Dict[str, Any]:
+    return {"op": OP_SLOT, "day": day, "minutes": minutes, "slot": slot, "kwh": kwh}
+
+
+def build_actual_record(day: str, actual: float, consumption: Optional[float] = None) -> Dict[str, Any]:
+    fields = {"actual": actual}
+    if consumption is not None: fields["consumption"] = consumption
+    return {"op": OP_ACTUAL, "day": day, "fields": fields}
+
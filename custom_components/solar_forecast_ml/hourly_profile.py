@@ -0,0 +1,178 @@
+"""
+Inkrementeller Schätzer für das Stundenprofil.
+
+Für jede Stunde wird eine sortierte Liste der Anteile (Stunden-kWh / Tagesertrag)
+der letzten Tage im Zeitfenster geführt. Jede Nacht kommt ein Tag hinzu und
+abgelaufene Tage fallen heraus: O(24 log W) für die Suche, der Median ist
+danach direkt ablesbar. Der vollständige Neuaufbau aus der History bleibt als
+Verifikationsmodus im Koordinator erhalten.
+
+Copyright (C) 2025 Zara-Toorox
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import bisect
+import logging
+import math
+from collections import deque
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def day_ratios(actual: float, hourly: Sequence[float]) -> Optional[List[Optional[float]]]:
+    """
+    Anteile eines Tages je Stunde (None für fehlende/negative Werte).
+    None, wenn der Tag nicht in das Profil eingehen kann.
+    """
+    if not actual or math.isnan(actual) or actual <= 0:
+        return None
+    ratios = [None if math.isnan(kwh) or kwh < 0 else float(kwh) / actual for kwh in hourly]
+    if all(math.isnan(kwh) for kwh in hourly):
+        return None
+    return ratios
+
+
+def normalize_profile(medians: Sequence[float]) -> np.ndarray:
+    """Skaliert die Median-Anteile auf Summe 1 (ohne Daten: gleichmäßiges Profil)."""
+    medians = np.asarray(medians, dtype=float)
+    total_ratio = float(medians.sum())
+    if total_ratio <= 0:
+        _LOGGER.warning("Gesamtsumme der Profil-Ratios ist 0. Erstelle gleichmäßiges Standardprofil.")
+        return np.full(len(medians), 1 / len(medians))
+    return medians / total_ratio
+
+
+def slot_share_error(actual: np.ndarray, hourly: np.ndarray, profile: np.ndarray) -> Tuple[Optional[float], int]:
+    """
+    Mittlere absolute Abweichung der Tagesanteile je Slot vom Profil (Summe über die
+    gemessenen Slots eines Tages, gemittelt über die Tage); (Fehler oder None, Tage).
+    """
+    actual = np.asarray(actual, dtype=float)
+    usable = np.isfinite(actual) & (actual > 0)
+    ratios = np.asarray(hourly, dtype=float)[usable] / actual[usable, None]
+    measured = np.isfinite(ratios) & (ratios >= 0)
+    rated = measured.any(axis=1)
+    if not rated.any():
+        return None, 0
+    errors = np.where(measured, np.abs(ratios - profile), 0.0).sum(axis=1)[rated]
+    return float(errors.mean()), int(rated.sum())
+
+
+def rebuild_profile(rows: np.ndarray) -> Tuple[Optional[np.ndarray], int]:
+    """
+    Vollständiger Neuaufbau des Profils aus einem Ausschnitt der Spalten-History
+    (Verifikationsmodus). Gibt (Profil, Tage) zurück.
+    """
+    actual, hourly = rows["actual"], rows["hourly"]
+    valid = (actual > 0) & ~np.all(np.isnan(hourly), axis=1)
+    recent = np.flatnonzero(valid)
+    days_processed = len(recent)
+    if days_processed == 0: return None, 0
+
+    ratios = hourly[recent] / actual[recent, None]
+    ratios[~(ratios >= 0)] = np.nan  # negative bzw. fehlende Werte ignorieren
+    has_ratios = ~np.all(np.isnan(ratios), axis=0)
+    medians = np.zeros(ratios.shape[1])
+    medians[has_ratios] = np.nanmedian(ratios[:, has_ratios], axis=0)
+    return normalize_profile(medians), days_processed
+
+
+class StreamingHourlyProfile:
+    """Gleitender Median je Stundenslot über die letzten `window_days` Kalendertage."""
+
+    def __init__(self, window_days: int = 60, slots: int = 24):
+        self.window_days = window_days
+        self.slots = slots
+        self._days: deque = deque()  # (ordinal, ratios), nach Datum sortiert
+        self._sorted: List[List[float]] = [[] for _ in range(slots)]
+
+    @property
+    def day_count(self) -> int:
+        return len(self._days)
+
+    def add_day(self, ordinal: int, ratios: List[Optional[float]]) -> None:
+        """Nimmt einen Tag auf. Ein bereits enthaltener Tag wird ersetzt."""
+        self._remove_day(ordinal)
+        if not self._days or ordinal > self._days[-1][0]:
+            self._days.append((ordinal, ratios))
+        else:
+            # Nachtrag eines älteren Tages (selten): sortiert einfügen
+            position = bisect.bisect([o for o, _ in self._days], ordinal)
+            self._days.insert(position, (ordinal, ratios))
+        for slot, ratio in enumerate(ratios[:self.slots]):
+            if ratio is not None:
+                bisect.insort(self._sorted[slot], ratio)
+
+    def expire(self, today_ordinal: int) -> None:
+        """Entfernt Tage, die vor dem Fenster bis `today_ordinal` liegen."""
+        while self._days and self._days[0][0] <= today_ordinal - self.window_days:
+            _, ratios = self._days.popleft()
+            self._discard(ratios)
+
+    def _remove_day(self, ordinal: int) -> None:
+        for index, (day_ordinal, ratios) in enumerate(self._days):
+            if day_ordinal == ordinal:
+                del self._days[index]
+                self._discard(ratios)
+                return
+
+    def _discard(self, ratios: List[Optional[float]]) -> None:
+        for slot, ratio in enumerate(ratios[:self.slots]):
+            if ratio is None:
+                continue
+            values = self._sorted[slot]
+            index = bisect.bisect_left(values, ratio)
+            if index < len(values) and values[index] == ratio:
+                del values[index]
+
+    def medians(self) -> List[float]:
+        """Median je Slot (0.0 für Slots ohne Daten)."""
+        result = []
+        for values in self._sorted:
+            n = len(values)
+            if not n:
+                result.append(0.0)
+            elif n % 2:
+                result.append(values[n // 2])
+            else:
+                result.append((values[n // 2 - 1] + values[n // 2]) / 2)
+        return result
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        return {"window_days": self.window_days, "slots": self.slots, "days": [[o, r] for o, r in self._days]}
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Any, window_days: int, slots: int = 24) -> Optional["StreamingHourlyProfile"]:
+        if not isinstance(snapshot, dict) or snapshot.get("window_days") != window_days or snapshot.get("slots", 24) != slots:
+            return None
+        estimator = cls(window_days, slots)
+        try:
+            for ordinal, ratios in snapshot.get("days", []):
+                estimator.add_day(int(ordinal), [None if r is None else float(r) for r in ratios])
+        except (ValueError, TypeError):
+            return None
+        return estimator
+
+    @classmethod
+    def from_rows(cls, rows, window_days: int, slots: int = 24) -> "StreamingHourlyProfile":
+        """Einmaliger Aufbau aus einem (nach Datum sortierten) Ausschnitt der Spalten-History."""
+        estimator = cls(window_days, slots)
+        for row in rows:
+            ratios = day_ratios(float(row["actual"]), row["hourly"])
+            if ratios is not None:
+                estimator.add_day(int(row["ordinal"]), ratios)
+        return estimator
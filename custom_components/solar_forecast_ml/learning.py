@@ -0,0 +1,270 @@
+"""
+Rechenintensive Stufen des nächtlichen Lernlaufs, getrennt vom Event-Loop.
+
+Der Koordinator nimmt unter dem data_lock einen unveränderlichen Schnappschuss
+(Kopie der Spalten-History mit writeable=False, Gewichte von Kandidat und aktivem
+Modell, aktives Stundenprofil, serialisierte Zustände von Profil-Schätzer und
+RLS-Lerner) und gibt den Lock wieder frei. run_learning rechnet im Executor auf
+diesem Schnappschuss:
+- Kandidaten-Gewichte je Lernmodus (Basisschritt, Regression oder RLS-Schritt)
+- Kandidaten-Stundenprofil (Schätzer fortschreiben, Mediane, Normierung)
+- Schattenbewertung: Kandidat und aktives Modell auf dem heutigen Tag, bevor er
+  gelernt wird (predict-then-learn), gemittelt über die protokollierten letzten Tage
+- Vorjahresvergleich des 30-Tage-Ertrags (heiße History, davor das Archiv)
+und liefert neue Objekte zurück, ohne Koordinator-Zustand anzufassen. Der
+Koordinator übernimmt das Ergebnis anschließend in einem Schritt; das aktive
+Modell wird nur ersetzt, wenn der Kandidat nicht schlechter abschneidet.
+
+Dieses Modul importiert nichts aus Home Assistant.
+
+Copyright (C) 2025 Zara-Toorox
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from .columnar import ColumnarHistory, _shift_years
+from .const import LEARNING_MODE_BATCH, LEARNING_MODE_RLS
+from .hourly_profile import StreamingHourlyProfile, day_ratios, normalize_profile, slot_share_error
+from .retention import archived_window_yield
+from .rls import RecursiveLeastSquares
+from .rolling_stats import RollingStatistics
+from .trainer import BASE_WEIGHT_RANGE, design_matrix, fit_weights, predict, training_mask
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class LearningSnapshot:
+    """Eingaben eines Lernlaufs; alle Felder sind Kopien bzw. serialisierte Zustände."""
+
+    def __init__(self, rows: np.ndarray, slots: int, today: date, error: float, weights: Dict[str, float],
+                 base_capacity: float, mode: str, rls_state: Optional[Dict[str, Any]],
+                 profile_state: Dict[str, Any], profile_window_days: int,
+                 active_weights: Optional[Dict[str, float]] = None, active_profile: Optional[np.ndarray] = None,
+                 candidate_profile: Optional[np.ndarray] = None, shadow_errors: Optional[Dict[str, Any]] = None,
+                 archive: Optional[Dict[str, Any]] = None):
+        rows.flags.writeable = False
+        self.rows = rows
+        self.slots = slots
+        self.today = today
+        self.error = error
+        # Gewichte des Kandidaten (Ausgangspunkt des Lernschritts) und des aktiven Modells
+        self.weights = weights
+        self.active_weights = weights if active_weights is None else active_weights
+        self.active_profile = active_profile
+        self.candidate_profile = active_profile if candidate_profile is None else candidate_profile
+        # Fehlerprotokoll der Schattenbewertung: {"weights"|"profile": [[Tag, Kandidat, aktiv], ...]}
+        self.shadow_errors = shadow_errors or {}
+        self.base_capacity = base_capacity
+        self.mode = mode
+        self.rls_state = rls_state
+        self.profile_state = profile_state
+        self.profile_window_days = profile_window_days
+        # Monatsaggregate des Archivs; werden nie verändert, sondern nur als Ganzes ersetzt
+        self.archive = archive or {}
+
+
+class LearningResult:
+    """Ergebnis eines Lernlaufs; wird vom Koordinator als Ganzes übernommen."""
+
+    def __init__(self):
+        self.weights: Dict[str, float] = {}
+        self.weights_report: Dict[str, Any] = {}
+        self.rls_learner: Optional[RecursiveLeastSquares] = None
+        self.profile_estimator: Optional[StreamingHourlyProfile] = None
+        self.hourly_profile: Optional[np.ndarray] = None
+        self.average_yield_previous_years: Optional[float] = None
+        # Schattenbewertung: Fehler von Kandidat und aktivem Modell, Übernahme je Teil
+        self.scores: Dict[str, Any] = {}
+        self.shadow_errors: Dict[str, List[List[float]]] = {}
+        self.promote_weights = False
+        self.promote_profile = False
+
+
+def base_step(weights: Dict[str, float], error: float, base_capacity: float) -> Dict[str, float]:
+    """Bisheriger Lernschritt: nur das Basisgewicht in Richtung des Fehlers verschieben."""
+    updated = dict(weights)
+    updated["base"] = float(np.clip(updated["base"] + 0.01 * (error / base_capacity), *BASE_WEIGHT_RANGE))
+    return updated
+
+
+def _learn_weights(snapshot: LearningSnapshot, result: LearningResult, ridge: float, min_days: int,
+                   rls_forgetting: float, rls_initial_variance: float) -> None:
+    if snapshot.mode == LEARNING_MODE_BATCH:
+        fitted, report = fit_weights(snapshot.rows, snapshot.base_capacity, snapshot.weights, ridge, min_days)
+        result.weights_report = {"mode": LEARNING_MODE_BATCH, **report}
+        if fitted is not None:
+            result.weights = fitted
+            return
+    elif snapshot.mode == LEARNING_MODE_RLS:
+        ordinal = snapshot.today.toordinal()
+        day = snapshot.rows[snapshot.rows["ordinal"] == ordinal]
+        if len(day) and training_mask(day)[0]:
+            x, fs = design_matrix(day, snapshot.base_capacity)
+            learner = RecursiveLeastSquares.from_snapshot(snapshot.rls_state, rls_forgetting, rls_initial_variance)
+            if learner is None:
+                # Spaltenskala einmalig aus den vorhandenen Tagen
+                trainable = design_matrix(snapshot.rows[training_mask(snapshot.rows)], snapshot.base_capacity)[0]
+                learner = RecursiveLeastSquares.create(trainable, rls_forgetting, rls_initial_variance)
+            result.weights = learner.update(snapshot.weights, x[0], float(day["actual"][0]), float(fs[0]))
+            result.rls_learner = learner
+            result.weights_report = {"mode": LEARNING_MODE_RLS, "updates": learner.updates}
+            return
+        result.weights_report = {"mode": LEARNING_MODE_RLS, "skipped": "kein Wetterfaktor für den Tag"}
+    result.weights = base_step(snapshot.weights, snapshot.error, snapshot.base_capacity)
+
+
+def _learn_profile(snapshot: LearningSnapshot, result: LearningResult) -> None:
+    estimator = StreamingHourlyProfile.from_snapshot(snapshot.profile_state, snapshot.profile_window_days, snapshot.slots)
+    if estimator is None:
+        history = ColumnarHistory(snapshot.rows, snapshot.slots)
+        estimator = StreamingHourlyProfile.from_rows(
+            history.last_days(snapshot.profile_window_days, snapshot.today), snapshot.profile_window_days, snapshot.slots
+        )
+    ordinal = snapshot.today.toordinal()
+    day = snapshot.rows[snapshot.rows["ordinal"] == ordinal]
+    if len(day):
+        ratios = day_ratios(float(day[0]["actual"]), day[0]["hourly"])
+        if ratios is not None: estimator.add_day(ordinal, ratios)
+    estimator.expire(ordinal)
+    result.profile_estimator = estimator
+    if estimator.day_count:
+        result.hourly_profile = normalize_profile(estimator.medians())
+
+
+def weights_day_error(day: np.ndarray, base_capacity: float, weights: Dict[str, float]) -> Optional[float]:
+    """Absoluter Fehler (kWh) der Tagesprognose für einen Tag (None, wenn er nicht nachrechenbar ist)."""
+    if not len(day) or not training_mask(day)[0]:
+        return None
+    x, fs = design_matrix(day, base_capacity)
+    return float(abs(predict(x, fs, weights)[0] - day["actual"][0]))
+
+
+def profile_day_error(day: np.ndarray, profile: Optional[np.ndarray]) -> Optional[float]:
+    """Abweichung der Tagesanteile eines Tages vom Profil (None ohne Profil oder Messwerte)."""
+    if profile is None or not len(day):
+        return None
+    return slot_share_error(day["actual"], day["hourly"], profile)[0]
+
+
+def _logged(log: Any, ordinal: int, candidate: Optional[float], active: Optional[float], days: int) -> List[List[float]]:
+    """Fehlerprotokoll der letzten `days` Tage, ergänzt um den heutigen Tag (ersetzt einen früheren Eintrag)."""
+    kept = [list(entry) for entry in log or [] if isinstance(entry, (list, tuple)) and len(entry) == 3
+            and ordinal - days < entry[0] < ordinal]
+    if candidate is not None and active is not None: kept.append([ordinal, candidate, active])
+    return kept
+
+
+def _mean_errors(log: List[List[float]]):
+    if not log:
+        return None, None, 0
+    errors = np.array(log, dtype=float)
+    return float(errors[:, 1].mean()), float(errors[:, 2].mean()), len(log)
+
+
+def _better_or_unrated(candidate: Optional[float], active: Optional[float], days: int, min_days: int) -> bool:
+    if days < min_days or candidate is None or active is None:
+        return True
+    return candidate <= active
+
+
+def evaluate_candidate(snapshot: LearningSnapshot, result: LearningResult, eval_days: int,
+                       profile_eval_days: int, min_days: int) -> None:
+    """
+    Predict-then-learn: Kandidat (Stand vor dem heutigen Lernschritt) und aktives Modell
+    werden auf dem heutigen Tag bewertet, bevor einer von beiden ihn gelernt hat. Die
+    Fehler werden protokolliert; verglichen werden die Mittel der letzten Tage. Ohne
+    genügend bewertete Tage gilt der Kandidat als übernehmbar (bisheriges Verhalten).
+    """
+    ordinal = snapshot.today.toordinal()
+    day = snapshot.rows[snapshot.rows["ordinal"] == ordinal]
+    log = _logged(
+        snapshot.shadow_errors.get("weights"), ordinal,
+        weights_day_error(day, snapshot.base_capacity, snapshot.weights),
+        weights_day_error(day, snapshot.base_capacity, snapshot.active_weights), eval_days,
+    )
+    result.shadow_errors["weights"] = log
+    candidate, active, days = _mean_errors(log)
+    result.promote_weights = _better_or_unrated(candidate, active, days, min_days)
+    result.scores["weights"] = {
+        "days": days, "mae_candidate": _rounded(candidate), "mae_active": _rounded(active),
+        "promoted": result.promote_weights,
+    }
+
+    usable = day[np.isfinite(day["actual"]) & (day["actual"] > 0)]
+    log = _logged(
+        snapshot.shadow_errors.get("profile"), ordinal,
+        profile_day_error(usable, snapshot.candidate_profile),
+        profile_day_error(usable, snapshot.active_profile), profile_eval_days,
+    )
+    result.shadow_errors["profile"] = log
+    if result.hourly_profile is None:
+        return
+    candidate, active, days = _mean_errors(log)
+    result.promote_profile = _better_or_unrated(candidate, active, days, min_days)
+    result.scores["profile"] = {
+        "days": days, "error_candidate": _rounded(candidate), "error_active": _rounded(active),
+        "promoted": result.promote_profile,
+    }
+
+
+def _rounded(value: Optional[float]) -> Optional[float]:
+    return round(value, 4) if value is not None else None
+
+
+def previous_years_yield(rows: np.ndarray, slots: int, today: date, archive: Optional[Dict[str, Any]] = None,
+                         max_years: int = 10) -> Optional[float]:
+    """
+    Durchschnittlicher Tagesertrag im selben 30-Tage-Fenster der Vorjahre. Tage vor dem
+    ältesten Tag der heißen History stammen anteilig aus den Monatsaggregaten des Archivs.
+    """
+    history = ColumnarHistory(rows, slots)
+    first_hot = date.fromordinal(int(rows["ordinal"][0])) if len(rows) else None
+    total, count = 0.0, 0.0
+    for years in range(1, max_years + 1):
+        start, end = _shift_years(today - timedelta(days=29), years), _shift_years(today, years)
+        actual = history.between(start, end)["actual"]
+        actual = actual[actual > 0]
+        total += float(actual.sum())
+        count += actual.size
+        cold_end = end if first_hot is None else min(end, first_hot - timedelta(days=1))
+        if archive and start <= cold_end:
+            archived_total, archived_count = archived_window_yield(archive, start, cold_end)
+            total += archived_total
+            count += archived_count
+    return round(total / count, 2) if count else None
+
+
+def rebuild_derived_state(rows: np.ndarray, slots: int, today: date, rolling_windows, profile_window_days: int):
+    """Blockierend (Executor): Rolling-Statistiken und Profil-Schätzer neu aus einem Schnappschuss der History."""
+    history = ColumnarHistory(rows, slots)
+    stats = RollingStatistics.from_rows(rows, rolling_windows)
+    estimator = StreamingHourlyProfile.from_rows(history.last_days(profile_window_days, today), profile_window_days, slots)
+    return stats, estimator
+
+
+def run_learning(snapshot: LearningSnapshot, ridge: float, min_days: int,
+                 rls_forgetting: float, rls_initial_variance: float,
+                 eval_days: int, profile_eval_days: int, eval_min_days: int) -> LearningResult:
+    """Blockierend (Executor): alle rechenintensiven Stufen des Lernlaufs auf dem Schnappschuss."""
+    result = LearningResult()
+    _learn_weights(snapshot, result, ridge, min_days, rls_forgetting, rls_initial_variance)
+    _learn_profile(snapshot, result)
+    evaluate_candidate(snapshot, result, eval_days, profile_eval_days, eval_min_days)
+    result.average_yield_previous_years = previous_years_yield(snapshot.rows, snapshot.slots, snapshot.today, snapshot.archive)
+    return result
@@ -0,0 +1,65 @@
+"""
+Unveränderlicher Modellstand für die Prognose.
+
+Gewichte, Basiskapazität und Stundenprofil bilden zusammen einen ModelState.
+Der Koordinator hält genau eine Referenz auf den aktiven Stand; jede Änderung
+erzeugt einen neuen ModelState (replace) und ersetzt die Referenz in einem
+Schritt. Leser (_predict_day, Produktionskurve) holen die Referenz einmal und
+sehen damit immer einen vollständigen Stand, ohne auf den data_lock zu warten.
+Gewichte sind ein schreibgeschütztes Mapping, das Profil ein schreibgeschütztes
+Array.
+
+Copyright (C) 2025 Zara-Toorox
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
+
+import numpy as np
+
+_UNSET: Any = object()
+
+
+def _frozen_profile(profile: Any) -> Optional[np.ndarray]:
+    if profile is None:
+        return None
+    if isinstance(profile, np.ndarray) and not profile.flags.writeable:
+        return profile
+    frozen = np.array(profile, dtype=float)
+    frozen.flags.writeable = False
+    return frozen
+
+
+class ModelState:
+    """Gewichte, Basiskapazität und Stundenprofil eines Modellstands (nach dem Anlegen unveränderlich)."""
+
+    __slots__ = ("weights", "base_capacity", "hourly_profile")
+
+    def __init__(self, weights: Mapping[str, float], base_capacity: float, hourly_profile: Any = None):
+        set_attr = object.__setattr__
+        set_attr(self, "weights", weights if isinstance(weights, MappingProxyType) else MappingProxyType(dict(weights)))
+        set_attr(self, "base_capacity", float(base_capacity))
+        set_attr(self, "hourly_profile", _frozen_profile(hourly_profile))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        raise AttributeError("ModelState ist unveränderlich, replace() verwenden")
+
+    def replace(self, weights: Any = _UNSET, base_capacity: Any = _UNSET, hourly_profile: Any = _UNSET) -> "ModelState":
+        """Neuer Stand mit den angegebenen Teilen; unveränderte Teile werden geteilt."""
+        return ModelState(
+            self.weights if weights is _UNSET else weights,
+            self.base_capacity if base_capacity is _UNSET else base_capacity,
+            self.hourly_profile if hourly_profile is _UNSET else hourly_profile,
+        )
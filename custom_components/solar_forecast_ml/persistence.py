@@ -0,0 +1,180 @@
+"""
+Transaktionales Speichern mehrerer Dateien (Alles-oder-nichts).
+
+Ein Commit schreibt alle geänderten JSON-Dateien zunächst als
+<datei>.<manifest>.txn neben das Ziel (<manifest> = Name des Manifests, je
+Konfigurationseintrag eigenes Manifest). Erst danach wird das Manifest
+(Zieldateien + Journal-Records) atomar geschrieben - das ist der Commit-Punkt.
+Anschließend werden die .txn-Dateien in Listenreihenfolge auf ihre Ziele
+umbenannt, die Records an das History-Journal angehängt und das Manifest
+gelöscht.
+
+Stürzt HA vor dem Commit-Punkt ab, werden die .txn-Dateien dieses Manifests
+beim nächsten Start verworfen (nichts angewendet). Stürzt HA danach ab oder
+schlägt das Umbenennen bzw. Anhängen fehl, bleibt das Manifest liegen und die
+Transaktion wird beim Start zu Ende geführt (Roll-Forward); der Aufrufer
+erfährt den Fehler über den Rückgabewert None und merkt alles erneut vor. Der
+nächste erfolgreiche Commit enthält diese Änderungen und ersetzt das Manifest.
+Das erneute Anhängen der Records ist unkritisch, da alle Journal-Records
+idempotent sind.
+
+Lässt sich eine festgeschriebene Transaktion beim Start nicht zu Ende führen
+(vorbereitete Datei fehlt, Journal nicht beschreibbar), wird das Manifest als
+<manifest>.failed zur manuellen Prüfung beiseitegelegt und TransactionError
+ausgelöst.
+
+Copyright (C) 2025 Zara-Toorox
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import glob
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+from .helpers import _read_history_file, _write_history_file
+from .history import HistoryJournal
+
+_LOGGER = logging.getLogger(__name__)
+
+TXN_SUFFIX = ".txn"
+FAILED_SUFFIX = ".failed"
+
+
+class TransactionError(Exception):
+    """Eine festgeschriebene Transaktion konnte nicht vollständig angewendet werden."""
+
+
+def staging_path(path: str, manifest_path: str) -> str:
+    """Vorbereitete Datei zu `path`, eindeutig für das Manifest (mehrere Einträge teilen sich DATA_DIR)."""
+    return f"{path}.{_manifest_tag(manifest_path)}{TXN_SUFFIX}"
+
+
+def _manifest_tag(manifest_path: str) -> str:
+    return os.path.splitext(os.path.basename(manifest_path))[0]
+
+
+def commit_transaction(manifest_path: str, files: Dict[str, Any], journal: HistoryJournal, records: List[Dict[str, Any]]) -> Optional[int]:
+    """
+    Blockierend: Schreibt alle Dateien und Journal-Records als eine Einheit.
+    Gibt die neue Journal-Größe zurück bzw. None, wenn nicht alles angewendet wurde.
+    """
+    if len(files) + (1 if records else 0) <= 1:
+        # Ein einzelnes Ziel ist bereits für sich atomar, kein Manifest nötig
+        for path, data in files.items():
+            if not _write_history_file(path, data): return None
+        size = journal.append(records)
+        if size is not None: _clear_previous(manifest_path)
+        return size
+
+    staged = []
+    for path, data in files.items():
+        if not _write_history_file(staging_path(path, manifest_path), data):
+            _discard_staged(staged + [path], manifest_path)
+            return None
+        staged.append(path)
+
+    if not _write_history_file(manifest_path, {"files": staged, "records": records}):
+        _discard_staged(staged, manifest_path)
+        return None
+
+    try:
+        size = _apply(manifest_path, staged, records, journal)
+    except (OSError, TransactionError) as e:
+        # Nach dem Commit-Punkt: Manifest bleibt für den Roll-Forward beim nächsten Start
+        _LOGGER.error(f"Speicher-Transaktion konnte nicht vollständig angewendet werden ({e}), sie wird beim nächsten Start zu Ende geführt.")
+        return None
+    _remove(manifest_path)
+    return size
+
+
+def recover_transaction(manifest_path: str, journal: HistoryJournal) -> bool:
+    """
+    Blockierend, beim Start: Führt eine nach dem Commit-Punkt abgebrochene Transaktion
+    zu Ende und verwirft Reste einer nicht festgeschriebenen (nur Dateien dieses Manifests).
+    Gibt True zurück, wenn eine Transaktion wiederhergestellt wurde; TransactionError,
+    wenn sie sich nicht zu Ende führen lässt.
+    """
+    recovered = False
+    if os.path.exists(manifest_path):
+        manifest = _read_history_file(manifest_path)
+        files, records = manifest.get("files"), manifest.get("records")
+        if isinstance(files, list) and isinstance(records, list):
+            try:
+                _apply(manifest_path, files, records, journal, recovering=True)
+            except (OSError, TransactionError) as e:
+                failed_path = manifest_path + FAILED_SUFFIX
+                os.replace(manifest_path, failed_path)
+                raise TransactionError(f"Unterbrochene Speicher-Transaktion nicht wiederherstellbar ({e}), Manifest unter {failed_path} abgelegt") from e
+            _LOGGER.warning(f"Unterbrochene Speicher-Transaktion wiederhergestellt ({len(files)} Dateien, {len(records)} History-Records).")
+            recovered = True
+        _remove(manifest_path)
+
+    _discard_stale_staged(manifest_path)
+    return recovered
+
+
+def _apply(manifest_path: str, paths: List[str], records: List[Dict[str, Any]], journal: HistoryJournal,
+           recovering: bool = False) -> int:
+    # Umbenannt wird in Listenreihenfolge: Beim Roll-Forward dürfen nur die ersten Dateien
+    # fehlen (schon umbenannt), und nur wenn ihr Ziel existiert. Geprüft wird vor dem ersten Umbenennen.
+    staged = [staging_path(path, manifest_path) for path in paths]
+    present = [os.path.exists(s) for s in staged]
+    first = present.index(True) if any(present) else len(paths)
+    for index, path in enumerate(paths):
+        if not present[index] and (index >= first or not recovering or not os.path.exists(path)):
+            raise TransactionError(f"vorbereitete Datei {os.path.basename(staged[index])} fehlt")
+    for path, staged_path in zip(paths[first:], staged[first:]):
+        os.replace(staged_path, path)
+    size = journal.append(records)
+    if size is None:
+        raise TransactionError("History-Records konnten nicht an das Journal angehängt werden")
+    return size
+
+
+def _clear_previous(manifest_path: str):
+    """Nach erfolgreichem Commit: ein liegengebliebenes Manifest ist überholt (alles wurde erneut vorgemerkt)."""
+    if os.path.exists(manifest_path):
+        _remove(manifest_path)
+        _discard_stale_staged(manifest_path)
+
+
+def _discard_stale_staged(manifest_path: str):
+    pattern = f"*.{glob.escape(_manifest_tag(manifest_path))}{TXN_SUFFIX}"
+    for stale in glob.glob(os.path.join(glob.escape(os.path.dirname(manifest_path)), pattern)):
+        _LOGGER.info(f"Verwerfe nicht festgeschriebene Datei {os.path.basename(stale)}.")
+        _discard(stale)
+
+
+def _discard_staged(paths: List[str], manifest_path: str):
+    for path in paths:
+        _discard(staging_path(path, manifest_path))
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        _LOGGER.warning(f"Transaktions-Manifest {path} konnte nicht entfernt werden: {e}")
+
+
+def _discard(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        _LOGGER.warning(f"Temporäre Datei {path} konnte nicht entfernt werden: {e}")
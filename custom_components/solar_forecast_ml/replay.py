@@ -0,0 +1,231 @@
+"""
+Backtesting: gespeicherte History mit beliebigen Gewichten und Profilen nachrechnen.
+
+Je Tag liegen in der History die Sensorwerte (features), der Wetterfaktor der
+Tagesprognose und der Ist-Ertrag. ReplayData baut daraus einmal die
+Designmatrix des Tagesmodells (trainer.design_matrix, also die Formel von
+_predict_day); evaluate rechnet danach beliebig viele Parametersätze in einer
+Matrixmultiplikation (Tage × Parametersätze) und liefert MAPE, Bias, MAE, RMSE
+sowie MAPE und Bias je Monat. Tage ohne gespeicherten Wetterfaktor (ältere
+Einträge) lassen sich nicht nachrechnen und werden gezählt, aber übersprungen.
+Ein Stundenprofil wird über die Abweichung der gemessenen Tagesanteile bewertet.
+
+Aufruf im laufenden Betrieb über den Service replay_history, offline ohne
+Home Assistant als Skript:
+
+    python replay.py prediction_history.json --params sets.json [--profile hourly_profile.json]
+
+--params ist ein Parametersatz (z. B. learned_weights.json) oder eine Liste davon;
+bei mehreren Sätzen werden die besten nach MAPE ausgegeben.
+
+Copyright (C) 2025 Zara-Toorox
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from datetime import date
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+
+import numpy as np
+
+if __name__ == "__main__" and not __package__:
+    # Als Skript gestartet: Paket registrieren, ohne __init__ (Home Assistant) auszuführen
+    import types
+    _package = types.ModuleType("solar_forecast_ml")
+    _package.__path__ = [os.path.dirname(os.path.abspath(__file__))]
+    sys.modules["solar_forecast_ml"] = _package
+    __package__ = "solar_forecast_ml"
+
+from .columnar import ColumnarHistory
+from .const import DEFAULT_BASE_CAPACITY, DEFAULT_WEIGHTS
+from .hourly_profile import slot_share_error
+from .trainer import LINEAR_KEYS, design_matrix, predict_linear, training_mask
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class ReplayData:
+    """Einmal aufbereitete History; evaluate rechnet darauf beliebig viele Parametersätze."""
+
+    def __init__(self, rows: np.ndarray, days: Optional[int] = None):
+        if days and len(rows):
+            rows = rows[rows["ordinal"] > rows["ordinal"].max() - days]
+        with_actual = np.isfinite(rows["actual"]) & (rows["actual"] > 0)
+        usable = training_mask(rows)
+        self.skipped_days = {
+            "no_actual": int(np.count_nonzero(~with_actual)),
+            "no_weather_factor": int(np.count_nonzero(with_actual & ~usable)),
+        }
+        # Profilbewertung braucht nur Ist-Wert und Slotwerte
+        self.profile_actual = rows["actual"][with_actual]
+        self.profile_hourly = rows["hourly"][with_actual]
+
+        rows = rows[usable]
+        self.ordinals = rows["ordinal"]
+        self.actual = rows["actual"]
+        # Basisspalte mit Kapazität 1; die Kapazität jedes Satzes geht in dessen w_base ein
+        self.x, self.fs = design_matrix(rows, 1.0)
+        months = np.array([date.fromordinal(int(o)).strftime("%Y-%m") for o in self.ordinals], dtype=str)
+        self.months, month_index = np.unique(months, return_inverse=True)
+        self.month_matrix = np.zeros((len(self.ordinals), len(self.months)))
+        self.month_matrix[np.arange(len(self.ordinals)), month_index] = 1.0
+        self.month_days = self.month_matrix.sum(axis=0)
+
+    def __len__(self) -> int:
+        return len(self.actual)
+
+
+def _parameter_matrix(weight_sets: Sequence[Mapping[str, float]], base_capacity: float):
+    linear = np.array([[float(w.get(k, DEFAULT_WEIGHTS.get(k, 0.0))) for k in LINEAR_KEYS] for w in weight_sets], dtype=float)
+    linear[:, 0] *= [float(w.get("base_capacity", base_capacity)) for w in weight_sets]
+    blend = np.array([float(w.get("fs", DEFAULT_WEIGHTS["fs"])) for w in weight_sets], dtype=float)
+    return linear.T, blend
+
+
+def evaluate(data: ReplayData, weight_sets: Sequence[Mapping[str, float]], base_capacity: float) -> Dict[str, np.ndarray]:
+    """
+    Fehlermaße für alle Parametersätze in einem Durchgang (Arrays mit einem Wert je Satz,
+    je Monat: Monate × Sätze). Ein Satz darf eine eigene base_capacity enthalten.
+    """
+    linear, blend = _parameter_matrix(weight_sets, base_capacity)
+    if not len(data):
+        empty = np.full(len(weight_sets), np.nan)
+        return {"mape": empty, "bias": empty, "mae": empty, "rmse": empty,
+                "month_mape": np.full((0, len(weight_sets)), np.nan), "month_bias": np.full((0, len(weight_sets)), np.nan)}
+    error = predict_linear(data.x, data.fs, linear, blend) - data.actual[:, None]
+    relative = np.abs(error) / data.actual[:, None]
+    return {
+        "mape": relative.mean(axis=0) * 100,
+        "bias": error.mean(axis=0),
+        "mae": np.abs(error).mean(axis=0),
+        "rmse": np.sqrt((error ** 2).mean(axis=0)),
+        "month_mape": data.month_matrix.T @ relative / data.month_days[:, None] * 100,
+        "month_bias": data.month_matrix.T @ error / data.month_days[:, None],
+    }
+
+
+def _round(value: float, digits: int = 3) -> Optional[float]:
+    return round(float(value), digits) if np.isfinite(value) else None
+
+
+def report(data: ReplayData, metrics: Dict[str, np.ndarray], index: int = 0) -> Dict[str, Any]:
+    """Bericht für einen Parametersatz aus dem Ergebnis von evaluate."""
+    return {
+        "days": len(data),
+        "first_day": date.fromordinal(int(data.ordinals[0])).isoformat() if len(data) else None,
+        "last_day": date.fromordinal(int(data.ordinals[-1])).isoformat() if len(data) else None,
+        "skipped_days": data.skipped_days,
+        "mape": _round(metrics["mape"][index], 2),
+        "bias_kwh": _round(metrics["bias"][index]),
+        "mae_kwh": _round(metrics["mae"][index]),
+        "rmse_kwh": _round(metrics["rmse"][index]),
+        "months": {
+            str(month): {"days": int(days), "mape": _round(mape, 2), "bias_kwh": _round(bias)}
+            for month, days, mape, bias in zip(data.months, data.month_days, metrics["month_mape"][:, index], metrics["month_bias"][:, index])
+        },
+    }
+
+
+def profile_report(data: ReplayData, profile: Optional[np.ndarray]) -> Optional[Dict[str, Any]]:
+    """Abweichung der gemessenen Tagesanteile vom Profil (None ohne Profil oder bei anderer Auflösung)."""
+    if profile is None or len(profile) != data.profile_hourly.shape[1]:
+        return None
+    error, days = slot_share_error(data.profile_actual, data.profile_hourly, np.asarray(profile, dtype=float))
+    return {"days": days, "error": _round(error, 4) if error is not None else None}
+
+
+def replay(rows: np.ndarray, weights: Mapping[str, float], base_capacity: float,
+           profile: Optional[np.ndarray] = None, days: Optional[int] = None) -> Dict[str, Any]:
+    """Blockierend (Executor): Backtest eines Parametersatzes (Service replay_history)."""
+    data = ReplayData(rows, days)
+    result = report(data, evaluate(data, [weights], base_capacity))
+    result["weights"] = {k: round(float(v), 6) for k, v in weights.items()}
+    result["base_capacity"] = round(float(base_capacity), 3)
+    result["profile"] = profile_report(data, profile)
+    return result
+
+
+# --- Offline-Aufruf ---
+
+def load_history(path: str, slots: int = 24) -> np.ndarray:
+    """Liest prediction_history.json und spielt ein danebenliegendes Journal (.journal) darüber ab."""
+    with open(path, "r", encoding="utf-8") as history_file:
+        days = json.load(history_file)
+    history = ColumnarHistory.from_days(days if isinstance(days, dict) else {}, slots)
+    journal_path = f"{os.path.splitext(path)[0]}.journal"
+    if os.path.exists(journal_path):
+        with open(journal_path, "r", encoding="utf-8") as journal:
+            for line in journal:
+                try: record = json.loads(line)
+                except ValueError: continue
+                if isinstance(record, dict): history.apply_record(record)
+    return np.array(history.rows)
+
+
+def _load_profile(path: str) -> Optional[np.ndarray]:
+    with open(path, "r", encoding="utf-8") as profile_file:
+        stored = json.load(profile_file)
+    if isinstance(stored, dict) and "profile" in stored: return np.array(stored["profile"], dtype=float)
+    # Altes Format {"0": Anteil, ..., "23": Anteil}
+    if isinstance(stored, dict): return np.array([float(stored.get(str(h), 0.0)) for h in range(24)])
+    return None
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Backtest der Solar Forecast ML History mit beliebigen Gewichten.")
+    parser.add_argument("history", help="Pfad zu prediction_history.json")
+    parser.add_argument("--params", help="JSON mit einem Parametersatz (z. B. learned_weights.json) oder einer Liste davon")
+    parser.add_argument("--base-capacity", type=float, default=DEFAULT_BASE_CAPACITY, help="Basiskapazität für Sätze ohne base_capacity")
+    parser.add_argument("--profile", help="hourly_profile.json zur Bewertung des Stundenprofils")
+    parser.add_argument("--slot-minutes", type=int, default=60, help="Zeitauflösung der Slotwerte (muss zum Profil passen)")
+    parser.add_argument("--days", type=int, help="Nur die letzten N Tage nachrechnen")
+    parser.add_argument("--top", type=int, default=10, help="Anzahl der besten Sätze bei mehreren Parametersätzen")
+    args = parser.parse_args(argv)
+
+    weight_sets: List[Dict[str, float]] = [dict(DEFAULT_WEIGHTS)]
+    if args.params:
+        with open(args.params, "r", encoding="utf-8") as params_file:
+            loaded = json.load(params_file)
+        weight_sets = loaded if isinstance(loaded, list) else [loaded]
+    data = ReplayData(load_history(args.history, 1440 // args.slot_minutes), args.days)
+    started = time.perf_counter()
+    metrics = evaluate(data, weight_sets, args.base_capacity)
+    seconds = time.perf_counter() - started
+
+    if len(weight_sets) == 1:
+        output = report(data, metrics)
+        output["weights"] = weight_sets[0]
+    else:
+        order = np.argsort(np.nan_to_num(metrics["mape"], nan=np.inf), kind="stable")[: args.top]
+        output = {
+            "evaluated": len(weight_sets),
+            "days": len(data),
+            "skipped_days": data.skipped_days,
+            "best": [{"index": int(i), **{k: v for k, v in report(data, metrics, int(i)).items() if k not in ("days", "first_day", "last_day", "skipped_days")},
+                      "weights": weight_sets[int(i)]} for i in order],
+        }
+    output["seconds"] = round(seconds, 4)
+    if args.profile: output["profile"] = profile_report(data, _load_profile(args.profile))
+    json.dump(output, sys.stdout, indent=2, ensure_ascii=False)
+    sys.stdout.write("\n")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
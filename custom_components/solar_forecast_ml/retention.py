@@ -0,0 +1,177 @@
+"""
+Gestaffelte Aufbewahrung (Tiered Retention) der Prognose-History.
+
+Die letzten Tage bleiben in prediction_history.json in voller Stundenauflösung
+("heiß"). Ältere, abgeschlossene Monate werden zu Monatsaggregaten (Summen,
+Zähler, Median der Stundenanteile) verdichtet und in
+prediction_history_archive.json ("kalt") abgelegt, statt sie zu löschen.
+Die Verdichtung läuft als geplante Wartung, nicht bei jedem Speichern.
+
+Copyright (C) 2025 Zara-Toorox
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+import statistics
+from datetime import date, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def archive_cutoff(today: date, hot_days: int) -> date:
+    """
+    Erster Tag, der noch heiß bleibt. Archiviert werden nur vollständige Monate,
+    deshalb ist die Grenze immer der Monatserste des Monats, in dem das
+    Aufbewahrungsfenster beginnt.
+    """
+    return (today - timedelta(days=hot_days)).replace(day=1)
+
+
+def select_days_to_archive(days: Dict[str, Any], cutoff: date) -> List[str]:
+    """Gibt die Datumsschlüssel aller Tage vor dem Stichtag zurück."""
+    selected = []
+    for day_str in days:
+        if not isinstance(day_str, str) or len(day_str) != 10:
+            continue
+        try:
+            if date.fromisoformat(day_str) < cutoff:
+                selected.append(day_str)
+        except ValueError:
+            _LOGGER.warning(f"Ungültiger Datumsschlüssel '{day_str}' in History gefunden, wird ignoriert.")
+    return selected
+
+
+def _empty_month() -> Dict[str, Any]:
+    return {
+        "archived_days": [],
+        "actual_days": 0,
+        "actual_sum": 0.0,
+        "actual_max": 0.0,
+        "predicted_sum": 0.0,
+        "error_days": 0,
+        "error_sum": 0.0,
+        "abs_error_sum": 0.0,
+        "sq_error_sum": 0.0,
+        "abs_pct_error_sum": 0.0,
+        "hourly_days": 0,
+        "hourly_ratio_median": [None] * 24,
+    }
+
+
+def _valid_number(value: Any) -> Optional[float]:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        return None
+    return float(value)
+
+
+def merge_into_archive(archive: Dict[str, Any], days: Dict[str, Any], day_keys: List[str]) -> int:
+    """
+    Verdichtet die angegebenen Tage zu Monatsaggregaten im Archiv.
+    Bereits archivierte Tage werden übersprungen (idempotent, falls die Wartung
+    nach einem Absturz erneut läuft). Gibt die Anzahl neu archivierter Tage zurück.
+    """
+    by_month: Dict[str, List[str]] = {}
+    for day_str in day_keys:
+        by_month.setdefault(day_str[:7], []).append(day_str)
+
+    archived = 0
+    for month, month_days in by_month.items():
+        agg = archive.setdefault(month, _empty_month())
+        done = set(agg["archived_days"])
+        previous_hourly_days = agg["hourly_days"]
+        ratios_by_hour: List[List[float]] = [[] for _ in range(24)]
+
+        for day_str in month_days:
+            day_num = int(day_str[8:10])
+            entry = days.get(day_str)
+            if day_num in done or not isinstance(entry, dict):
+                continue
+            done.add(day_num)
+            archived += 1
+
+            actual = _valid_number(entry.get("actual"))
+            predicted = _valid_number(entry.get("predicted"))
+            if actual is not None and actual > 0:
+                agg["actual_days"] += 1
+                agg["actual_sum"] += actual
+                agg["actual_max"] = max(agg["actual_max"], actual)
+                if predicted is not None:
+                    error = actual - predicted
+                    agg["error_days"] += 1
+                    agg["predicted_sum"] += predicted
+                    agg["error_sum"] += error
+                    agg["abs_error_sum"] += abs(error)
+                    agg["sq_error_sum"] += error * error
+                    agg["abs_pct_error_sum"] += abs(error / actual) * 100
+
+                hourly = entry.get("hourly_data")
+                if isinstance(hourly, dict) and hourly:
+                    agg["hourly_days"] += 1
+                    for hour_str, kwh in hourly.items():
+                        kwh = _valid_number(kwh)
+                        try:
+                            hour = int(hour_str)
+                        except (ValueError, TypeError):
+                            continue
+                        if kwh is not None and kwh >= 0 and 0 <= hour < 24:
+                            ratios_by_hour[hour].append(kwh / actual)
+
+        # Mediane lassen sich nicht exakt zusammenführen; kommen Tage zu einem
+        # bereits archivierten Monat hinzu (z. B. Backfill), wird gewichtet gemittelt.
+        new_hourly_days = agg["hourly_days"] - previous_hourly_days
+        for hour, ratios in enumerate(ratios_by_hour):
+            if not ratios:
+                continue
+            median = statistics.median(ratios)
+            old = agg["hourly_ratio_median"][hour]
+            if old is None or previous_hourly_days == 0:
+                agg["hourly_ratio_median"][hour] = median
+            else:
+                agg["hourly_ratio_median"][hour] = (
+                    (old * previous_hourly_days + median * new_hourly_days) / (previous_hourly_days + new_hourly_days)
+                )
+
+        agg["archived_days"] = sorted(done)
+    return archived
+
+
+def seasonal_average_yield(archive: Dict[str, Any], month: int) -> Optional[float]:
+    """Durchschnittlicher Tagesertrag eines Kalendermonats über alle archivierten Jahre."""
+    suffix = f"-{month:02d}"
+    total, count = 0.0, 0
+    for key, agg in archive.items():
+        if key.endswith(suffix) and isinstance(agg, dict):
+            total += agg.get("actual_sum", 0.0)
+            count += agg.get("actual_days", 0)
+    return round(total / count, 2) if count else None
+
+
+def archived_window_yield(archive: Dict[str, Any], start: date, end: date) -> Tuple[float, float]:
+    """
+    Ertragssumme und Anzahl Ertragstage der archivierten Monate im Zeitraum start..end.
+    Angeschnittene Monate zählen anteilig (Tage im Zeitraum / Tage im Monat).
+    """
+    total, count = 0.0, 0.0
+    month_start = start.replace(day=1)
+    while month_start <= end:
+        next_month = (month_start + timedelta(days=32)).replace(day=1)
+        agg = archive.get(month_start.strftime("%Y-%m"))
+        if isinstance(agg, dict):
+            overlap = (min(end, next_month - timedelta(days=1)) - max(start, month_start)).days + 1
+            share = overlap / (next_month - month_start).days
+            total += share * agg.get("actual_sum", 0.0)
+            count += share * agg.get("actual_days", 0)
+        month_start = next_month
+    return total, count
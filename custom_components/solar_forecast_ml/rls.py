@@ -0,0 +1,129 @@
+"""
+Online-Lernen aller Modellgewichte mit Recursive Least Squares (RLS).
+
+Statt die Regression (trainer.py) über die ganze History neu zu lösen, wird je
+beobachtetem Tag genau ein RLS-Schritt gerechnet: O(k²) mit k = 6 linearen
+Gewichten, unabhängig davon, wie viel History existiert. Der Zustand ist die
+k×k-Kovarianzmatrix (plus eine skalare Varianz für den Forecast.Solar-Anteil)
+und liegt als learned_weights_rls.json neben learned_weights.json.
+
+Der Vergessensfaktor λ < 1 gewichtet einen Tag, der n Tage zurückliegt, mit λⁿ;
+so folgen die Gewichte saisonalen Änderungen. Damit die Kovarianz bei Sensoren
+ohne Daten nicht unbegrenzt wächst (Windup), wird jede Varianz auf ihren
+Startwert begrenzt. Die Designzeile ist dieselbe wie beim Batch-Training;
+Spalten werden mit einer festen Skala (RMS beim Anlegen) normiert.
+
+Copyright (C) 2025 Zara-Toorox
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+from .trainer import BASE_WEIGHT_RANGE, LINEAR_KEYS
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class RecursiveLeastSquares:
+    """RLS-Zustand für die linearen Gewichte und den Forecast.Solar-Anteil."""
+
+    def __init__(self, scale: np.ndarray, forgetting: float, initial_variance: float):
+        self.scale = np.asarray(scale, dtype=float)
+        self.forgetting = forgetting
+        self.initial_variance = initial_variance
+        self.covariance = initial_variance * np.eye(len(LINEAR_KEYS))
+        # Varianz des Mischanteils in kWh-Einheiten der Basisspalte
+        self.fs_variance = initial_variance / self.scale[0] ** 2
+        self.updates = 0
+
+    @classmethod
+    def create(cls, x: np.ndarray, forgetting: float, initial_variance: float) -> "RecursiveLeastSquares":
+        """Neuer Zustand; die Spaltenskala ist der RMS der übergebenen Designzeilen (ohne Daten 1)."""
+        scale = np.sqrt(np.mean(x ** 2, axis=0)) if len(x) else np.ones(len(LINEAR_KEYS))
+        return cls(np.where(scale > 0, scale, 1.0), forgetting, initial_variance)
+
+    def update(self, weights: Dict[str, float], x: np.ndarray, actual: float, fs: float) -> Dict[str, float]:
+        """
+        Ein RLS-Schritt für einen Tag (Designzeile x, Ist-Wert, Forecast.Solar-Wert oder NaN).
+        Gibt die neuen Gewichte zurück; Schlüssel außerhalb des Modells bleiben erhalten.
+        """
+        blend = float(np.clip(weights.get("fs", 0.5), 0.0, 1.0))
+        has_fs = not np.isnan(fs)
+        z = x / self.scale
+        target = actual
+        if has_fs:
+            # Bei festem Mischanteil ist der Tag linear in den Gewichten
+            z = z * (1 - blend)
+            target = actual - blend * fs
+
+        v = np.array([weights.get(k, 0.0) for k in LINEAR_KEYS], dtype=float) * self.scale
+        pz = self.covariance @ z
+        gain = pz / (self.forgetting + z @ pz)
+        v = v + gain * (target - z @ v)
+        covariance = (self.covariance - np.outer(gain, pz)) / self.forgetting
+        self.covariance = self._bounded((covariance + covariance.T) / 2)
+
+        fitted = dict(weights)
+        linear = v / self.scale
+        linear[0] = np.clip(linear[0], *BASE_WEIGHT_RANGE)
+        fitted.update({k: float(w) for k, w in zip(LINEAR_KEYS, linear)})
+
+        if has_fs:
+            # Skalarer RLS-Schritt für den Mischanteil: actual - roh = w_fs · (fs - roh)
+            raw = float(x @ linear)
+            spread = fs - raw
+            p = self.fs_variance
+            gain_fs = p * spread / (self.forgetting + spread * p * spread)
+            fitted["fs"] = float(np.clip(blend + gain_fs * (actual - raw - spread * blend), 0.0, 1.0))
+            self.fs_variance = min((p - gain_fs * spread * p) / self.forgetting, self.initial_variance / self.scale[0] ** 2)
+        self.updates += 1
+        return fitted
+
+    def _bounded(self, covariance: np.ndarray) -> np.ndarray:
+        """Begrenzt jede Varianz auf den Startwert (symmetrische Skalierung, bleibt positiv semidefinit)."""
+        factor = np.sqrt(np.minimum(1.0, self.initial_variance / np.maximum(np.diag(covariance), 1e-300)))
+        return covariance * np.outer(factor, factor)
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        return {
+            "keys": list(LINEAR_KEYS),
+            "forgetting": self.forgetting,
+            "scale": [float(s) for s in self.scale],
+            "covariance": [[float(c) for c in row] for row in self.covariance],
+            "fs_variance": float(self.fs_variance),
+            "updates": self.updates,
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Any, forgetting: float, initial_variance: float) -> Optional["RecursiveLeastSquares"]:
+        """Stellt den Zustand wieder her. None, wenn der Snapshot fehlt oder nicht zum Modell passt."""
+        if not isinstance(snapshot, dict) or snapshot.get("keys") != list(LINEAR_KEYS):
+            return None
+        try:
+            k = len(LINEAR_KEYS)
+            scale = np.asarray(snapshot["scale"], dtype=float)
+            covariance = np.asarray(snapshot["covariance"], dtype=float)
+            if scale.shape != (k,) or covariance.shape != (k, k) or not np.all(np.isfinite(covariance)) or np.any(scale <= 0):
+                return None
+            learner = cls(scale, forgetting, initial_variance)
+            learner.covariance = learner._bounded(covariance)
+            learner.fs_variance = float(snapshot.get("fs_variance", learner.fs_variance))
+            learner.updates = int(snapshot.get("updates", 0))
+        except (KeyError, ValueError, TypeError):
+            _LOGGER.warning("Gespeicherter RLS-Zustand ist ungültig und wird neu angelegt.")
+            return None
+        return learner
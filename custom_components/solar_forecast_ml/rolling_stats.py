@@ -0,0 +1,179 @@
+"""
+Inkrementell gepflegte Rolling-Statistiken (MAPE, Bias, RMSE, Durchschnittsertrag).
+
+Für jedes Zeitfenster (z. B. 7, 30, 365 Tage) wird ein Ringpuffer fester Größe
+mit laufenden Summen geführt. Ein neuer Ist-Wert aus dem Lernprozess kostet
+O(1) pro Fenster, statt die History bei jeder Berechnung neu zu durchlaufen.
+Der Zustand wird als kleiner Snapshot gespeichert und beim Start wiederhergestellt.
+
+Copyright (C) 2025 Zara-Toorox
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+import math
+from typing import Any, Dict, Iterable, List, Optional
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class RollingWindow:
+    """
+    Ringpuffer über die letzten `days` Kalendertage.
+    Pro Tag gibt es höchstens einen Eintrag, die Kapazität ist daher `days`.
+    """
+
+    def __init__(self, days: int):
+        self.days = days
+        self._ordinals: List[Optional[int]] = [None] * days
+        self._predicted: List[Optional[float]] = [None] * days
+        self._actual: List[float] = [0.0] * days
+        self._head = 0  # Index des ältesten Eintrags
+        self._count = 0
+        self._reset_sums()
+
+    def _reset_sums(self):
+        self.yield_sum = 0.0
+        self.yield_days = 0
+        self.error_days = 0
+        self.error_sum = 0.0
+        self.sq_error_sum = 0.0
+        self.abs_pct_error_sum = 0.0
+
+    def _account(self, predicted: Optional[float], actual: float, sign: int):
+        """Addiert (sign=1) bzw. entfernt (sign=-1) einen Tag aus den laufenden Summen."""
+        if actual <= 0:
+            return
+        self.yield_sum += sign * actual
+        self.yield_days += sign
+        if predicted is not None:
+            error = actual - predicted
+            self.error_days += sign
+            self.error_sum += sign * error
+            self.sq_error_sum += sign * error * error
+            self.abs_pct_error_sum += sign * abs(error / actual) * 100
+
+    def _slot(self, offset: int) -> int:
+        return (self._head + offset) % self.days
+
+    def add(self, ordinal: int, predicted: Optional[float], actual: float) -> None:
+        """Nimmt einen Tag auf. Ein erneuter Wert für den neuesten Tag ersetzt ihn."""
+        if self._count:
+            newest = self._slot(self._count - 1)
+            newest_ordinal = self._ordinals[newest]
+            if ordinal == newest_ordinal:
+                self._account(self._predicted[newest], self._actual[newest], -1)
+                self._predicted[newest], self._actual[newest] = predicted, actual
+                self._account(predicted, actual, 1)
+                return
+            if ordinal < newest_ordinal:
+                _LOGGER.debug(f"Rolling-Statistik: Nachtrag für älteren Tag {ordinal} wird ignoriert.")
+                return
+
+        self.expire(ordinal)
+        if self._count == self.days:
+            # Kann nur bei Lücken im Datum nicht auftreten; zur Sicherheit ältesten verwerfen
+            self._drop_oldest()
+        slot = self._slot(self._count)
+        self._ordinals[slot], self._predicted[slot], self._actual[slot] = ordinal, predicted, actual
+        self._count += 1
+        self._account(predicted, actual, 1)
+
+    def expire(self, today_ordinal: int) -> None:
+        """Entfernt alle Einträge, die vor dem Fenster bis `today_ordinal` liegen."""
+        while self._count and self._ordinals[self._head] <= today_ordinal - self.days:
+            self._drop_oldest()
+
+    def _drop_oldest(self):
+        head = self._head
+        self._account(self._predicted[head], self._actual[head], -1)
+        self._ordinals[head], self._predicted[head], self._actual[head] = None, None, 0.0
+        self._head = self._slot(1)
+        self._count -= 1
+        if not self._count:
+            # Rundungsfehler der laufenden Summen nicht mitschleppen
+            self._reset_sums()
+
+    def entries(self) -> Iterable[tuple]:
+        for offset in range(self._count):
+            slot = self._slot(offset)
+            yield self._ordinals[slot], self._predicted[slot], self._actual[slot]
+
+    def metrics(self) -> Dict[str, Optional[float]]:
+        mape = self.abs_pct_error_sum / self.error_days if self.error_days else None
+        return {
+            "mape": round(mape, 2) if mape is not None else None,
+            "bias": round(self.error_sum / self.error_days, 3) if self.error_days else None,
+            "rmse": round(math.sqrt(max(0.0, self.sq_error_sum) / self.error_days), 3) if self.error_days else None,
+            "mean_yield": round(self.yield_sum / self.yield_days, 2) if self.yield_days else None,
+            "days": self.error_days,
+        }
+
+
+class RollingStatistics:
+    """Mehrere Rolling-Fenster, die gemeinsam aktualisiert und gespeichert werden."""
+
+    def __init__(self, windows: Iterable[int]):
+        self.windows: Dict[int, RollingWindow] = {days: RollingWindow(days) for days in sorted(set(windows))}
+
+    def add(self, ordinal: int, predicted: Optional[float], actual: float) -> None:
+        for window in self.windows.values():
+            window.add(ordinal, predicted, actual)
+
+    def expire(self, today_ordinal: int) -> None:
+        for window in self.windows.values():
+            window.expire(today_ordinal)
+
+    def metrics(self, days: int) -> Dict[str, Optional[float]]:
+        return self.windows[days].metrics()
+
+    def attributes(self, *keys: str) -> Dict[str, Any]:
+        """Flache Sensor-Attribute, z. B. {'mape_7d': ..., 'mape_30d': ...}."""
+        attributes = {}
+        for days, window in self.windows.items():
+            metrics = window.metrics()
+            for key in keys:
+                attributes[f"{key}_{days}d"] = metrics[key]
+        return attributes
+
+    def to_snapshot(self) -> Dict[str, Any]:
+        """Kompakter, JSON-fähiger Zustand. Das größte Fenster enthält alle Tage der kleineren."""
+        largest = self.windows[max(self.windows)]
+        return {
+            "windows": list(self.windows),
+            "entries": [[o, p, a] for o, p, a in largest.entries()],
+        }
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Any, windows: Iterable[int]) -> Optional["RollingStatistics"]:
+        """Stellt den Zustand wieder her. None, wenn der Snapshot fehlt oder nicht zu den Fenstern passt."""
+        windows = sorted(set(windows))
+        if not isinstance(snapshot, dict) or snapshot.get("windows") != windows:
+            return None
+        stats = cls(windows)
+        try:
+            for ordinal, predicted, actual in snapshot.get("entries", []):
+                stats.add(int(ordinal), predicted, float(actual))
+        except (ValueError, TypeError):
+            return None
+        return stats
+
+    @classmethod
+    def from_rows(cls, rows, windows: Iterable[int]) -> "RollingStatistics":
+        """Einmaliger Aufbau aus der (nach Datum sortierten) Spalten-History."""
+        stats = cls(windows)
+        for ordinal, predicted, actual in zip(rows["ordinal"], rows["predicted"], rows["actual"]):
+            if actual > 0:
+                stats.add(int(ordinal), None if math.isnan(predicted) else float(predicted), float(actual))
+        return stats
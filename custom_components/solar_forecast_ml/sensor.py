@@ -79,7 +79,7 @@ class BaseSolarSensor(CoordinatorEntity[SolarForecastCoordinator], SensorEntity)
             identifiers={(DOMAIN, entry.entry_id)},
             name="Solar Forecast ML",
             manufacturer="Zara-Toorox",
-            model="v4.4.6",
+            model="v4.5.0",
         )
 
 
@@ -105,6 +105,9 @@ class SolarForecastSensor(BaseSolarSensor):
 class NextHourSensor(BaseSolarSensor):
     """Sensor für die Prognose der nächsten Stunde."""
 
+    # Die Kurve ändert sich stündlich und würde die Recorder-Datenbank unnötig füllen
+    _unrecorded_attributes = frozenset({"production_curve"})
+
     def __init__(self, coordinator: SolarForecastCoordinator, entry: ConfigEntry):
         super().__init__(coordinator, entry)
         self._attr_unique_id = f"{entry.entry_id}_naechste_stunde"
@@ -117,6 +120,11 @@ class NextHourSensor(BaseSolarSensor):
     def native_value(self):
         return round(self.coordinator.next_hour_pred, 2)
 
+    @property
+    def extra_state_attributes(self) -> dict:
+        """Produktionskurve für heute und morgen (ein Wert je Slot ab 'start', siehe resolution_minutes)."""
+        return {"production_curve": self.coordinator.production_curve}
+
 
 class PeakProductionHourSensor(BaseSolarSensor):
     """Sensor für die Stunde mit der höchsten erwarteten Produktion."""
@@ -186,6 +194,11 @@ class SolarAccuracySensor(BaseSolarSensor):
     def native_value(self):
         return round(self.coordinator.data.get("genauigkeit", 0.0), 1) if self.coordinator.data else 0.0
 
+    @property
+    def extra_state_attributes(self) -> dict:
+        """Rolling-MAPE, Bias (Ist - Prognose) und RMSE je Zeitfenster."""
+        return self.coordinator.rolling_stats.attributes("mape", "bias", "rmse")
+
 
 class AverageYieldSensor(BaseSolarSensor):
     """Sensor für den durchschnittlichen Tagesertrag der letzten 30 Tage."""
@@ -204,6 +217,15 @@ class AverageYieldSensor(BaseSolarSensor):
     def native_value(self):
         return self.coordinator.data.get("average_yield_30_days", 0.0) if self.coordinator.data else 0.0
 
+    @property
+    def extra_state_attributes(self) -> dict:
+        """Vergleichswerte aus Vorjahren (History-Index und Archiv)."""
+        return {
+            **self.coordinator.rolling_stats.attributes("mean_yield"),
+            "previous_years_average_yield": self.coordinator.average_yield_previous_years,
+            "seasonal_average_yield": self.coordinator.seasonal_average_yield(),
+        }
+
 
 class AutarkySensor(BaseSolarSensor):
     """Sensor für den heutigen Autarkiegrad."""
@@ -247,5 +269,10 @@ class DiagnosticStatusSensor(BaseSolarSensor):
             # KORREKTUR: Check hinzugefügt, um Absturz bei None zu verhindern
             "last_update": dt_util.as_local(self.coordinator.last_update).isoformat() if self.coordinator.last_update else "Noch nicht",
             "base_capacity": f"{self.coordinator.base_capacity:.2f} kWh",
-            "weights": self.coordinator.weights,
+            "weights": dict(self.coordinator.weights),
+            "shadow_model": self.coordinator.shadow_report,
+            "forecast_cache": self.coordinator.forecast_cache.diagnostics(),
+            "weather_circuit_breaker": self.coordinator.forecast_breaker.diagnostics(),
+            "weather_fetch_latency": self.coordinator.forecast_latency.diagnostics(),
+            "weather_broker": self.coordinator.weather_broker.diagnostics(),
         }
\ No newline at end of file
@@ -0,0 +1,152 @@
+"""
+Geschlossene Ridge-Regression aller Modellgewichte über die gesamte History.
+
+Das Tagesmodell (_predict_day) ist
+    roh  = base_capacity · Wetterfaktor · w_base + Σ Sensor · w_sensor
+    roh *= 0.5 bei Regen > 0.1
+    pred = (1 - w_fs) · roh + w_fs · fs       (nur wenn Forecast.Solar vorhanden)
+Bei festem w_fs ist das linear in den übrigen Gewichten. Aus der
+Spalten-History wird in einem Durchgang die Designmatrix gebaut (eine Zeile je
+Tag mit Ist-Wert und gespeichertem Wetterfaktor) und das regularisierte
+Normalgleichungssystem gelöst. Die Regularisierung zieht zu den bisherigen
+Gewichten hin (Spalten auf gleiche Größenordnung skaliert); Sensoren ohne Daten
+behalten so ihr altes Gewicht. Tage mit Forecast.Solar-Wert gehen mit
+(1 - w_fs) skaliert ein; w_fs selbst ist bei festen Gewichten ebenfalls
+geschlossen lösbar. Beide Schritte wechseln sich einige Male ab (jeweils ein
+kleines k×k-System, k = 6).
+
+Dieses Modul importiert nichts aus Home Assistant; alle Funktionen sind reine
+NumPy-Berechnungen und laufen im Executor.
+
+Copyright (C) 2025 Zara-Toorox
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+from .columnar import FEATURE_KEYS
+
+_LOGGER = logging.getLogger(__name__)
+
+# Linear gelernte Gewichte (Reihenfolge der Spalten der Designmatrix)
+LINEAR_KEYS = ("base", "lux", "temp", "wind", "uv", "rain")
+SENSOR_KEYS = LINEAR_KEYS[1:]
+# Wertebereich von w_base wie beim bisherigen Lernschritt
+BASE_WEIGHT_RANGE = (0.5, 1.5)
+RAIN_THRESHOLD = 0.1
+# Abwechselnde Lösungen für Gewichte und Forecast.Solar-Anteil
+BLEND_ITERATIONS = 10
+
+
+def training_mask(rows: np.ndarray) -> np.ndarray:
+    """Tage, die zum Training taugen: Ist-Wert > 0 und gespeicherter Wetterfaktor."""
+    actual = rows["actual"]
+    return np.isfinite(actual) & (actual > 0) & np.isfinite(rows["weather_factor"])
+
+
+def design_matrix(rows: np.ndarray, base_capacity: float) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Designmatrix (Tage × LINEAR_KEYS) und Forecast.Solar-Spalte (NaN = kein Wert).
+    Fehlende Sensorwerte tragen wie in _predict_day nichts bei; die Regenhalbierung
+    ist in die Zeile eingerechnet.
+    """
+    features = rows["features"]
+    sensors = np.nan_to_num(features[:, [FEATURE_KEYS.index(k) for k in SENSOR_KEYS]], nan=0.0)
+    rain = features[:, FEATURE_KEYS.index("rain")]
+    scale = np.where(np.nan_to_num(rain, nan=0.0) > RAIN_THRESHOLD, 0.5, 1.0)
+    x = np.column_stack([base_capacity * rows["weather_factor"], sensors]) * scale[:, None]
+    return x, features[:, FEATURE_KEYS.index("fs")]
+
+
+def predict(x: np.ndarray, fs: np.ndarray, weights: Dict[str, float]) -> np.ndarray:
+    """Tagesprognosen für eine Designmatrix (vektorisierte Form von _predict_day)."""
+    linear = np.array([weights.get(k, 0.0) for k in LINEAR_KEYS], dtype=float)
+    return predict_linear(x, fs, linear, weights.get("fs", 0.5))
+
+
+def predict_linear(x: np.ndarray, fs: np.ndarray, linear: np.ndarray, blend) -> np.ndarray:
+    """
+    Wie predict, mit Gewichten als Vektor (LINEAR_KEYS) oder Matrix (LINEAR_KEYS × Parametersätze)
+    und Mischanteil als Zahl bzw. Vektor je Parametersatz. Ergebnis: Tage bzw. Tage × Parametersätze.
+    """
+    raw = x @ linear
+    if raw.ndim == 2: fs = fs[:, None]
+    return np.maximum(np.where(np.isnan(fs), raw, (1 - blend) * raw + blend * np.nan_to_num(fs)), 0.0)
+
+
+def _rmse(pred: np.ndarray, actual: np.ndarray) -> Optional[float]:
+    return round(float(np.sqrt(np.mean((pred - actual) ** 2))), 3) if len(actual) else None
+
+
+def fit_weights(rows: np.ndarray, base_capacity: float, weights: Dict[str, float],
+                ridge: float, min_days: int) -> Tuple[Optional[Dict[str, float]], Dict[str, Any]]:
+    """
+    Löst die Ridge-Regression für alle Gewichte. Gibt (neue Gewichte oder None, Bericht) zurück;
+    None, wenn zu wenige Tage vorhanden sind oder das System nicht lösbar ist.
+    """
+    rows = rows[training_mask(rows)]
+    x, fs = design_matrix(rows, base_capacity)
+    actual = rows["actual"]
+    report: Dict[str, Any] = {"days": int(len(rows)), "days_with_fs": int(np.count_nonzero(~np.isnan(fs)))}
+    if len(rows) < min_days:
+        report["skipped"] = f"zu wenige Tage ({len(rows)} < {min_days})"
+        return None, report
+    report["rmse_before"] = _rmse(predict(x, fs, weights), actual)
+
+    # Spalten auf RMS 1 skalieren, damit ein Regularisierungsfaktor für alle Größenordnungen passt
+    prior = np.array([weights.get(k, 0.0) for k in LINEAR_KEYS], dtype=float)
+    scale = np.sqrt(np.mean(x ** 2, axis=0))
+    scale = np.where(scale > 0, scale, 1.0)
+    z = x / scale
+    penalty = ridge * len(rows)
+    has_fs = ~np.isnan(fs)
+    fit_blend = np.count_nonzero(has_fs) >= min_days
+    blend = float(np.clip(weights.get("fs", 0.5), 0.0, 1.0))
+    fs_values = np.nan_to_num(fs)
+
+    for _ in range(BLEND_ITERATIONS if fit_blend else 1):
+        # Gewichte bei festem w_fs: Forecast.Solar-Tage mit (1 - w_fs) gewichtet, Ziel ohne fs-Anteil
+        row_scale = np.where(has_fs, 1 - blend, 1.0)
+        zs = z * row_scale[:, None]
+        target = actual - np.where(has_fs, blend * fs_values, 0.0)
+        gram = zs.T @ zs + penalty * np.eye(len(LINEAR_KEYS))
+        try:
+            solution = np.linalg.solve(gram, zs.T @ target + penalty * prior * scale) / scale
+        except np.linalg.LinAlgError as e:
+            report["skipped"] = f"Gleichungssystem nicht lösbar: {e}"
+            return None, report
+        if not np.all(np.isfinite(solution)):
+            report["skipped"] = "Lösung nicht endlich"
+            return None, report
+        solution[0] = np.clip(solution[0], *BASE_WEIGHT_RANGE)
+        if not fit_blend:
+            break
+        # w_fs bei festen Gewichten: actual - roh = w_fs · (fs - roh)
+        raw = x[has_fs] @ solution
+        spread = fs[has_fs] - raw
+        denominator = float(spread @ spread)
+        if denominator <= 0:
+            break
+        blend = float(np.clip(spread @ (actual[has_fs] - raw) / denominator, 0.0, 1.0))
+
+    fitted = dict(weights)
+    fitted.update({k: float(v) for k, v in zip(LINEAR_KEYS, solution)})
+    if fit_blend: fitted["fs"] = blend
+
+    report["rmse_after"] = _rmse(predict(x, fs, fitted), actual)
+    report["weights"] = {k: round(v, 6) for k, v in fitted.items()}
+    return fitted, report
@@ -0,0 +1,318 @@
+"""
+Zwischenspeicher für Antworten von weather.get_forecasts.
+
+Tages- und Stundenprognose sowie die Erkennung der Prognose-Methode fragen
+dieselbe Wetter-Entität ab. Die Antworten werden pro (Entität, Prognosetyp)
+mit einer Lebensdauer (TTL) zwischengespeichert. Ändert sich last_updated der
+Wetter-Entität, ist der Eintrag sofort ungültig, da der Wetterdienst dann neue
+Daten geliefert hat.
+
+Zusätzlich: ein Circuit Breaker, der einen wiederholt fehlschlagenden
+Wetterdienst mit wachsendem Abstand schont (währenddessen wird die letzte
+gültige Antwort verwendet), und ein Latenz-Histogramm der Abrufe.
+
+Der WeatherBroker bündelt das alles für alle Konfigurationseinträge: ein
+gemeinsamer Cache, ein Breaker je Wetter-Entität und Single-Flight je
+(Entität, Prognosetyp). Fragen mehrere Anlagen gleichzeitig dieselbe Entität
+ab, gibt es nur einen Aufruf beim Anbieter; neue Antworten werden an alle
+anderen abonnierten Koordinatoren verteilt.
+
+Copyright (C) 2025 Zara-Toorox
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU Affero General Public License as
+published by the Free Software Foundation, either version 3 of the
+License, or (at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU Affero General Public License for more details.
+
+You should have received a copy of the GNU Affero General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+import asyncio
+import bisect
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def extract_forecasts(response: Any, entity_id: str) -> List[Dict[str, Any]]:
+    """Liest die Prognoseliste aus einer get_forecasts-Antwort (neues und altes Format)."""
+    if not isinstance(response, dict):
+        return []
+    forecasts = response.get(entity_id, {}).get("forecast") or response.get("forecast")
+    return forecasts if isinstance(forecasts, list) else []
+
+
+class ForecastCache:
+    """TTL-Cache für Prognoselisten, Schlüssel (entity_id, forecast_type)."""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._entries: Dict[Tuple[str, str], Tuple[float, Any, List[Dict[str, Any]]]] = {}
+        # Letzte gültige Antwort je Schlüssel, unabhängig von TTL (Fallback bei Ausfällen)
+        self._last_good: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, entity_id: str, forecast_type: str, last_updated: Any, ttl_seconds: Optional[float] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Liefert die gespeicherte Liste oder None, wenn sie fehlt, abgelaufen ist oder
+        die Wetter-Entität seitdem aktualisiert wurde. `ttl_seconds` kann die Lebensdauer
+        für den Aufrufer verkürzen (gemeinsamer Cache mehrerer Einträge).
+        """
+        ttl = self.ttl_seconds if ttl_seconds is None else min(ttl_seconds, self.ttl_seconds)
+        key = (entity_id, forecast_type)
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_at, stored_last_updated, forecasts = entry
+            if stored_last_updated == last_updated and time.monotonic() - stored_at < ttl:
+                self.hits += 1
+                return forecasts
+            if stored_last_updated != last_updated or time.monotonic() - stored_at >= self.ttl_seconds:
+                del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, entity_id: str, forecast_type: str, last_updated: Any, forecasts: List[Dict[str, Any]]) -> None:
+        if not forecasts:
+            return
+        self._last_good[(entity_id, forecast_type)] = forecasts
+        if self.ttl_seconds <= 0:
+            return
+        self._entries[(entity_id, forecast_type)] = (time.monotonic(), last_updated, forecasts)
+
+    def last_good(self, entity_id: str, forecast_type: str) -> Optional[List[Dict[str, Any]]]:
+        return self._last_good.get((entity_id, forecast_type))
+
+    def diagnostics(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "ttl_seconds": self.ttl_seconds,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total * 100, 1) if total else None,
+        }
+
+
+class CircuitBreaker:
+    """
+    Öffnet nach `failure_threshold` aufeinanderfolgenden Fehlern. Solange er offen ist,
+    wird der Dienst nicht aufgerufen; danach ist genau ein Probeaufruf erlaubt
+    (halb offen), alle weiteren werden bis zu dessen Ergebnis abgewiesen. Jeder weitere Fehlschlag verdoppelt die Wartezeit bis `max_backoff`.
+    """
+
+    def __init__(self, failure_threshold: int, base_backoff: float, max_backoff: float):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.trips = 0
+        self._open_until = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.failures < self.failure_threshold:
+            return "closed"
+        return "open" if time.monotonic() < self._open_until else "half_open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed": return True
+        if state == "open" or self._probe_in_flight: return False
+        self._probe_in_flight = True
+        return True
+
+    def abort_probe(self) -> None:
+        """Der Probeaufruf wurde ohne Ergebnis abgebrochen; der nächste Aufruf darf erneut proben."""
+        self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        if self.failures >= self.failure_threshold:
+            _LOGGER.info("Wetterdienst antwortet wieder, Circuit Breaker geschlossen.")
+        self.failures = 0
+        self._open_until = 0.0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self._probe_in_flight = False
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            backoff = min(self.max_backoff, self.base_backoff * 2 ** (self.failures - self.failure_threshold))
+            self._open_until = time.monotonic() + backoff
+            self.trips += 1
+            _LOGGER.warning(f"Wetterdienst {self.failures}x in Folge fehlgeschlagen, nächster Versuch in {backoff:.0f}s.")
+
+    def diagnostics(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "trips": self.trips,
+            "probe_in_flight": self._probe_in_flight,
+            "retry_in_seconds": max(0, round(self._open_until - time.monotonic())) if self.state == "open" else 0,
+        }
+
+
+class LatencyHistogram:
+    """Histogramm der Abrufdauer (Sekunden) mit festen Bucket-Grenzen."""
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # letzter Bucket: > größte Grenze
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        index = bisect.bisect_left(self.buckets, seconds)
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def diagnostics(self) -> Dict[str, Any]:
+        result = {f"le_{bound:g}s": n for bound, n in zip(self.buckets, self.counts)}
+        result[f"gt_{self.buckets[-1]:g}s"] = self.counts[-1]
+        result.update({
+            "count": self.count,
+            "mean_seconds": round(self.total / self.count, 3) if self.count else None,
+            "max_seconds": round(self.max, 3),
+        })
+        return result
+
+
+class WeatherFetchError(Exception):
+    """Abruf fehlgeschlagen und keine letzte gültige Antwort vorhanden."""
+
+
+class WeatherBroker:
+    """
+    Gemeinsamer Prognoseabruf aller Konfigurationseinträge (liegt in hass.data[DOMAIN]).
+    Abonnenten melden sich je Wetter-Entität mit ihrer Cache-Lebensdauer und einem
+    Listener an, der neue Antworten anderer Einträge erhält.
+    """
+
+    def __init__(self, hass: Any, timeout: float, breaker_failures: int, breaker_backoff: float,
+                 breaker_max_backoff: float, latency_buckets: Tuple[float, ...]):
+        self.hass = hass
+        self.timeout = timeout
+        self._breaker_args = (breaker_failures, breaker_backoff, breaker_max_backoff)
+        self.cache = ForecastCache(0)
+        self.latency = LatencyHistogram(latency_buckets)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        # Laufende Abrufe je (Entität, Typ) mit den Abonnenten, die darauf warten
+        self._inflight: Dict[Tuple[str, str], Tuple[asyncio.Future, set]] = {}
+        self._subscribers: Dict[Any, Tuple[str, float, Callable[[str, List[Dict[str, Any]]], None]]] = {}
+        self.calls = 0
+        self.joined = 0  # Anfragen, die sich einem laufenden Abruf angeschlossen haben
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, subscriber: Any, entity_id: str, ttl_seconds: float,
+                  listener: Callable[[str, List[Dict[str, Any]]], None]) -> Callable[[], None]:
+        """Meldet einen Koordinator an; gibt die Abmeldefunktion zurück."""
+        self._subscribers[subscriber] = (entity_id, ttl_seconds, listener)
+        self._update_ttl()
+
+        def unsubscribe() -> None:
+            self._subscribers.pop(subscriber, None)
+            self._update_ttl()
+        return unsubscribe
+
+    def _update_ttl(self) -> None:
+        # Gespeichert wird so lange, wie der Abonnent mit der längsten Lebensdauer es braucht
+        self.cache.ttl_seconds = max((ttl for _, ttl, _ in self._subscribers.values()), default=0)
+
+    def breaker(self, entity_id: str) -> CircuitBreaker:
+        if entity_id not in self._breakers:
+            self._breakers[entity_id] = CircuitBreaker(*self._breaker_args)
+        return self._breakers[entity_id]
+
+    async def async_get_forecasts(self, entity_id: str, forecast_type: str, last_updated: Any, ttl_seconds: float,
+                                  call: Callable[[], Awaitable[Any]], origin: Any = None) -> List[Dict[str, Any]]:
+        """
+        Prognoseliste aus dem Cache, aus einem bereits laufenden Abruf (Single-Flight) oder
+        über `call` (liefert die rohe get_forecasts-Antwort). Der Abruf läuft als eigene
+        Task, damit ein abgebrochener Aufrufer die übrigen Wartenden nicht mitreißt.
+        """
+        forecasts = self.cache.get(entity_id, forecast_type, last_updated, ttl_seconds)
+        if forecasts is not None:
+            _LOGGER.debug(f"Wetterprognose ({forecast_type}) aus dem Cache verwendet.")
+            return forecasts
+
+        key = (entity_id, forecast_type)
+        if key in self._inflight:
+            task, waiting = self._inflight[key]
+            self.joined += 1
+            _LOGGER.debug(f"Schließe an laufenden Abruf der {forecast_type}-Prognose von {entity_id} an.")
+        else:
+            waiting = set()
+            task = self.hass.async_create_background_task(
+                self._async_fetch(entity_id, forecast_type, last_updated, call, waiting),
+                f"solar_forecast_ml_weather_{entity_id}_{forecast_type}",
+            )
+            self._inflight[key] = (task, waiting)
+            task.add_done_callback(lambda done, key=key: self._fetch_done(key, done))
+        if origin is not None: waiting.add(origin)
+        return await asyncio.shield(task)
+
+    def _fetch_done(self, key: Tuple[str, str], task: asyncio.Future) -> None:
+        if key in self._inflight and self._inflight[key][0] is task:
+            del self._inflight[key]
+        # Fehler gelten als abgeholt, auch wenn alle Wartenden abgebrochen wurden
+        if not task.cancelled(): task.exception()
+
+    async def _async_fetch(self, entity_id: str, forecast_type: str, last_updated: Any,
+                           call: Callable[[], Awaitable[Any]], waiting: set) -> List[Dict[str, Any]]:
+        breaker = self.breaker(entity_id)
+        last_good = self.cache.last_good(entity_id, forecast_type)
+        if not breaker.allow():
+            _LOGGER.debug(f"Circuit Breaker offen oder Probeaufruf läuft, verwende letzte gültige {forecast_type}-Prognose.")
+            return last_good or []
+
+        self.calls += 1
+        started = time.monotonic()
+        try:
+            response = await asyncio.wait_for(call(), timeout=self.timeout)
+        except asyncio.CancelledError:
+            breaker.abort_probe()
+            raise
+        except Exception as e:
+            self.latency.observe(time.monotonic() - started)
+            breaker.record_failure()
+            if isinstance(e, asyncio.TimeoutError): e = f"keine Antwort nach {self.timeout}s"
+            if last_good:
+                _LOGGER.warning(f"Abruf der {forecast_type}-Prognose fehlgeschlagen ({e}), verwende letzte gültige Antwort.")
+                return last_good
+            raise WeatherFetchError(f"Abruf der {forecast_type}-Prognose fehlgeschlagen: {e}")
+        self.latency.observe(time.monotonic() - started)
+        breaker.record_success()
+
+        if response is None:
+            _LOGGER.warning(f"Service-Call für {forecast_type}-Prognose gab None zurück.")
+            return last_good or []
+        forecasts = extract_forecasts(response, entity_id)
+        self.cache.put(entity_id, forecast_type, last_updated, forecasts)
+        if forecasts: self._fan_out(entity_id, forecast_type, forecasts, waiting)
+        return forecasts
+
+    def _fan_out(self, entity_id: str, forecast_type: str, forecasts: List[Dict[str, Any]], waiting: set) -> None:
+        """Verteilt eine neue Antwort an alle Abonnenten derselben Entität, die nicht ohnehin darauf warten."""
+        for subscriber, (subscribed_entity, _, listener) in list(self._subscribers.items()):
+            if subscriber in waiting or subscribed_entity != entity_id:
+                continue
+            try:
+                listener(forecast_type, forecasts)
+            except Exception as e: _LOGGER.error(f"Fehler beim Verteilen der {forecast_type}-Prognose: {e}", exc_info=True)
+
+    def diagnostics(self) -> Dict[str, Any]:
+        return {"subscribers": len(self._subscribers), "calls": self.calls, "joined": self.joined, "in_flight": len(self._inflight)}
@@ -0,0 +1,118 @@
+"""
+Gemeinsame Einrichtung der Tests.
+
+Die Module ohne Home-Assistant-Abhängigkeit (Integrator, Trainer, History,
+Backfill, ...) werden direkt getestet. Ohne Home Assistant wird das Paket dazu
+wie beim Offline-Aufruf von replay.py registriert, ohne __init__ auszuführen.
+Mit Home Assistant (pytest-homeassistant-custom-component) wird es vollständig
+importiert; die Koordinator-Tests nutzen dann die hass-Fixture.
+"""
+import os
+import sys
+import types
+
+COMPONENT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "custom_components", "solar_forecast_ml")
+
+try:
+    import homeassistant  # noqa: F401
+    HAS_HOMEASSISTANT = True
+except ImportError:
+    HAS_HOMEASSISTANT = False
+
+if "solar_forecast_ml" not in sys.modules:
+    if HAS_HOMEASSISTANT:
+        sys.path.insert(0, os.path.dirname(COMPONENT_DIR))
+    else:
+        _package = types.ModuleType("solar_forecast_ml")
+        _package.__path__ = [COMPONENT_DIR]
+        sys.modules["solar_forecast_ml"] = _package
+
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+TRUE_WEIGHTS = {"base": 1.2, "lux": 0.0001, "temp": 0.08, "wind": -0.05, "uv": 0.3, "rain": -0.2, "fs": 0.5}
+BASE_CAPACITY = 10.0
+FIRST_DAY = date(2024, 1, 1)
+
+
+def synthetic_days(count, seed=0, with_fs=False, hourly=True, noise=0.0):
+    """
+    History im Format von prediction_history.json. Der Ist-Ertrag folgt exakt der
+    Tagesformel mit TRUE_WEIGHTS (ohne Regen, damit die Zeilen nicht halbiert werden).
+    """
+    rng = np.random.default_rng(seed)
+    days = {}
+    for offset in range(count):
+        features = {"lux": float(rng.uniform(5000, 60000)), "temp": float(rng.uniform(-5, 30)),
+                    "wind": float(rng.uniform(0, 10)), "uv": float(rng.uniform(0, 8)), "rain": 0.0}
+        weather_factor = float(rng.uniform(0.2, 1.0))
+        raw = BASE_CAPACITY * weather_factor * TRUE_WEIGHTS["base"] + sum(features[k] * TRUE_WEIGHTS[k] for k in ("lux", "temp", "wind", "uv", "rain"))
+        actual = raw
+        if with_fs:
+            features["fs"] = float(raw * rng.uniform(0.8, 1.2))
+            actual = (1 - TRUE_WEIGHTS["fs"]) * raw + TRUE_WEIGHTS["fs"] * features["fs"]
+        actual += float(rng.normal(0, noise)) if noise else 0.0
+        entry = {"predicted": round(actual * 0.9, 3), "actual": round(actual, 6), "weather_factor": weather_factor, "features": features}
+        if hourly:
+            shares = np.zeros(24)
+            shares[6:20] = np.sin(np.linspace(0, np.pi, 16)[1:-1])
+            entry["hourly_data"] = {str(h): float(actual * s / shares.sum()) for h, s in enumerate(shares) if s > 0}
+        days[(FIRST_DAY + timedelta(days=offset)).isoformat()] = entry
+    return days
+
+
+@pytest.fixture
+def history_rows():
+    """Spalten-History mit 120 Tagen aus synthetic_days."""
+    from solar_forecast_ml.columnar import ColumnarHistory
+    return np.array(ColumnarHistory.from_days(synthetic_days(120)).rows)
+
+
+# --- Koordinator (nur mit Home Assistant) ---
+
+ENTRY_DATA = {
+    "weather_entity": "weather.home",
+    "power_entity": "sensor.yield_today",
+    "current_power_sensor": "sensor.pv_power",
+    "plant_kwp": 10,
+    "notify_startup": False,
+    "notify_successful_learning": False,
+}
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Leitet alle Datendateien des Koordinators in ein temporäres Verzeichnis um."""
+    from solar_forecast_ml import const, coordinator as coordinator_module
+    for name in dir(const):
+        value = getattr(const, name)
+        if name.endswith("_FILE") and isinstance(value, str) and value.startswith(const.DATA_DIR + "/"):
+            monkeypatch.setattr(coordinator_module, name, str(tmp_path) + value[len(const.DATA_DIR):])
+    return tmp_path
+
+
+@pytest.fixture
+async def make_coordinator(hass, data_dir):
+    """
+    Legt Koordinatoren wie async_setup_entry an (Eintrag in hass.data, ohne Plattformen).
+    Optionen überschreiben ENTRY_DATA. Nach dem Test werden alle entladen.
+    """
+    from pytest_homeassistant_custom_component.common import MockConfigEntry
+    from solar_forecast_ml.const import DOMAIN
+    from solar_forecast_ml.coordinator import SolarForecastCoordinator
+
+    created = []
+
+    def _make(**options):
+        entry = MockConfigEntry(domain=DOMAIN, data=dict(ENTRY_DATA), options=options)
+        entry.add_to_hass(hass)
+        coordinator = SolarForecastCoordinator(hass, entry)
+        hass.data[DOMAIN][entry.entry_id] = coordinator
+        created.append(coordinator)
+        return coordinator
+
+    yield _make
+    for coordinator in created:
+        await coordinator.async_unload()
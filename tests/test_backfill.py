@@ -0,0 +1,90 @@
+"""Backfill aus einer SQLite-Recorder-Datei (Tabellen statistics/statistics_meta)."""
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timezone
+
+from solar_forecast_ml.backfill import BackfillAccumulator, batch_windows, read_recorder_statistics
+
+DAY_START = datetime(2025, 6, 1, tzinfo=timezone.utc).timestamp()
+
+
+def _utc_day_hour(ts):
+    moment = datetime.fromtimestamp(ts, timezone.utc)
+    return moment.date().isoformat(), moment.hour
+
+
+def _create_recorder(path, rows):
+    with closing(sqlite3.connect(path)) as connection:
+        connection.execute("CREATE TABLE statistics_meta (id INTEGER PRIMARY KEY, statistic_id TEXT)")
+        connection.execute(
+            "CREATE TABLE statistics (id INTEGER PRIMARY KEY, metadata_id INTEGER, start_ts REAL, "
+            "mean REAL, max REAL, state REAL, sum REAL)"
+        )
+        ids = {}
+        for statistic_id, *_ in rows:
+            if statistic_id not in ids:
+                ids[statistic_id] = connection.execute(
+                    "INSERT INTO statistics_meta (statistic_id) VALUES (?)", (statistic_id,)
+                ).lastrowid
+        connection.executemany(
+            "INSERT INTO statistics (metadata_id, start_ts, mean, max, state, sum) VALUES (?, ?, ?, ?, ?, ?)",
+            [(ids[statistic_id], *values) for statistic_id, *values in rows],
+        )
+        connection.commit()
+
+
+def _recorder_rows():
+    rows = []
+    total = 100.0
+    # Kumulierte Summe des Ertragssensors ab dem Vortag 23 Uhr (liefert den Ausgangswert)
+    for hour in range(-1, 24):
+        start = DAY_START + hour * 3600
+        if 8 <= hour < 16: total += 1.5
+        rows.append(("sensor.yield", start, None, None, total, total))
+        if hour >= 0:
+            rows.append(("sensor.power", start, 2000.0 if 10 <= hour < 13 else 0.0, None, None, None))
+    rows.append(("sensor.other", DAY_START, 5.0, None, None, None))
+    return rows
+
+
+def test_read_recorder_statistics_filters_ids_and_window(tmp_path):
+    db = str(tmp_path / "home-assistant_v2.db")
+    _create_recorder(db, _recorder_rows())
+
+    result = read_recorder_statistics(db, ["sensor.yield", "sensor.power"], DAY_START, DAY_START + 12 * 3600)
+
+    assert set(result) == {"sensor.yield", "sensor.power"}
+    assert len(result["sensor.yield"]) == 12
+    assert len(result["sensor.power"]) == 12
+    assert [row["start"] for row in result["sensor.power"]] == sorted(row["start"] for row in result["sensor.power"])
+    assert result["sensor.power"][10]["mean"] == 2000.0
+    assert read_recorder_statistics(db, [], DAY_START, DAY_START + 3600) == {}
+
+
+def test_accumulator_over_windows_matches_day_totals(tmp_path):
+    db = str(tmp_path / "home-assistant_v2.db")
+    _create_recorder(db, _recorder_rows())
+    accumulator = BackfillAccumulator("sensor.yield", "sensor.power", None, _utc_day_hour)
+
+    # Kleine Fenster: die kumulierte Summe muss über Fenstergrenzen weitergeführt werden
+    for window_start, window_end in batch_windows(DAY_START - 3600, DAY_START + 86400, 5 * 3600):
+        accumulator.add(read_recorder_statistics(db, ["sensor.yield", "sensor.power"], window_start, window_end))
+
+    day = accumulator.days()["2025-06-01"]
+    assert day["actual"] == 12.0
+    assert day["consumption"] is None
+    # Stundenwerte aus dem Leistungssensor (Mittel in W / 1000)
+    assert day["hourly"][11] == 2.0
+    assert sum(day["hourly"].values()) == 6.0
+    assert accumulator.rows == 49
+
+
+def test_accumulator_uses_yield_deltas_without_power_sensor(tmp_path):
+    db = str(tmp_path / "home-assistant_v2.db")
+    _create_recorder(db, _recorder_rows())
+    accumulator = BackfillAccumulator("sensor.yield", None, None, _utc_day_hour)
+    accumulator.add(read_recorder_statistics(db, ["sensor.yield"], DAY_START - 3600, DAY_START + 86400))
+
+    day = accumulator.days()["2025-06-01"]
+    assert day["hourly"][8] == 1.5
+    assert sum(day["hourly"].values()) == 12.0
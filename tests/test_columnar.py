@@ -0,0 +1,92 @@
+"""Spalten-History: Konvertierung, Journal-Records, Speichern und Quell-Fingerabdruck."""
+from datetime import date
+
+import numpy as np
+import pytest
+
+from conftest import synthetic_days
+from solar_forecast_ml.columnar import (
+    ColumnarHistory, count_valid_days, save_source_fingerprint, source_fingerprint, source_matches,
+)
+from solar_forecast_ml.const import OP_ACTUAL, OP_FORECAST, OP_HOURLY, OP_SLOT
+
+
+def test_from_days_sorts_and_skips_invalid_entries():
+    days = synthetic_days(5)
+    shuffled = {day: days[day] for day in reversed(sorted(days))}
+    shuffled["kein-datum"] = {"actual": 1}
+    shuffled["2024-02-01"] = "kein Eintrag"
+    assert count_valid_days(shuffled) == 5
+    history = ColumnarHistory.from_days(shuffled)
+    assert len(history) == 5
+    assert np.all(np.diff(history.ordinals) > 0)
+    first = days[sorted(days)[0]]
+    assert history.rows["actual"][0] == pytest.approx(first["actual"])
+    assert history.rows["hourly"][0][12] == pytest.approx(first["hourly_data"]["12"])
+    assert np.isnan(history.rows["hourly"][0][0])
+
+
+def test_date_queries():
+    history = ColumnarHistory.from_days(synthetic_days(400))
+    assert len(history.last_days(30, date(2024, 12, 31))) == 30
+    assert len(history.between(date(2024, 3, 1), date(2024, 3, 31))) == 31
+    previous = history.same_window_previous_years(date(2025, 1, 10), date(2025, 1, 20))
+    assert len(previous) == 1 and len(previous[0]) == 11
+
+
+def test_apply_record_updates_and_inserts_rows():
+    history = ColumnarHistory.from_days(synthetic_days(3))
+    history.apply_record({"op": OP_ACTUAL, "day": "2024-01-02", "fields": {"actual": 12.5}})
+    history.apply_record({"op": OP_HOURLY, "day": "2024-01-02", "hour": 3, "kwh": 0.7})
+    history.apply_record({"op": OP_SLOT, "day": "2024-01-02", "minutes": 15, "slot": 3, "kwh": 9.9})
+    # Nachtrag für einen älteren Tag wird an der sortierten Position eingefügt
+    history.apply_record({"op": OP_FORECAST, "day": "2023-12-31", "fields": {"predicted": 4.0, "features": {"lux": 1000}}})
+
+    assert [date.fromordinal(int(o)).isoformat() for o in history.ordinals] == ["2023-12-31", "2024-01-01", "2024-01-02", "2024-01-03"]
+    row = history.rows[2]
+    assert row["actual"] == 12.5
+    assert row["hourly"][3] == 0.7
+    assert history.rows[0]["predicted"] == 4.0
+    assert history.rows[0]["features"][0] == 1000
+    assert np.isnan(history.rows[0]["actual"])
+
+
+def test_rows_grow_beyond_initial_capacity():
+    history = ColumnarHistory()
+    for day in range(100):
+        history.apply_record({"op": OP_ACTUAL, "day": date.fromordinal(738000 + day).isoformat(), "fields": {"actual": day}})
+    assert len(history) == 100
+    assert history.rows["actual"][-1] == 99
+
+
+def test_save_and_load_round_trip(tmp_path):
+    path = str(tmp_path / "prediction_history.npy")
+    history = ColumnarHistory.from_days(synthetic_days(30))
+    assert history.save(path)
+    loaded = ColumnarHistory.load(path)
+    assert loaded is not None
+    assert np.array_equal(loaded.ordinals, history.ordinals)
+    assert np.allclose(loaded.rows["actual"], history.rows["actual"])
+    # Andere Slot-Anzahl: Datei passt nicht zum Format
+    assert ColumnarHistory.load(path, slots=96) is None
+    assert ColumnarHistory.load(str(tmp_path / "fehlt.npy")) is None
+
+
+def test_source_fingerprint_detects_changed_sources(tmp_path):
+    snapshot, journal = tmp_path / "history.json", tmp_path / "history.journal"
+    fingerprint_path = str(tmp_path / "history.npy.json")
+    snapshot.write_text("{}")
+    journal.write_text('{"op": "actual"}\n')
+    save_source_fingerprint(fingerprint_path, source_fingerprint(str(snapshot), str(journal)))
+    assert source_matches(fingerprint_path, str(snapshot), str(journal))
+
+    # Angehängte Records sind erlaubt (werden über die .npy abgespielt)
+    with open(journal, "a") as f:
+        f.write('{"op": "hourly"}\n')
+    assert source_matches(fingerprint_path, str(snapshot), str(journal))
+
+    # Geänderter Anfang des Journals oder neuer Snapshot: .npy gilt nicht mehr
+    journal.write_text('{"op": "forecast"}\n{"op": "hourly"}\n')
+    assert not source_matches(fingerprint_path, str(snapshot), str(journal))
+    save_source_fingerprint(fingerprint_path, None)
+    assert not source_matches(fingerprint_path, str(snapshot), str(journal))
@@ -0,0 +1,205 @@
+"""Koordinator mit der hass-Fixture: geplante Jobs, Messung, Lernen und Speichern."""
+import json
+from datetime import date, datetime, timedelta
+from unittest.mock import AsyncMock
+
+import pytest
+
+pytest.importorskip("pytest_homeassistant_custom_component")
+
+from homeassistant.core import Event, State  # noqa: E402
+from homeassistant.util import dt as dt_util  # noqa: E402
+from pytest_homeassistant_custom_component.common import async_fire_time_changed, async_mock_service  # noqa: E402
+from solar_forecast_ml.history import build_forecast_record  # noqa: E402
+from solar_forecast_ml.learning import LearningResult  # noqa: E402
+
+
+async def test_scheduled_jobs_start_with_the_listeners_and_stop_on_unload(hass, make_coordinator):
+    coordinator = make_coordinator()
+    await coordinator.async_load_initial_data()
+    coordinator._morning_forecast = AsyncMock()
+    six_am = dt_util.start_of_local_day() + timedelta(days=1, hours=6)
+
+    # Nach dem Anlegen ist noch nichts geplant (schlägt das Setup fehl, bleibt nichts zurück)
+    async_fire_time_changed(hass, six_am)
+    await hass.async_block_till_done()
+    coordinator._morning_forecast.assert_not_called()
+
+    coordinator.async_start_listeners()
+    async_fire_time_changed(hass, six_am + timedelta(days=1))
+    await hass.async_block_till_done()
+    assert coordinator._morning_forecast.call_count == 1
+
+    await coordinator.async_unload()
+    async_fire_time_changed(hass, six_am + timedelta(days=2))
+    await hass.async_block_till_done()
+    assert coordinator._morning_forecast.call_count == 1
+
+
+async def test_fast_start_is_opt_in(hass, make_coordinator):
+    assert not make_coordinator().fast_start
+    assert make_coordinator(fast_start=True).fast_start
+
+
+async def _save_state(coordinator, accuracy):
+    coordinator.accuracy = accuracy
+    async with coordinator.data_lock:
+        async with coordinator._unit_of_work():
+            coordinator._mark_dirty(state=True)
+
+
+async def test_each_entry_keeps_its_own_state_snapshot(hass, make_coordinator):
+    first, second = make_coordinator(), make_coordinator()
+    assert first.state_snapshot_file != second.state_snapshot_file
+    await _save_state(first, 81.0)
+    await _save_state(second, 42.0)
+
+    restored = make_coordinator()
+    restored.state_snapshot_file = first.state_snapshot_file
+    await restored.async_load_state_snapshot()
+    assert restored.accuracy == 81.0
+    restored.state_snapshot_file = second.state_snapshot_file
+    await restored.async_load_state_snapshot()
+    assert restored.accuracy == 42.0
+
+
+async def test_legacy_state_files_go_to_the_first_entry_only(hass, make_coordinator, data_dir):
+    from solar_forecast_ml import coordinator as coordinator_module
+    legacy = coordinator_module.LEGACY_STATE_SNAPSHOT_FILE
+    with open(legacy, "w") as f: json.dump({"accuracy": 77.0}, f)
+    first, second = make_coordinator(), make_coordinator()
+
+    await first.async_migrate_entry_files()
+    await second.async_migrate_entry_files()
+    await first.async_load_state_snapshot()
+    await second.async_load_state_snapshot()
+
+    assert first.accuracy == 77.0
+    assert second.accuracy != 77.0
+    assert not (data_dir / "coordinator_state.json").exists()
+
+
+def _power_event(entity_id, watts, moment):
+    return Event("state_changed", {"entity_id": entity_id, "new_state": State(entity_id, watts, last_updated=moment)})
+
+
+async def test_power_changes_fill_local_hours(hass, make_coordinator, freezer):
+    # UTC+5:30: die lokale Stunde 10 beginnt um 04:30 UTC
+    hass.config.set_time_zone("Asia/Kolkata")
+    freezer.move_to(datetime(2025, 6, 2, 12, 30, tzinfo=dt_util.get_time_zone("Asia/Kolkata")))
+    coordinator = make_coordinator()
+    await coordinator.async_load_initial_data()
+    today = dt_util.now().date()
+    async with coordinator.data_lock:
+        async with coordinator._unit_of_work():
+            coordinator._mark_dirty(build_forecast_record(today.isoformat(), 20.0, 20.0, {}))
+
+    ten = dt_util.start_of_local_day(today) + timedelta(hours=10)
+    for moment, watts in ((ten, "1000"), (ten + timedelta(hours=1), "2000")):
+        coordinator._async_power_changed(_power_event(coordinator.current_power_sensor, watts, moment))
+    await hass.async_block_till_done()
+
+    # 1000 -> 2000 W über die Stunde 10:00-11:00 (Trapez) = 1,5 kWh
+    assert coordinator.today_slot_kwh[10] == pytest.approx(1.5)
+    assert coordinator.daily_predictions[today.isoformat()]["hourly_data"] == {"10": pytest.approx(1.5)}
+
+
+async def _learn(coordinator, weights, promote_weights):
+    async with coordinator.data_lock:
+        snapshot = coordinator._learning_snapshot(1.0)
+        result = LearningResult()
+        result.weights = weights
+        result.profile_estimator = coordinator.profile_estimator
+        result.promote_weights = promote_weights
+        result.shadow_errors = {"weights": [[1, 0.5, 0.8]]}
+        async with coordinator._unit_of_work():
+            return coordinator._apply_learning_result(snapshot, result)
+
+
+async def test_shadow_candidate_is_promoted_only_when_not_worse(hass, make_coordinator):
+    coordinator = make_coordinator()
+    await coordinator.async_load_initial_data()
+    active = dict(coordinator.model.weights)
+    learned = {**active, "base": active["base"] + 0.1}
+
+    assert await _learn(coordinator, learned, promote_weights=False) == []
+    assert dict(coordinator.model.weights) == active
+    assert dict(coordinator.candidate_model.weights) == learned
+
+    assert await _learn(coordinator, learned, promote_weights=True) == ["weights"]
+    assert dict(coordinator.model.weights) == learned
+    assert coordinator.candidate_model is None
+    # Der übernommene Teil ist jetzt aktiv: seine Fehler sind die des Kandidaten
+    assert coordinator.shadow_errors["weights"] == [[1, 0.5, 0.5]]
+
+
+async def test_learning_notification_reports_what_was_promoted(hass, make_coordinator):
+    calls = async_mock_service(hass, "persistent_notification", "create")
+    coordinator = make_coordinator()
+    await coordinator._notify_successful_learning("2025-06-01", 0.5, [])
+    await coordinator._notify_successful_learning("2025-06-01", 0.5, ["weights"])
+    await hass.async_block_till_done()
+    assert "bleibt unverändert" in calls[0].data["message"]
+    assert "Gewichte wurden angepasst" in calls[1].data["message"]
+
+
+
+async def test_failed_flush_keeps_changes_for_the_next_transaction(hass, make_coordinator, monkeypatch):
+    from solar_forecast_ml import coordinator as coordinator_module
+    from solar_forecast_ml.persistence import commit_transaction
+    commits = []
+
+    def _commit(manifest, files, journal, records):
+        commits.append((sorted(files), list(records)))
+        # Der erste Versuch schlägt fehl, der zweite schreibt wirklich
+        return None if len(commits) == 1 else commit_transaction(manifest, files, journal, records)
+
+    monkeypatch.setattr(coordinator_module, "commit_transaction", _commit)
+    coordinator = make_coordinator()
+    await coordinator.async_load_initial_data()
+    record = build_forecast_record("2025-06-01", 20.0, 21.0, {})
+
+    async with coordinator.data_lock:
+        async with coordinator._unit_of_work():
+            coordinator._mark_dirty(record)
+            coordinator._mark_dirty(weights=True)
+    assert coordinator._pending_history_records == [record]
+    assert coordinator._weights_dirty
+
+    async with coordinator.data_lock:
+        async with coordinator._unit_of_work():
+            pass
+    # Derselbe Inhalt in einer Transaktion, danach ist nichts mehr vorgemerkt
+    assert commits[1] == commits[0] and commits[1][1] == [record]
+    assert coordinator_module.WEIGHTS_FILE in commits[1][0]
+    assert coordinator._pending_history_records == [] and not coordinator._weights_dirty
+    days, _ = await hass.async_add_executor_job(coordinator.history_journal.load)
+    assert days["2025-06-01"]["predicted"] == 20.0
+
+
+async def test_backfill_writes_recorder_days_once(hass, make_coordinator, freezer, tmp_path):
+    from test_backfill import _create_recorder
+    freezer.move_to(datetime(2025, 6, 2, 12, tzinfo=dt_util.get_time_zone("US/Pacific")))
+    coordinator = make_coordinator()
+    await coordinator.async_load_initial_data()
+    day_start = dt_util.start_of_local_day(date(2025, 6, 1)).timestamp()
+    rows, total = [], 100.0
+    for hour in range(-1, 24):
+        if 8 <= hour < 16: total += 1.5
+        rows.append((coordinator.power_entity, day_start + hour * 3600, None, None, total, total))
+        if hour >= 0:
+            rows.append((coordinator.current_power_sensor, day_start + hour * 3600, 2000.0 if 10 <= hour < 13 else 0.0, None, None, None))
+    database = str(tmp_path / "home-assistant_v2.db")
+    _create_recorder(database, rows)
+
+    result = await coordinator.async_backfill_history(days=1, database=database)
+    assert (result["days_found"], result["days_written"], result["days_skipped"]) == (1, 1, 0)
+    day = coordinator.daily_predictions["2025-06-01"]
+    assert day["actual"] == 12.0
+    assert day["hourly_data"]["11"] == 2.0
+    days, _ = await hass.async_add_executor_job(coordinator.history_journal.load)
+    assert days["2025-06-01"]["actual"] == 12.0
+
+    # Vorhandene Ist-Werte bleiben ohne overwrite unverändert
+    again = await coordinator.async_backfill_history(days=1, database=database)
+    assert (again["days_written"], again["days_skipped"]) == (0, 1)
@@ -0,0 +1,121 @@
+"""Trapez-Integration der aktuellen Leistung zu Slot-Energie."""
+import pytest
+
+from solar_forecast_ml.energy import EnergyIntegrator
+
+BASE = 1_700_000_000 // 3600 * 3600
+
+
+def test_constant_power_fills_hours():
+    integrator = EnergyIntegrator()
+    completed = []
+    for second in range(0, 2 * 3600 + 1, 60):
+        completed += integrator.add_sample(BASE + second, 1000)
+    assert [slot for slot, _ in completed] == [BASE // 3600, BASE // 3600 + 1]
+    assert [kwh for _, kwh in completed] == [pytest.approx(1.0), pytest.approx(1.0)]
+
+
+def test_ramp_is_split_at_the_slot_boundary():
+    integrator = EnergyIntegrator()
+    integrator.add_sample(BASE + 1800, 0)
+    completed = integrator.add_sample(BASE + 5400, 2000)
+    # 0 -> 1000 W in der ersten halben Stunde, 1000 -> 2000 W in der zweiten
+    assert completed == [(BASE // 3600, pytest.approx(0.25))]
+    assert integrator.current_kwh() == pytest.approx(0.75)
+
+
+def test_sub_hourly_slots():
+    integrator = EnergyIntegrator(slot_seconds=900)
+    integrator.add_sample(BASE, 400)
+    completed = integrator.close_until(BASE + 1800)
+    assert completed == [(BASE // 900, pytest.approx(0.1)), (BASE // 900 + 1, pytest.approx(0.1))]
+
+
+def test_plateau_is_held_until_the_next_change():
+    # HA meldet unveränderte Werte nicht: 0 W bis 10:00, danach 5000 W ohne weiteres Ereignis
+    integrator = EnergyIntegrator()
+    integrator.add_sample(BASE + 6 * 3600, 0)
+    completed = []
+    for hour in range(7, 11):
+        completed += integrator.close_until(BASE + hour * 3600)
+    completed += integrator.add_sample(BASE + 10 * 3600, 5000)
+    for hour in range(11, 16):
+        completed += integrator.close_until(BASE + hour * 3600)
+    completed += integrator.close_until(BASE + 15 * 3600 + 600)
+    first = BASE // 3600
+    assert dict(completed) == {
+        **{first + hour: pytest.approx(0.0) for hour in range(6, 10)},
+        **{first + hour: pytest.approx(5.0) for hour in range(10, 15)},
+    }
+    assert integrator.current_kwh() == pytest.approx(5000 * 600 / 3600 / 1000)
+
+
+def test_sample_after_a_tick_continues_from_the_tick():
+    integrator = EnergyIntegrator()
+    integrator.add_sample(BASE, 1000)
+    integrator.close_until(BASE + 3600)
+    assert integrator.add_sample(BASE + 5400, 1000) == []
+    assert integrator.current_kwh() == pytest.approx(0.5)
+
+
+def test_slot_boundaries_follow_local_hours():
+    # UTC+5:30: die lokale Stunde 10:00 beginnt um 04:30 UTC
+    day = BASE // 86400 * 86400
+    integrator = EnergyIntegrator(utc_offset_seconds=5.5 * 3600)
+    local_ten = day + 4 * 3600 + 1800
+    integrator.add_sample(local_ten, 1000)
+    completed = integrator.close_until(local_ten + 3600)
+    assert completed == [(integrator.slot_of(local_ten), pytest.approx(1.0))]
+    assert integrator.slot_of(local_ten - 1) == integrator.slot_of(local_ten) - 1
+    assert integrator.slot_start(integrator.slot_of(local_ten)) == local_ten
+
+
+def test_daylight_saving_keeps_the_slot_grid():
+    # Sommer- und Winterzeit unterscheiden sich um eine Stunde: gleiches Raster, monotone Zählung
+    assert EnergyIntegrator(utc_offset_seconds=3600).offset == EnergyIntegrator(utc_offset_seconds=7200).offset
+    assert EnergyIntegrator(slot_seconds=900, utc_offset_seconds=5.75 * 3600).offset == 0
+
+
+def test_unavailable_sensor_leaves_a_gap():
+    integrator = EnergyIntegrator()
+    integrator.add_sample(BASE, 500)
+    assert integrator.mark_unavailable(BASE + 1800) == []
+    # Slots ohne Messwerte werden nicht als 0 kWh gemeldet
+    assert integrator.add_sample(BASE + 5 * 3600, 100) == [(BASE // 3600, pytest.approx(0.25))]
+    assert integrator.close_until(BASE + 6 * 3600) == [(BASE // 3600 + 5, pytest.approx(0.1))]
+
+
+def test_out_of_order_sample_is_ignored():
+    integrator = EnergyIntegrator()
+    integrator.add_sample(BASE + 600, 1000)
+    assert integrator.add_sample(BASE + 300, 5000) == []
+    integrator.add_sample(BASE + 1200, 1000)
+    assert integrator.current_kwh() == pytest.approx(1000 * 600 / 3600 / 1000)
+
+
+def test_snapshot_restores_running_slot():
+    integrator = EnergyIntegrator()
+    integrator.add_sample(BASE, 1000)
+    integrator.add_sample(BASE + 1800, 1000)
+    snapshot = integrator.to_snapshot()
+
+    restored = EnergyIntegrator()
+    restored.restore(snapshot, BASE + 1900)
+    assert restored.to_snapshot() == snapshot
+    assert restored.close_until(BASE + 3600) == [(BASE // 3600, pytest.approx(1.0))]
+
+
+def test_stale_or_foreign_snapshot_is_ignored():
+    integrator = EnergyIntegrator()
+    integrator.add_sample(BASE, 1000)
+    snapshot = integrator.to_snapshot()
+
+    stale = EnergyIntegrator(max_gap_seconds=600)
+    stale.restore(snapshot, BASE + 3600)
+    assert stale.current_slot is None
+    other_resolution = EnergyIntegrator(slot_seconds=900)
+    other_resolution.restore(snapshot, BASE + 60)
+    assert other_resolution.current_slot is None
+    other_zone = EnergyIntegrator(utc_offset_seconds=5.5 * 3600)
+    other_zone.restore(snapshot, BASE + 60)
+    assert other_zone.current_slot is None
@@ -0,0 +1,50 @@
+"""History-Journal: Anhängen, Laden über den Snapshot und Kompaktieren."""
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from solar_forecast_ml.history import (  # noqa: E402
+    HistoryJournal, build_actual_record, build_forecast_record, build_hourly_record, build_slot_record,
+)
+
+
+@pytest.fixture
+def journal(tmp_path):
+    return HistoryJournal(str(tmp_path / "prediction_history.json"), str(tmp_path / "prediction_history.journal"))
+
+
+def test_load_replays_the_journal_over_the_snapshot(journal):
+    assert journal.compact({"2025-06-01": {"predicted": 10.0, "actual": 9.0}})
+    records = [
+        build_forecast_record("2025-06-02", 12.0, 8.0, {"temp": 20.0}, 0.7),
+        build_hourly_record("2025-06-02", 12, 1.5),
+        build_slot_record("2025-06-02", 15, 49, 0.4),
+        build_actual_record("2025-06-01", 11.0, 20.0),
+    ]
+    assert journal.append(records) == journal.size()
+
+    days, applied = journal.load()
+    assert applied == records
+    assert days["2025-06-01"] == {"predicted": 10.0, "actual": 11.0, "consumption": 20.0}
+    assert days["2025-06-02"]["weather_factor"] == 0.7
+    assert days["2025-06-02"]["hourly_data"] == {"12": 1.5}
+    assert days["2025-06-02"]["slot_data"]["kwh"][49] == 0.4
+
+
+def test_torn_last_line_is_skipped_and_closed_on_the_next_append(journal):
+    journal.append([build_hourly_record("2025-06-01", 10, 1.0)])
+    with open(journal.journal_path, "a", encoding="utf-8") as f:
+        f.write('{"op":"hourly","day":"2025-06-01","ho')
+    journal.append([build_hourly_record("2025-06-01", 11, 2.0)])
+
+    days, applied = journal.load()
+    assert len(applied) == 2
+    assert days["2025-06-01"]["hourly_data"] == {"10": 1.0, "11": 2.0}
+
+
+def test_compact_empties_the_journal(journal):
+    journal.append([build_actual_record("2025-06-01", 5.0)])
+    days, _ = journal.load()
+    assert journal.compact(days)
+    assert journal.size() == 0
+    assert journal.load() == ({"2025-06-01": {"actual": 5.0}}, [])
@@ -0,0 +1,103 @@
+"""Lernlauf auf dem History-Schnappschuss und Schattenbewertung (predict-then-learn)."""
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from conftest import BASE_CAPACITY, TRUE_WEIGHTS
+from solar_forecast_ml.const import DEFAULT_WEIGHTS, LEARNING_MODE_BATCH
+from solar_forecast_ml.hourly_profile import StreamingHourlyProfile
+from solar_forecast_ml.learning import LearningSnapshot, run_learning
+
+FLAT = np.full(24, 1 / 24)
+
+
+def _snapshot(rows, weights, mode="base", error=0.0, profile_state=None):
+    return LearningSnapshot(
+        rows, 24, date.fromordinal(int(rows["ordinal"][-1])), error, weights, BASE_CAPACITY, mode, None,
+        profile_state, 60, active_profile=FLAT,
+    )
+
+
+def test_run_learning_leaves_the_snapshot_untouched(history_rows):
+    weights = dict(DEFAULT_WEIGHTS)
+    actual = history_rows["actual"].copy()
+    snapshot = _snapshot(history_rows, weights, LEARNING_MODE_BATCH)
+    assert not snapshot.rows.flags.writeable
+
+    result = run_learning(snapshot, 1e-6, 14, 0.99, 1.0, 30, 14, 7)
+
+    assert weights == DEFAULT_WEIGHTS
+    assert np.array_equal(snapshot.rows["actual"], actual)
+    assert result.weights_report["mode"] == LEARNING_MODE_BATCH
+    for key in ("base", "temp", "uv"):
+        assert result.weights[key] == pytest.approx(TRUE_WEIGHTS[key], rel=1e-3)
+
+
+def test_base_mode_moves_only_the_base_weight(history_rows):
+    result = run_learning(_snapshot(history_rows, dict(DEFAULT_WEIGHTS), error=5.0), 1e-6, 14, 0.99, 1.0, 30, 14, 7)
+    assert result.weights["base"] == pytest.approx(DEFAULT_WEIGHTS["base"] + 0.01 * 5.0 / BASE_CAPACITY)
+    assert {k: v for k, v in result.weights.items() if k != "base"} == {k: v for k, v in DEFAULT_WEIGHTS.items() if k != "base"}
+
+
+def test_profile_estimator_is_seeded_from_the_history(history_rows):
+    result = run_learning(_snapshot(history_rows, dict(DEFAULT_WEIGHTS)), 1e-6, 14, 0.99, 1.0, 30, 14, 7)
+    assert result.profile_estimator.day_count == 60
+    assert result.hourly_profile.sum() == pytest.approx(1.0)
+    assert result.hourly_profile[:6].sum() == 0
+    assert int(np.argmax(result.hourly_profile)) in (12, 13)
+
+
+def _nights(rows, candidate, active, nights, mode="base"):
+    """Lernläufe für die letzten `nights` Tage; der Kandidat bleibt fest, das Fehlerprotokoll wird fortgeschrieben."""
+    last = date.fromordinal(int(rows["ordinal"][-1]))
+    estimator = StreamingHourlyProfile(60, 24)
+    errors, result = {}, None
+    for back in range(nights - 1, -1, -1):
+        snapshot = LearningSnapshot(
+            rows, 24, last - timedelta(days=back), 0.0, dict(candidate), BASE_CAPACITY, mode, None,
+            estimator.to_snapshot(), 60, active_weights=dict(active), active_profile=FLAT, shadow_errors=errors,
+        )
+        result = run_learning(snapshot, 1e-6, 14, 0.99, 1.0, 30, 14, 7)
+        errors = result.shadow_errors
+    return result
+
+
+def test_better_candidate_is_promoted(history_rows):
+    result = _nights(history_rows, TRUE_WEIGHTS, DEFAULT_WEIGHTS, 10)
+    scores = result.scores["weights"]
+    assert scores["days"] == 10
+    assert scores["mae_candidate"] < scores["mae_active"]
+    assert result.promote_weights
+
+
+def test_worse_candidate_is_kept_in_the_shadow(history_rows):
+    result = _nights(history_rows, DEFAULT_WEIGHTS, TRUE_WEIGHTS, 10)
+    assert not result.promote_weights
+
+
+def test_candidate_is_accepted_until_enough_days_are_scored(history_rows):
+    assert _nights(history_rows, DEFAULT_WEIGHTS, TRUE_WEIGHTS, 3).promote_weights
+
+
+def test_error_log_is_limited_to_the_evaluation_window(history_rows):
+    result = _nights(history_rows, DEFAULT_WEIGHTS, TRUE_WEIGHTS, 40)
+    assert len(result.shadow_errors["weights"]) == 30
+    assert len(result.shadow_errors["profile"]) == 14
+
+
+def test_today_is_scored_before_the_batch_fit_learns_it(history_rows):
+    rows = history_rows.copy()
+    rows["actual"][-1] *= 3  # Ausreißer am heutigen Tag
+    snapshot = LearningSnapshot(
+        rows, 24, date.fromordinal(int(rows["ordinal"][-1])), 0.0, dict(TRUE_WEIGHTS), BASE_CAPACITY,
+        LEARNING_MODE_BATCH, None, StreamingHourlyProfile(60, 24).to_snapshot(), 60,
+        active_weights=dict(TRUE_WEIGHTS), active_profile=FLAT,
+    )
+    result = run_learning(snapshot, 1e-6, 14, 0.99, 1.0, 30, 14, 7)
+    (ordinal, candidate_error, active_error), = result.shadow_errors["weights"]
+    # Bewertet wird der Stand vor dem Lernschritt, der den Ausreißer noch nicht kennt
+    assert ordinal == rows["ordinal"][-1]
+    assert candidate_error == active_error
+    assert candidate_error > 0.5 * rows["actual"][-1]
+    assert result.weights != TRUE_WEIGHTS
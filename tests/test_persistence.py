@@ -0,0 +1,86 @@
+"""Speicher-Transaktionen über mehrere Dateien und das History-Journal."""
+import json
+import os
+
+import pytest
+
+pytest.importorskip("homeassistant")
+
+from solar_forecast_ml.history import HistoryJournal  # noqa: E402
+from solar_forecast_ml.persistence import (  # noqa: E402
+    FAILED_SUFFIX, TransactionError, commit_transaction, recover_transaction, staging_path,
+)
+
+RECORDS = [{"op": "actual", "day": "2025-06-01", "fields": {"actual": 12.0}}]
+
+
+@pytest.fixture
+def store(tmp_path):
+    journal = HistoryJournal(str(tmp_path / "prediction_history.json"), str(tmp_path / "prediction_history.journal"))
+    files = {str(tmp_path / "learned_weights.json"): {"base": 1.1}, str(tmp_path / "hourly_profile.json"): {"profile": [1.0]}}
+    return tmp_path, journal, files, str(tmp_path / "pending_transaction_entry.json")
+
+
+def _read(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_commit_writes_all_files_and_records(store):
+    tmp_path, journal, files, manifest = store
+    size = commit_transaction(manifest, files, journal, RECORDS)
+    assert size == os.path.getsize(journal.journal_path)
+    assert journal.read_records() == RECORDS
+    for path, data in files.items():
+        assert _read(path) == data
+    assert not os.path.exists(manifest)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".txn")]
+
+
+def test_single_target_needs_no_manifest(store):
+    _, journal, _, manifest = store
+    assert commit_transaction(manifest, {}, journal, RECORDS) is not None
+    assert not os.path.exists(manifest)
+
+
+def test_failed_journal_keeps_the_manifest_for_roll_forward(store):
+    tmp_path, journal, files, manifest = store
+    os.mkdir(journal.journal_path)  # Anhängen schlägt fehl
+    assert commit_transaction(manifest, files, journal, RECORDS) is None
+    assert os.path.exists(manifest)
+
+    os.rmdir(journal.journal_path)
+    assert recover_transaction(manifest, journal)
+    assert journal.read_records() == RECORDS
+    for path, data in files.items():
+        assert _read(path) == data
+    assert not os.path.exists(manifest)
+
+
+def test_recovery_only_discards_its_own_staged_files(store):
+    tmp_path, journal, files, manifest = store
+    other_manifest = str(tmp_path / "pending_transaction_other.json")
+    path = next(iter(files))
+    for owner in (manifest, other_manifest):
+        with open(staging_path(path, owner), "w") as f:
+            f.write("{}")
+    assert not recover_transaction(manifest, journal)
+    assert not os.path.exists(staging_path(path, manifest))
+    assert os.path.exists(staging_path(path, other_manifest))
+
+
+def test_missing_staged_file_fails_loudly(store):
+    tmp_path, journal, files, manifest = store
+    # Festgeschriebene Transaktion, deren zweite vorbereitete Datei fehlt, obwohl die erste
+    # noch nicht umbenannt wurde
+    first, second = files
+    with open(staging_path(first, manifest), "w") as f:
+        json.dump(files[first], f)
+    with open(manifest, "w") as f:
+        json.dump({"files": [first, second], "records": RECORDS}, f)
+
+    with pytest.raises(TransactionError):
+        recover_transaction(manifest, journal)
+    assert os.path.exists(manifest + FAILED_SUFFIX)
+    assert not os.path.exists(first)
+    assert journal.read_records() == []
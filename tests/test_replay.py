@@ -0,0 +1,78 @@
+"""Backtest der History mit beliebigen Parametersätzen."""
+import json
+
+import numpy as np
+import pytest
+
+from conftest import BASE_CAPACITY, TRUE_WEIGHTS, synthetic_days
+from solar_forecast_ml.columnar import ColumnarHistory
+from solar_forecast_ml.const import DEFAULT_WEIGHTS, OP_ACTUAL
+from solar_forecast_ml.replay import ReplayData, evaluate, load_history, main, profile_report, replay, report
+
+
+def test_generating_weights_replay_without_error(history_rows):
+    result = replay(history_rows, TRUE_WEIGHTS, BASE_CAPACITY)
+    assert result["days"] == len(history_rows)
+    assert result["mape"] == pytest.approx(0.0, abs=1e-3)
+    assert result["bias_kwh"] == pytest.approx(0.0, abs=1e-3)
+    assert sum(month["days"] for month in result["months"].values()) == len(history_rows)
+
+
+def test_evaluate_matches_single_replays(history_rows):
+    data = ReplayData(history_rows)
+    sets = [dict(TRUE_WEIGHTS), dict(DEFAULT_WEIGHTS), dict(TRUE_WEIGHTS, base=1.0, base_capacity=8.0)]
+    metrics = evaluate(data, sets, BASE_CAPACITY)
+    assert metrics["mape"].shape == (3,)
+    for index, weights in enumerate(sets):
+        single = replay(history_rows, weights, BASE_CAPACITY)
+        assert report(data, metrics, index)["mape"] == single["mape"]
+        assert report(data, metrics, index)["rmse_kwh"] == single["rmse_kwh"]
+    assert metrics["mape"][0] < metrics["mape"][1]
+
+
+def test_days_without_weather_factor_are_counted_and_skipped():
+    days = synthetic_days(10)
+    for day in sorted(days)[:3]:
+        del days[day]["weather_factor"]
+    first = sorted(days)[3]
+    days[first]["actual"] = None
+    data = ReplayData(np.array(ColumnarHistory.from_days(days).rows))
+    assert len(data) == 6
+    assert data.skipped_days == {"no_actual": 1, "no_weather_factor": 3}
+
+
+def test_days_limits_to_the_most_recent(history_rows):
+    assert replay(history_rows, TRUE_WEIGHTS, BASE_CAPACITY, days=30)["days"] == 30
+
+
+def test_profile_report(history_rows):
+    data = ReplayData(history_rows)
+    exact = np.nan_to_num(history_rows["hourly"][0] / history_rows["actual"][0])
+    assert profile_report(data, exact)["error"] == pytest.approx(0.0, abs=1e-4)
+    assert profile_report(data, np.full(24, 1 / 24))["error"] > 0.3
+    assert profile_report(data, np.full(48, 1 / 48)) is None
+    assert profile_report(data, None) is None
+
+
+def test_offline_history_replays_the_journal(tmp_path):
+    days = synthetic_days(20)
+    history_path = tmp_path / "prediction_history.json"
+    history_path.write_text(json.dumps(days))
+    last = sorted(days)[-1]
+    (tmp_path / "prediction_history.journal").write_text(
+        json.dumps({"op": OP_ACTUAL, "day": last, "fields": {"actual": 99.0}}) + "\nkein json\n"
+    )
+    rows = load_history(str(history_path))
+    assert len(rows) == 20
+    assert rows["actual"][-1] == 99.0
+
+
+def test_command_line_ranks_parameter_sets(tmp_path, capsys):
+    history_path = tmp_path / "prediction_history.json"
+    history_path.write_text(json.dumps(synthetic_days(40)))
+    params_path = tmp_path / "sets.json"
+    params_path.write_text(json.dumps([DEFAULT_WEIGHTS, dict(TRUE_WEIGHTS, base_capacity=BASE_CAPACITY)]))
+    assert main([str(history_path), "--params", str(params_path), "--top", "1"]) == 0
+    output = json.loads(capsys.readouterr().out)
+    assert output["evaluated"] == 2
+    assert [best["index"] for best in output["best"]] == [1]
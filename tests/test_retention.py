@@ -0,0 +1,62 @@
+"""Monatsarchiv und Vorjahresvergleich über heiße History und Archiv."""
+from datetime import date, timedelta
+
+import numpy as np
+import pytest
+
+from solar_forecast_ml.columnar import ColumnarHistory
+from solar_forecast_ml.learning import previous_years_yield
+from solar_forecast_ml.retention import (
+    archive_cutoff, archived_window_yield, merge_into_archive, seasonal_average_yield, select_days_to_archive,
+)
+
+TODAY = date(2026, 3, 10)
+
+
+def _days(first: date, last: date):
+    """Ertrag konstant je Monat (z. B. 2.24 im Februar 2024), damit anteilige Monate exakt aufgehen."""
+    days, day = {}, first
+    while day <= last:
+        days[day.isoformat()] = {"predicted": 1.0, "actual": day.month + day.year % 100 / 100, "hourly_data": {"12": 1.0}}
+        day += timedelta(days=1)
+    return days
+
+
+def _split(days, hot_days):
+    cutoff = archive_cutoff(TODAY, hot_days)
+    cold = select_days_to_archive(days, cutoff)
+    archive = {}
+    assert merge_into_archive(archive, days, cold) == len(cold)
+    hot = {day: entry for day, entry in days.items() if day not in set(cold)}
+    return np.array(ColumnarHistory.from_days(hot).rows), archive
+
+
+def test_archive_keeps_monthly_sums_and_is_idempotent():
+    days = _days(date(2024, 1, 1), date(2024, 2, 29))
+    archive = {}
+    merge_into_archive(archive, days, list(days))
+    assert merge_into_archive(archive, days, list(days)) == 0
+    assert archive["2024-02"]["actual_days"] == 29
+    assert archive["2024-02"]["actual_sum"] == pytest.approx(29 * 2.24)
+    assert seasonal_average_yield(archive, 2) == pytest.approx(2.24)
+
+
+def test_archived_window_counts_partial_months_by_share():
+    days = _days(date(2024, 1, 1), date(2024, 3, 31))
+    archive = {}
+    merge_into_archive(archive, days, list(days))
+    total, count = archived_window_yield(archive, date(2024, 1, 22), date(2024, 2, 10))
+    assert count == pytest.approx(20)
+    assert total == pytest.approx(10 * 1.24 + 10 * 2.24)
+
+
+def test_previous_years_include_archived_years():
+    days = _days(date(2023, 1, 1), TODAY)
+    all_rows = np.array(ColumnarHistory.from_days(days).rows)
+    expected = previous_years_yield(all_rows, 24, TODAY)
+
+    hot_rows, archive = _split(days, 365)
+    assert date.fromordinal(int(hot_rows["ordinal"][0])) == date(2025, 3, 1)
+    # Ohne Archiv fehlen 2024 und der Anfang des Vorjahresfensters
+    assert previous_years_yield(hot_rows, 24, TODAY) != pytest.approx(expected)
+    assert previous_years_yield(hot_rows, 24, TODAY, archive) == pytest.approx(expected)
@@ -0,0 +1,55 @@
+"""Rekursive Kleinste Quadrate für den Lernmodus rls."""
+import numpy as np
+import pytest
+
+from conftest import BASE_CAPACITY, TRUE_WEIGHTS
+from solar_forecast_ml.const import DEFAULT_WEIGHTS
+from solar_forecast_ml.rls import RecursiveLeastSquares
+from solar_forecast_ml.trainer import LINEAR_KEYS, design_matrix, predict
+
+
+def _learn(rows, forgetting=1.0):
+    x, fs = design_matrix(rows, BASE_CAPACITY)
+    learner = RecursiveLeastSquares.create(x, forgetting, 1.0)
+    weights = dict(DEFAULT_WEIGHTS)
+    for row, actual, fs_value in zip(x, rows["actual"], fs):
+        weights = learner.update(weights, row, float(actual), float(fs_value))
+    return learner, weights
+
+
+def test_converges_towards_the_generating_weights(history_rows):
+    learner, weights = _learn(history_rows)
+    assert learner.updates == len(history_rows)
+    x, fs = design_matrix(history_rows[-30:], BASE_CAPACITY)
+    error = np.abs(predict(x, fs, weights) - history_rows["actual"][-30:]).mean()
+    default_error = np.abs(predict(x, fs, DEFAULT_WEIGHTS) - history_rows["actual"][-30:]).mean()
+    assert error < 0.1 * default_error
+    assert weights["base"] == pytest.approx(TRUE_WEIGHTS["base"], rel=0.05)
+
+
+def test_keys_outside_the_model_are_kept(history_rows):
+    x, fs = design_matrix(history_rows[:1], BASE_CAPACITY)
+    learner = RecursiveLeastSquares.create(x, 0.99, 1.0)
+    weights = learner.update({**DEFAULT_WEIGHTS, "custom": 7}, x[0], float(history_rows["actual"][0]), float(fs[0]))
+    assert weights["custom"] == 7
+
+
+def test_covariance_stays_bounded(history_rows):
+    learner, _ = _learn(history_rows, forgetting=0.9)
+    assert np.all(np.diag(learner.covariance) <= learner.initial_variance + 1e-12)
+    assert np.allclose(learner.covariance, learner.covariance.T)
+
+
+def test_snapshot_round_trip(history_rows):
+    learner, _ = _learn(history_rows[:20])
+    restored = RecursiveLeastSquares.from_snapshot(learner.to_snapshot(), 1.0, 1.0)
+    assert restored is not None
+    assert restored.updates == 20
+    assert restored.covariance == pytest.approx(learner.covariance)
+
+
+def test_mismatching_snapshot_is_rejected(history_rows):
+    snapshot = _learn(history_rows[:5])[0].to_snapshot()
+    assert RecursiveLeastSquares.from_snapshot(dict(snapshot, keys=list(LINEAR_KEYS[:-1])), 1.0, 1.0) is None
+    assert RecursiveLeastSquares.from_snapshot(dict(snapshot, scale=[0.0] * len(LINEAR_KEYS)), 1.0, 1.0) is None
+    assert RecursiveLeastSquares.from_snapshot(None, 1.0, 1.0) is None
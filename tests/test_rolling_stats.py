@@ -0,0 +1,71 @@
+"""Rolling-Fenster für Genauigkeit und Durchschnittsertrag."""
+import math
+
+import numpy as np
+import pytest
+
+from solar_forecast_ml.rolling_stats import RollingStatistics, RollingWindow
+
+
+def _brute_force(entries):
+    rated = [(p, a) for _, p, a in entries if p is not None and a > 0]
+    errors = [a - p for p, a in rated]
+    yields = [a for _, _, a in entries if a > 0]
+    return {
+        "mape": sum(abs(e / a) * 100 for e, (_, a) in zip(errors, rated)) / len(rated) if rated else None,
+        "bias": sum(errors) / len(errors) if errors else None,
+        "rmse": math.sqrt(sum(e * e for e in errors) / len(errors)) if errors else None,
+        "mean_yield": sum(yields) / len(yields) if yields else None,
+        "days": len(rated),
+    }
+
+
+def test_window_matches_brute_force_over_many_days():
+    rng = np.random.default_rng(1)
+    window = RollingWindow(7)
+    entries = []
+    for ordinal in range(738000, 738060):
+        predicted = None if ordinal % 9 == 0 else float(rng.uniform(5, 20))
+        actual = float(rng.uniform(5, 20))
+        window.add(ordinal, predicted, actual)
+        entries = [e for e in entries if e[0] > ordinal - 7] + [(ordinal, predicted, actual)]
+        metrics, expected = window.metrics(), _brute_force(entries)
+        assert metrics["days"] == expected["days"]
+        for key in ("mape", "bias", "rmse", "mean_yield"):
+            assert metrics[key] == (pytest.approx(expected[key], abs=0.01) if expected[key] is not None else None)
+
+
+def test_new_value_for_the_newest_day_replaces_it():
+    window = RollingWindow(7)
+    window.add(738000, 10.0, 12.0)
+    window.add(738000, 10.0, 11.0)
+    assert window.metrics()["days"] == 1
+    assert window.metrics()["bias"] == 1.0
+    # Nachträge für ältere Tage werden ignoriert
+    window.add(737999, 1.0, 50.0)
+    assert window.metrics()["mean_yield"] == 11.0
+
+
+def test_expire_empties_the_window():
+    window = RollingWindow(7)
+    window.add(738000, 10.0, 12.0)
+    window.expire(738007)
+    assert window.metrics() == {"mape": None, "bias": None, "rmse": None, "mean_yield": None, "days": 0}
+
+
+def test_statistics_attributes_and_snapshot_round_trip():
+    stats = RollingStatistics([30, 7])
+    for offset in range(40):
+        stats.add(738000 + offset, 10.0, 10.0 + offset % 3)
+    attributes = stats.attributes("mape")
+    assert set(attributes) == {"mape_7d", "mape_30d"}
+    restored = RollingStatistics.from_snapshot(stats.to_snapshot(), [7, 30])
+    assert restored.metrics(7) == stats.metrics(7)
+    assert restored.metrics(30) == stats.metrics(30)
+    assert RollingStatistics.from_snapshot(stats.to_snapshot(), [7, 14]) is None
+
+
+def test_from_rows(history_rows):
+    stats = RollingStatistics.from_rows(history_rows, [30])
+    assert stats.metrics(30)["days"] == 30
+    assert stats.metrics(30)["bias"] == pytest.approx(float(np.mean(history_rows["actual"][-30:] * 0.1)), abs=1e-2)
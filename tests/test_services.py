@@ -0,0 +1,50 @@
+"""Services: Auswahl des Eintrags und Prüfung der Service-Daten."""
+from unittest.mock import AsyncMock
+
+import pytest
+
+pytest.importorskip("pytest_homeassistant_custom_component")
+
+import voluptuous as vol  # noqa: E402
+from homeassistant.core import ServiceCall  # noqa: E402
+from homeassistant.exceptions import HomeAssistantError  # noqa: E402
+
+from solar_forecast_ml import _async_register_services, _coordinator_for_call  # noqa: E402
+from solar_forecast_ml.const import DOMAIN  # noqa: E402
+
+
+def _call(**data):
+    return ServiceCall(DOMAIN, "replay_history", data)
+
+
+async def test_single_entry_needs_no_config_entry_id(hass, make_coordinator):
+    coordinator = make_coordinator()
+    assert _coordinator_for_call(hass, _call()) is coordinator
+    assert _coordinator_for_call(hass, _call(config_entry_id=coordinator.entry.entry_id)) is coordinator
+
+
+async def test_several_entries_are_selected_by_config_entry_id(hass, make_coordinator):
+    first, second = make_coordinator(), make_coordinator()
+    assert _coordinator_for_call(hass, _call(config_entry_id=second.entry.entry_id)) is second
+    with pytest.raises(HomeAssistantError, match="config_entry_id"):
+        _coordinator_for_call(hass, _call())
+    with pytest.raises(HomeAssistantError, match="unknown"):
+        _coordinator_for_call(hass, _call(config_entry_id="unknown"))
+    assert first is not second
+
+
+async def test_replay_history_validates_its_data(hass, make_coordinator):
+    coordinator = make_coordinator()
+    coordinator.async_replay_history = AsyncMock(return_value={"days": 0})
+    _async_register_services(hass)
+
+    response = await hass.services.async_call(
+        DOMAIN, "replay_history", {"days": "30", "base_capacity": "12.5", "weights": {"lux": "0.2"}},
+        blocking=True, return_response=True,
+    )
+    assert response == {"days": 0}
+    coordinator.async_replay_history.assert_awaited_once_with(weights={"lux": 0.2}, base_capacity=12.5, days=30)
+
+    for data in ({"days": 0}, {"base_capacity": -1}, {"weights": {"lux": "viel"}}, {"weights": {"unbekannt": 1}}):
+        with pytest.raises(vol.Invalid):
+            await hass.services.async_call(DOMAIN, "replay_history", data, blocking=True, return_response=True)
@@ -0,0 +1,67 @@
+"""Designmatrix und Ridge-Regression des Tagesmodells."""
+import numpy as np
+import pytest
+
+from conftest import BASE_CAPACITY, TRUE_WEIGHTS, synthetic_days
+from solar_forecast_ml.columnar import ColumnarHistory
+from solar_forecast_ml.const import DEFAULT_WEIGHTS
+from solar_forecast_ml.trainer import LINEAR_KEYS, design_matrix, fit_weights, predict, predict_linear, training_mask
+
+
+def _rows(days):
+    return np.array(ColumnarHistory.from_days(days).rows)
+
+
+def test_training_mask_needs_actual_and_weather_factor():
+    days = synthetic_days(3)
+    first, second, _ = sorted(days)
+    days[first]["actual"] = 0
+    del days[second]["weather_factor"]
+    assert training_mask(_rows(days)).tolist() == [False, False, True]
+
+
+def test_design_matrix_halves_rainy_days(history_rows):
+    rows = history_rows[:2].copy()
+    rain = rows["features"][:, 5]
+    rain[1] = 1.0
+    rows["features"][:, 5] = rain
+    x, fs = design_matrix(rows, BASE_CAPACITY)
+    assert x.shape == (2, len(LINEAR_KEYS))
+    assert x[1, 0] == pytest.approx(0.5 * BASE_CAPACITY * rows["weather_factor"][1])
+    assert np.isnan(fs).all()
+
+
+def test_predict_reproduces_the_day_formula(history_rows):
+    x, fs = design_matrix(history_rows, BASE_CAPACITY)
+    assert predict(x, fs, TRUE_WEIGHTS) == pytest.approx(history_rows["actual"], rel=1e-6)
+
+
+def test_predict_linear_evaluates_several_sets_at_once(history_rows):
+    x, fs = design_matrix(history_rows, BASE_CAPACITY)
+    sets = [TRUE_WEIGHTS, DEFAULT_WEIGHTS]
+    linear = np.array([[w[k] for k in LINEAR_KEYS] for w in sets]).T
+    combined = predict_linear(x, fs, linear, np.array([w["fs"] for w in sets]))
+    assert combined.shape == (len(history_rows), 2)
+    assert combined[:, 1] == pytest.approx(predict(x, fs, DEFAULT_WEIGHTS))
+
+
+def test_fit_weights_recovers_the_generating_weights(history_rows):
+    fitted, report = fit_weights(history_rows, BASE_CAPACITY, dict(DEFAULT_WEIGHTS), 1e-6, 14)
+    assert fitted is not None
+    for key in LINEAR_KEYS[:-1]:
+        assert fitted[key] == pytest.approx(TRUE_WEIGHTS[key], rel=1e-2)
+    assert report["days"] == len(history_rows)
+    assert report["rmse_after"] < report["rmse_before"]
+
+
+def test_fit_weights_learns_the_forecast_solar_blend():
+    rows = _rows(synthetic_days(200, seed=3, with_fs=True))
+    fitted, report = fit_weights(rows, BASE_CAPACITY, dict(DEFAULT_WEIGHTS, fs=0.2), 1e-6, 14)
+    assert report["days_with_fs"] == 200
+    assert fitted["fs"] == pytest.approx(TRUE_WEIGHTS["fs"], abs=0.05)
+
+
+def test_fit_weights_skips_with_too_few_days(history_rows):
+    fitted, report = fit_weights(history_rows[:5], BASE_CAPACITY, dict(DEFAULT_WEIGHTS), 0.1, 14)
+    assert fitted is None
+    assert "skipped" in report